@@ -0,0 +1,147 @@
+# bench_rating.py
+"""
+Бенчмарк движка расчета рейтинга (без обращения к базе данных).
+
+Строит полный набор ответов (по одному на каждое описание вопроса из
+QUESTION_CATEGORIES) и измеряет стоимость диспетчеризации одного ответа,
+время расчета флагов пост-обработки (ALERT_RULES) и время пакетного
+расчета для синтетической когорты профилей.
+
+Запуск:
+    python bench_rating.py [количество профилей когорты]
+"""
+import os
+import sys
+import time
+import timeit
+from types import SimpleNamespace
+
+import django
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'survey.settings')
+django.setup()
+
+from questionnaire import utils, cohort  # noqa: E402
+
+NUMERIC_VALUES = {
+    "ОКРУЖНОСТЬ (ТАЛИИ)": 90.0,
+    "ОКРУЖНОСТЬ (БЕДЕР)": 100.0,
+    "ОБЩИЙ ХОЛЕСТЕРИН": 5.0,
+    "УРОВЕНЬ ГЛЮКОЗЫ": 5.2,
+    "Курение (сигарет в день)": 5.0,
+    "Курение (лет стажа)": 10.0,
+}
+
+
+def build_response_set():
+    """Полный набор ответов: по одному на каждое описание вопроса"""
+    responses = []
+    descriptions = [
+        desc
+        for params in utils.QUESTION_CATEGORIES.values()
+        for desc in params['descriptions']
+    ]
+    for i, desc in enumerate(descriptions):
+        numeric = NUMERIC_VALUES.get(desc)
+        responses.append(utils.ResponseRow(
+            description=desc,
+            is_numeric_input=numeric is not None,
+            numeric_answer=numeric,
+            free_text_answer='120/80' if desc == "АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ" else '',
+            answers=[] if numeric is not None else [((0, 0.5, 0.79, 1.0)[i % 4], 'Нет')]
+        ))
+    return responses
+
+
+def build_cohort(size, seed=0):
+    """Синтетическая когорта: каждый профиль ответил на все вопросы"""
+    rng = np.random.default_rng(seed)
+    responses = build_response_set()
+    per_profile = len(responses)
+
+    response_desc = np.tile([cohort.DESCRIPTION_CODES[r.description] for r in responses], size)
+    response_is_numeric = np.tile([r.is_numeric_input for r in responses], size)
+    response_numeric = np.where(
+        response_is_numeric, np.tile([r.numeric_answer or 0.0 for r in responses], size), np.nan
+    )
+
+    # По одному выбранному варианту на вопрос с выбором
+    answer_response = np.flatnonzero(~response_is_numeric)
+    answer_ids = rng.integers(1, 5, len(answer_response))
+    answer_values = np.array([0.0, 0.5, 0.79, 1.0])[answer_ids - 1]
+    bp_code = cohort.DESCRIPTION_CODES[cohort.BLOOD_PRESSURE]
+
+    return cohort.Cohort(
+        profile_ids=range(size),
+        genders=rng.choice(['M', 'F'], size).tolist(),
+        heights=rng.uniform(150, 200, size),
+        weights=rng.uniform(45, 130, size),
+        response_profile=np.repeat(np.arange(size), per_profile),
+        response_desc=response_desc,
+        response_numeric=response_numeric,
+        response_is_numeric=response_is_numeric,
+        answer_response=answer_response,
+        answer_ids=answer_ids,
+        answer_values=answer_values,
+        answer_texts={1: 'Нет', 2: 'Шум', 3: 'Диабет', 4: 'Ничего не беспокоит'},
+        free_texts={int(row): '120/80' for row in np.flatnonzero(response_desc == bp_code)}
+    )
+
+
+def legacy_alert_flags(data):
+    """Флаги ALERT_RULES отдельным проходом any() на каждый флаг, как до табличных правил"""
+    for bucket, values, key, nested in utils.ALERT_RULES:
+        flag = any(v in values for v in data[bucket])
+        if nested is None:
+            data[key] = flag
+        else:
+            data.setdefault(key, {})[nested] = flag
+    emotional = data['emotional_eating_values']
+    has_0 = any(v == 0 for v in emotional)
+    has_05 = any(v == 0.5 for v in emotional) and not has_0
+    data['emotional_eating_data'] = {
+        'has_emotional_eating_0': has_0,
+        'has_emotional_eating_05': has_05,
+        'has_emotional_eating_079': any(v == 0.79 for v in emotional) and not (has_0 or has_05),
+        'all_healthy': bool(emotional) and all(v == 1 for v in emotional)
+    }
+
+
+def bench_alert_flags(data, number):
+    """Время расчета флагов на профиль: отдельные проходы any() и битовые маски"""
+    legacy = min(timeit.repeat(lambda: legacy_alert_flags(data), number=number, repeat=5))
+    compiled = min(timeit.repeat(lambda: utils.apply_alert_rules(data), number=number, repeat=5))
+    print(f"alert flags, any() per flag: {legacy / number * 1e6:.3f} us")
+    print(f"alert flags, compiled masks: {compiled / number * 1e6:.3f} us")
+
+
+def main(number=2000, cohort_size=100_000):
+    profile = SimpleNamespace(gender='M', height=180.0, weight=80.0)
+    bmi_data = utils.calculate_bmi_data(profile)
+    responses = build_response_set()
+
+    data = utils.process_responses([], bmi_data, profile)
+
+    def dispatch():
+        for response in responses:
+            utils.process_single_response(response, data, profile)
+
+    dispatch()
+    best = min(timeit.repeat(dispatch, number=number, repeat=5))
+    per_response_us = best / number / len(responses) * 1e6
+
+    print(f"responses per set: {len(responses)}")
+    print(f"dispatch per response: {per_response_us:.3f} us")
+
+    bench_alert_flags(utils.process_responses(responses, bmi_data, profile), number)
+
+    population = build_cohort(cohort_size)
+    started = time.perf_counter()
+    cohort.calculate_cohort_ratings(population)
+    print(f"cohort of {cohort_size} profiles: {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == '__main__':
+    main(cohort_size=int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
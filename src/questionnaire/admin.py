@@ -1,7 +1,24 @@
+from datetime import timedelta
+from functools import partial
+
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.db.models.functions import TruncDate
+from django.http import StreamingHttpResponse
+from django.urls import path
+from django.utils.text import smart_split, unescape_string_literal
+from django.utils.timezone import localdate
 import nested_admin
 
-from .models import Question, Answer, UserResponse, AnonymousUserProfile
+from .export import FORMATS, CONTENT_TYPES, iter_export, gzip_chunks
+from .pagination import EstimatedCountPaginator, KeysetChangeList
+from .models import (
+    Question, Answer, UserResponse, AnonymousUserProfile, ResponseAccumulator, FinalizationTask, SurveyResult,
+    DailyActivity
+)
+from .utils import BMI_CATEGORIES, RATING_BANDS, TOP_RATING
 
 
 
@@ -61,12 +78,27 @@ class QuestionAdmin(nested_admin.NestedModelAdmin):
             'admin/js/question_admin.js',
         )
 
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Админка таблицы на миллионы строк: число строк по оценке планировщика
+    вместо COUNT(*), без второго подсчета без фильтров и со ссылкой на
+    следующую страницу по ключу вместо OFFSET (см. questionnaire.pagination)
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
 @admin.register(AnonymousUserProfile)
-class AnonymousUserProfileAdmin(admin.ModelAdmin):
+class AnonymousUserProfileAdmin(LargeTableAdmin):
     list_display = ['session_key', 'gender', 'age', 'height', 'weight', 'filled_survey']
     list_filter = ('gender', 'filled_survey')
     search_fields = ('session_key',)
-    readonly_fields = ('session_key',)
+    readonly_fields = ('session_key', 'answered_count')
     list_per_page = 20
 
     fieldsets = (
@@ -74,7 +106,7 @@ class AnonymousUserProfileAdmin(admin.ModelAdmin):
             'fields': ('session_key', 'gender', 'age', 'height', 'weight')
         }),
         ('Статус', {
-            'fields': ('filled_survey',),
+            'fields': ('filled_survey', 'answered_count'),
             'classes': ('collapse',),
         }),
     )
@@ -84,7 +116,7 @@ class AnonymousUserProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserResponse)
-class UserResponseAdmin(admin.ModelAdmin):
+class UserResponseAdmin(LargeTableAdmin):
     list_display = (
         'user_profile',
         'created_at',
@@ -99,10 +131,15 @@ class UserResponseAdmin(admin.ModelAdmin):
         'free_text_answer',
         'selected_answers__text'
     )
+    list_select_related = ('user_profile', 'question')
     readonly_fields = ('get_answers',)
     filter_horizontal = ('selected_answers',)
     list_per_page = 20
     date_hierarchy = 'created_at'
+    # Сортировка по ключу - для перехода на следующую страницу без OFFSET
+    ordering = ('-pk',)
+    # Навигация по датам строится по DailyActivity, а не по всей таблице ответов
+    change_list_template = 'admin/questionnaire/userresponse/change_list.html'
 
     fieldsets = (
         (None, {
@@ -114,6 +151,59 @@ class UserResponseAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            # Счетчик дня обновляется после фиксации, как при ответе в анкете
+            transaction.on_commit(partial(DailyActivity.increment, responses=1, date=localdate(obj.created_at)))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Правка вне анкеты: накопитель соберется заново из ответов
+        profiles = {form.instance.user_profile_id, form.initial.get('user_profile')}
+        ResponseAccumulator.objects.filter(user_profile__in=profiles - {None}).delete()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ResponseAccumulator.objects.filter(user_profile=obj.user_profile_id).delete()
+        transaction.on_commit(partial(DailyActivity.remove_responses, {localdate(obj.created_at): 1}))
+
+    def delete_queryset(self, request, queryset):
+        profiles = list(queryset.values_list('user_profile', flat=True).distinct())
+        days = dict(
+            queryset.annotate(day=TruncDate('created_at')).order_by().values('day').annotate(
+                total=Count('pk')
+            ).values_list('day', 'total')
+        )
+        super().delete_queryset(request, queryset)
+        ResponseAccumulator.objects.filter(user_profile__in=profiles).delete()
+        transaction.on_commit(partial(DailyActivity.remove_responses, days))
+
+    def get_queryset(self, request):
+        # Выбранные ответы страницы одним запросом вместо запроса на строку
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('selected_answers', queryset=Answer.objects.only('id', 'text'))
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по search_fields, где совпадение по текстам выбранных ответов
+        проверяется подзапросом EXISTS вместо соединения с selected_answers:
+        строки не дублируются, и distinct поверх всей выборки не нужен
+        """
+        if not search_term:
+            return queryset, False
+        through = UserResponse.selected_answers.through
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = queryset.filter(
+                Q(question__text__icontains=bit)
+                | Q(free_text_answer__icontains=bit)
+                | Exists(through.objects.filter(userresponse_id=OuterRef('pk'), answer__text__icontains=bit))
+            )
+        return queryset, False
+
     def get_answers(self, obj):
         return ", ".join(a.text for a in obj.selected_answers.all())
     get_answers.short_description = 'Выбранные ответы'
@@ -126,4 +216,125 @@ class UserResponseAdmin(admin.ModelAdmin):
     get_user_data.short_description = 'Анкетные данные'
 
     verbose_name = 'Ответ пользователя'
-    verbose_name_plural = 'Ответы пользователей'
\ No newline at end of file
+    verbose_name_plural = 'Ответы пользователей'
+
+
+@admin.register(FinalizationTask)
+class FinalizationTaskAdmin(admin.ModelAdmin):
+    list_display = ('user_profile', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('user_profile__session_key', 'last_error')
+    readonly_fields = ('user_profile', 'attempts', 'started_at', 'last_error', 'created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ('date', 'responses', 'completions')
+    date_hierarchy = 'date'
+    list_per_page = 50
+    chart_days = 30
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def completions_chart(self):
+        """Заполненные анкеты за последние chart_days дней (дни без активности - нули)"""
+        today = localdate()
+        first = today - timedelta(days=self.chart_days - 1)
+        counts = dict(DailyActivity.objects.filter(date__gte=first).values_list('date', 'completions'))
+        peak = max(counts.values(), default=0) or 1
+        days = [first + timedelta(days=offset) for offset in range(self.chart_days)]
+        return [
+            {'date': day, 'completions': counts.get(day, 0), 'height': round(100 * counts.get(day, 0) / peak)}
+            for day in days
+        ]
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {'activity_chart': self.completions_chart(), **(extra_context or {})}
+        return super().changelist_view(request, extra_context)
+
+
+class ColumnValueFilter(admin.SimpleListFilter):
+    """
+    Фильтр по колонке с известным набором значений. Варианты берутся из
+    правил расчета, а не из SELECT DISTINCT по всей таблице, как у фильтра
+    Django по умолчанию
+    """
+    values = ()
+
+    def lookups(self, request, model_admin):
+        return [(value, value) for value in self.values]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(**{self.parameter_name: self.value()})
+
+
+class RatingFilter(ColumnValueFilter):
+    title = 'Рейтинг'
+    parameter_name = 'rating'
+    values = [rating for _, rating in RATING_BANDS] + [TOP_RATING, 'Нет данных']
+
+
+class BmiCategoryFilter(ColumnValueFilter):
+    title = 'Категория ИМТ'
+    parameter_name = 'bmi_category'
+    values = [category['name'] for category in BMI_CATEGORIES] + ['Не рассчитан']
+
+
+@admin.register(SurveyResult)
+class SurveyResultAdmin(admin.ModelAdmin):
+    list_display = (
+        'user_profile', 'created_at', 'rating', 'total_score',
+        'medico_biological_avg', 'stress_avg', 'nutrition_avg',
+        'eating_behavior_avg', 'work_assessment_avg', 'lifestyle_avg',
+        'bmi', 'bmi_category'
+    )
+    list_filter = (RatingFilter, BmiCategoryFilter)
+    search_fields = ('user_profile__session_key',)
+    list_select_related = ('user_profile',)
+    ordering = ('-created_at',)
+    # Фильтры и сортировка идут по индексированным колонкам; полный COUNT(*)
+    # по таблице не считается, профиль выбирается по id, а не выпадающим списком
+    show_full_result_count = False
+    raw_id_fields = ('user_profile', 'question_bank_snapshot')
+    readonly_fields = (
+        'calculated_rating', 'ruleset_version', 'created_at', 'updated_at'
+    ) + SurveyResult.RATING_COLUMNS
+    exclude = ('responses_data',)
+    list_per_page = 50
+
+    def get_urls(self):
+        urls = [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_view),
+                name='questionnaire_surveyresult_export'
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        """Потоковая выгрузка всех результатов: ?format=csv|ndjson&gzip=1"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in FORMATS:
+            fmt = 'csv'
+        content = iter_export(fmt)
+        filename = f'survey_results.{fmt}'
+        content_type = CONTENT_TYPES[fmt]
+        if request.GET.get('gzip') == '1':
+            content = gzip_chunks(content)
+            filename += '.gz'
+            content_type = 'application/gzip'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,93 @@
+"""
+Лента изменений SurveyResult для инкрементальной выгрузки в хранилище.
+
+Страницы выбираются по ключу (updated_at, id) с индексом по этой паре:
+каждая следующая страница начинается строго после последней записи
+предыдущей, поэтому стоимость синхронизации зависит только от числа
+изменившихся строк. Курсор для клиента непрозрачен (base64 от пары).
+
+updated_at проставляется до фиксации транзакции, и запись может стать
+видимой позже более новых. Поэтому лента отдает только строки старше
+CHANGE_FEED_SETTLE_SECONDS, чтобы курсор не перескочил еще не
+зафиксированные изменения. Удаления лента не отражает.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import SurveyResult, QuestionBankSnapshot
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+DEFAULT_SETTLE_SECONDS = 5
+
+
+def encode_cursor(updated_at, pk):
+    """Непрозрачный курсор позиции (updated_at, id)"""
+    raw = json.dumps([updated_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Позиция (updated_at, id) из курсора; ValueError для некорректного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        updated_at, pk = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid change feed cursor: {cursor!r}") from exc
+
+
+def serialize_result(result):
+    """Запись ленты: анкетные данные, рейтинг и ответы в полном формате"""
+    profile = result.user_profile
+    return {
+        'id': result.pk,
+        'session_key': profile.session_key,
+        'profile': {
+            'gender': profile.gender,
+            'age': profile.age,
+            'height': profile.height,
+            'weight': profile.weight
+        },
+        'created_at': result.created_at.isoformat(),
+        'updated_at': result.updated_at.isoformat(),
+        'ruleset_version': result.ruleset_version,
+        'calculated_rating': result.calculated_rating,
+        'questions': result.get_responses_data()['questions']
+    }
+
+
+def get_changes(cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Страница изменений после курсора: (записи, курсор следующей страницы,
+    есть ли еще записи). Без курсора лента начинается с самого начала
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    settle = getattr(settings, 'CHANGE_FEED_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS)
+
+    results = SurveyResult.objects.filter(
+        updated_at__lte=now() - timedelta(seconds=settle)
+    ).select_related('user_profile').order_by('updated_at', 'pk')
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        results = results.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+
+    page = list(results[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # Снимки банка вопросов страницы одним запросом
+    snapshots = QuestionBankSnapshot.objects.in_bulk(
+        {result.question_bank_snapshot_id for result in page} - {None}
+    )
+    for result in page:
+        if result.question_bank_snapshot_id is not None:
+            result.question_bank_snapshot = snapshots[result.question_bank_snapshot_id]
+
+    next_cursor = encode_cursor(page[-1].updated_at, page[-1].pk) if page else cursor
+    return [serialize_result(result) for result in page], next_cursor, has_more
@@ -0,0 +1,700 @@
+"""
+Пакетный (векторизованный) расчет рейтинга для группы профилей.
+
+Повторяет calculate_user_rating, но обрабатывает сразу тысячи профилей:
+ответы загружаются несколькими плоскими запросами в столбцы NumPy, а средние
+по категориям, общий балл, классификации ИМТ/талии/давления/глюкозы и флаги
+считаются операциями над массивами. Результат совпадает со скалярным
+движком до бита: значения категорий суммируются в том же порядке и тем же
+способом, что и встроенная sum().
+"""
+import sys
+
+import numpy as np
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import AnonymousUserProfile, Answer, Question, UserResponse, SurveyResult
+from .utils import (
+    QUESTION_CATEGORIES, QUESTION_DISPATCH, DESCRIPTION_CATEGORIES, VALUE_SLOTS, PRESENCE_FLAGS,
+    BMI_CATEGORIES, BMI_SCORE_MAP, BP_LIMITS, BP_STATUS_DESCRIPTIONS, CHOLESTEROL_LIMIT,
+    GLUCOSE_PREDIABETES_LIMIT, GLUCOSE_DIABETES_LIMIT, WAIST_LIMITS, WAIST_HIP_RATIO_LIMITS,
+    WAIST_STATUSES, RATIO_STATUSES, RATING_BANDS, TOP_RATING, ALERT_RULES, ALERT_VALUE_BITS,
+    ALERT_OTHER_BIT, initialize_base_result, compute_ruleset_hash
+)
+
+# С Python 3.12 sum() для float использует компенсированное суммирование Неймайера
+COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+CATEGORY_KEYS = list(QUESTION_CATEGORIES)
+
+SMOKING_CIGARETTES = "Курение (сигарет в день)"
+SMOKING_YEARS = "Курение (лет стажа)"
+BLOOD_PRESSURE = "АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ"
+
+# Вопросы, ответы на которые собираются списком текстов: описание -> (ключ, текст "все хорошо")
+TEXT_LISTS = {
+    "Имеющиеся заболевания": ('diseases', 'Нет'),
+    "ЖАЛОБЫ НА ПРОИЗВОДСТВО": ('industrial_complaints', 'Нет вредных производственных факторов'),
+    "ЖАЛОБЫ НА ЗДОРОВЬЕ": ('health_complaints', 'Ничего не беспокоит'),
+}
+
+# Коды описаний вопросов; 0 - вопрос вне категорий
+DESCRIPTIONS = [None] + sorted(set(DESCRIPTION_CATEGORIES) | set(QUESTION_DISPATCH))
+DESCRIPTION_CODES = {desc: code for code, desc in enumerate(DESCRIPTIONS) if desc}
+
+# Списки значений (как в process_responses); fat_values никогда не заполняется
+SLOTS = sorted({slot for slot, _ in VALUE_SLOTS.values() if slot} | {'fat_values'})
+FLAGS = [flag for flag, _ in PRESENCE_FLAGS.values()]
+
+# Битовые коды значений ответа - те же, что у ALERT_RULES
+VALUE_BITS = ALERT_VALUE_BITS
+OTHER_VALUE_BIT = ALERT_OTHER_BIT
+
+# Ключи process_responses, под другим именем попадающие в результат (update_result)
+RESULT_KEYS = {
+    'has_low_activity': 'physical_activity_alert',
+    'has_sleep_issues': 'sleep_alert',
+    'has_digital_issues': 'digital_hygiene_alert',
+}
+
+# Флаги итогового результата из ALERT_RULES: ключ -> (список, значения)
+SLOT_FLAG_RULES = {
+    RESULT_KEYS.get(key, key): (bucket, values)
+    for bucket, values, key, nested in ALERT_RULES
+    if nested is None
+}
+
+
+def _nested_flag_rules():
+    """Вложенные словари флагов из ALERT_RULES: ключ -> {флаг: (список, значения)}"""
+    rules = {}
+    for bucket, values, key, nested in ALERT_RULES:
+        if nested is not None:
+            rules.setdefault(key, {})[nested] = (bucket, values)
+    return rules
+
+
+NESTED_FLAG_RULES = _nested_flag_rules()
+
+EMOTIONAL_EATING_KEYS = (
+    'has_emotional_eating_0', 'has_emotional_eating_05', 'has_emotional_eating_079', 'all_healthy'
+)
+
+# Флаги наличия ответа: ключ результата -> флаг process_responses
+PRESENCE_RESULT_KEYS = {
+    'vacation_alert': 'has_vacation_answers',
+    'alcohol_alert': 'alcohol_alert',
+    'has_fruits_veggies_answer': 'has_fruits_veggies_answer',
+    'has_oil_answer': 'has_oil_answer',
+}
+
+
+def _build_routing():
+    """Таблицы код описания -> категория / список значений / флаг наличия (-1 - нет)"""
+    size = len(DESCRIPTIONS)
+    category = np.full(size, -1)
+    slot = np.full(size, -1)
+    flag = np.full(size, -1)
+
+    for desc, code in DESCRIPTION_CODES.items():
+        entry = QUESTION_DISPATCH.get(desc)
+        if entry is None:
+            key = DESCRIPTION_CATEGORIES.get(desc)
+            if key and desc not in (SMOKING_CIGARETTES, SMOKING_YEARS):
+                category[code] = CATEGORY_KEYS.index(key)
+            continue
+
+        handler, slot_key, flag_key, key = entry
+        if handler:
+            continue
+        category[code] = CATEGORY_KEYS.index(key)
+        if slot_key:
+            slot[code] = SLOTS.index(slot_key)
+        if flag_key:
+            flag[code] = FLAGS.index(flag_key)
+
+    return category, slot, flag
+
+
+DESCRIPTION_CATEGORY, DESCRIPTION_SLOT, DESCRIPTION_FLAG = _build_routing()
+
+
+class Cohort:
+    """
+    Столбцовое представление ответов группы профилей.
+
+    Ответы отсортированы по профилю и порядку создания, выбранные варианты -
+    по ответу и id варианта; ссылки на профили и ответы - позиции в массивах.
+    """
+
+    def __init__(self, profile_ids, genders, heights, weights,
+                 response_profile, response_desc, response_numeric, response_is_numeric,
+                 answer_response, answer_ids, answer_values, answer_texts, free_texts):
+        self.profile_ids = list(profile_ids)
+        self.genders = list(genders)
+        self.heights = np.asarray(heights, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.response_profile = np.asarray(response_profile, dtype=np.int64)
+        self.response_desc = np.asarray(response_desc, dtype=np.int64)
+        self.response_numeric = np.asarray(response_numeric, dtype=float)
+        self.response_is_numeric = np.asarray(response_is_numeric, dtype=bool)
+        self.answer_response = np.asarray(answer_response, dtype=np.int64)
+        self.answer_ids = np.asarray(answer_ids, dtype=np.int64)
+        self.answer_values = np.asarray(answer_values, dtype=float)
+        # id варианта -> текст; позиция ответа -> непустой свободный ответ
+        self.answer_texts = answer_texts
+        self.free_texts = free_texts
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+
+def _columns(rows, count):
+    """Транспонирует строки values_list в столбцы"""
+    return list(zip(*rows)) if rows else [()] * count
+
+
+def _lookup_table(keys, values, dtype, fill):
+    """Массив-справочник: table[pk] -> значение"""
+    keys = np.asarray(keys, dtype=np.int64)
+    table = np.full(int(keys.max()) + 1 if len(keys) else 1, fill, dtype=dtype)
+    table[keys] = np.asarray(values, dtype=dtype)
+    return table
+
+
+def _positions(sorted_keys, keys):
+    """Позиции ключей в отсортированном массиве"""
+    return np.searchsorted(sorted_keys, np.asarray(keys, dtype=np.int64))
+
+
+def load_cohort(profile_ids):
+    """Загружает ответы профилей в Cohort (шесть плоских запросов)"""
+    profiles = list(AnonymousUserProfile.objects.filter(
+        pk__in=profile_ids
+    ).order_by('pk').values_list('pk', 'gender', 'height', 'weight'))
+    ids, genders, heights, weights = _columns(profiles, 4)
+
+    question_pks, descriptions, is_numeric = _columns(
+        list(Question.objects.values_list('pk', 'description', 'is_numeric_input')), 3
+    )
+    question_codes = _lookup_table(
+        question_pks, [DESCRIPTION_CODES.get(desc, 0) for desc in descriptions], np.int64, 0
+    )
+    question_numeric = _lookup_table(question_pks, is_numeric, bool, False)
+
+    answer_pks, answer_values, answer_texts = _columns(
+        list(Answer.objects.values_list('pk', 'value', 'text')), 3
+    )
+    values_table = _lookup_table(answer_pks, np.array(answer_values, dtype=float), float, np.nan)
+
+    responses = list(UserResponse.objects.filter(
+        user_profile_id__in=ids
+    ).order_by('user_profile_id', 'created_at', 'pk').values_list(
+        'pk', 'user_profile_id', 'question_id', 'numeric_answer'
+    ))
+    response_pks, response_profiles, question_ids, numeric = _columns(responses, 4)
+    question_ids = np.asarray(question_ids, dtype=np.int64)
+
+    # Позиции ответов по их pk (ответы отсортированы не по pk)
+    response_pks = np.asarray(response_pks, dtype=np.int64)
+    pk_order = np.argsort(response_pks)
+
+    selected_rows, selected_answers = _columns(
+        list(UserResponse.selected_answers.through.objects.filter(
+            userresponse__user_profile_id__in=ids
+        ).values_list('userresponse_id', 'answer_id')), 2
+    )
+    answer_response = pk_order[_positions(response_pks[pk_order], selected_rows)]
+    answer_ids = np.asarray(selected_answers, dtype=np.int64)
+    order = np.lexsort((answer_ids, answer_response))
+    answer_response, answer_ids = answer_response[order], answer_ids[order]
+
+    text_descriptions = [BLOOD_PRESSURE, *TEXT_LISTS]
+    text_rows = list(UserResponse.objects.filter(
+        user_profile_id__in=ids, question__description__in=text_descriptions
+    ).exclude(free_text_answer='').values_list('pk', 'free_text_answer'))
+    free_texts = {
+        int(pk_order[position]): text
+        for position, (_, text) in zip(
+            _positions(response_pks[pk_order], [pk for pk, _ in text_rows]).tolist(), text_rows
+        )
+        if text
+    }
+
+    return Cohort(
+        profile_ids=ids,
+        genders=genders,
+        heights=np.array(heights, dtype=float),
+        weights=np.array(weights, dtype=float),
+        response_profile=_positions(ids, response_profiles),
+        response_desc=question_codes[question_ids],
+        response_numeric=np.array(numeric, dtype=float),
+        response_is_numeric=question_numeric[question_ids],
+        answer_response=answer_response,
+        answer_ids=answer_ids,
+        answer_values=values_table[answer_ids],
+        answer_texts=dict(zip(answer_pks, answer_texts)),
+        free_texts=free_texts
+    )
+
+
+def _float_sum(columns, size):
+    """Построчная сумма столбцов в том же порядке и тем же способом, что и sum()"""
+    total = np.zeros(size)
+    if not COMPENSATED_SUM:
+        for column in columns:
+            total = total + column
+        return total
+
+    compensation = np.zeros(size)
+    for column in columns:
+        step = total + column
+        compensation += np.where(
+            np.abs(total) >= np.abs(column),
+            (total - step) + column,
+            (column - step) + total
+        )
+        total = step
+    return np.where(compensation != 0, total + compensation, total)
+
+
+def _round(values, ndigits):
+    """
+    Округление как у round(). NumPy округляет x * 10**n, что расходится со
+    встроенным round() только вблизи половины шага - такие значения (и очень
+    большие) досчитываются встроенным round()
+    """
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    result = np.rint(scaled) / scale
+    with np.errstate(invalid='ignore'):
+        exact = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (np.abs(scaled) > 1e9)
+    for index in np.flatnonzero(exact).tolist():
+        result[index] = round(float(values[index]), ndigits)
+    return result
+
+
+def _value_bits(values):
+    """Битовый код каждого значения"""
+    bits = np.full(len(values), OTHER_VALUE_BIT, dtype=np.int64)
+    for value, bit in VALUE_BITS.items():
+        bits[values == value] = bit
+    return bits
+
+
+def _last_per_profile(profiles, values, size, fill=np.nan):
+    """Значение последней (по порядку ответов) строки каждого профиля"""
+    result = np.full(size, fill, dtype=float)
+    if len(profiles):
+        unique, index = np.unique(profiles[::-1], return_index=True)
+        result[unique] = values[::-1][index]
+    return result
+
+
+def _optional(values, ndigits=None):
+    """Массив с NaN -> список с None (с округлением, как в update_result)"""
+    if ndigits is not None:
+        values = _round(values, ndigits)
+    return [None if value != value else value for value in values.tolist()]
+
+
+def _value_streams(cohort):
+    """
+    Поток значений ответов: (ответ, значение) в порядке обработки.
+    Для числовых вопросов - числовой ответ, иначе значения выбранных вариантов.
+    """
+    numeric_rows = np.flatnonzero(cohort.response_is_numeric & ~np.isnan(cohort.response_numeric))
+    choice = ~cohort.response_is_numeric[cohort.answer_response] & ~np.isnan(cohort.answer_values)
+
+    responses = np.concatenate([numeric_rows, cohort.answer_response[choice]])
+    values = np.concatenate([cohort.response_numeric[numeric_rows], cohort.answer_values[choice]])
+    secondary = np.concatenate([np.zeros(len(numeric_rows), dtype=np.int64), cohort.answer_ids[choice]])
+
+    order = np.lexsort((secondary, responses))
+    return responses[order], values[order]
+
+
+def _category_streams(profiles, categories, values, size):
+    """
+    Раскладывает значения по категориям: для каждой категории список столбцов
+    (i-е значение каждого профиля, дополненное нулями) и количество значений
+    """
+    n_categories = len(CATEGORY_KEYS)
+    keys = categories * size + profiles
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+
+    counts = np.bincount(keys, minlength=n_categories * size).reshape(n_categories, size)
+    starts = np.concatenate([[0], np.cumsum(counts.ravel())])[:-1]
+    positions = np.arange(len(keys)) - starts[keys]
+
+    streams = []
+    for category in range(n_categories):
+        low, high = np.searchsorted(keys, [category * size, (category + 1) * size])
+        width = int(positions[low:high].max()) + 1 if high > low else 0
+        matrix = np.zeros((width, size))
+        matrix[positions[low:high], keys[low:high] - category * size] = values[low:high]
+        streams.append(list(matrix))
+
+    return streams, counts
+
+
+def _text_lists(cohort, size):
+    """Списки текстов (заболевания, жалобы) по профилям в порядке обработки"""
+    lists = {key: [[] for _ in range(size)] for key, _ in TEXT_LISTS.values()}
+    codes = {DESCRIPTION_CODES[desc]: key for desc, (key, _) in TEXT_LISTS.items()}
+
+    rows = np.flatnonzero(np.isin(cohort.response_desc, list(codes)))
+    bounds = np.searchsorted(cohort.answer_response, np.stack([rows, rows + 1]))
+    for row, low, high in zip(rows.tolist(), bounds[0].tolist(), bounds[1].tolist()):
+        items = lists[codes[cohort.response_desc[row]]][cohort.response_profile[row]]
+        items.extend(cohort.answer_texts[pk] for pk in cohort.answer_ids[low:high].tolist())
+        if row in cohort.free_texts:
+            items.append(cohort.free_texts[row])
+
+    return lists
+
+
+def _text_list_score(items, ok_text):
+    """Наличие балла и балл по списку текстов (как в post_process_data)"""
+    present = np.array([bool(values) for values in items], dtype=bool)
+    score = np.array([len(values) == 1 and ok_text in values for values in items], dtype=float)
+    return present, score
+
+
+def _blood_pressure(cohort, size):
+    """Данные давления по профилям (последний ответ, как в handle_blood_pressure)"""
+    systolic = [None] * size
+    diastolic = [None] * size
+    unknown = [False] * size
+
+    rows = np.flatnonzero(cohort.response_desc == DESCRIPTION_CODES[BLOOD_PRESSURE])
+    for row in rows.tolist():
+        profile = int(cohort.response_profile[row])
+        text = cohort.free_texts.get(row)
+        if not text or '/' not in text:
+            unknown[profile] = True
+            continue
+        try:
+            systolic[profile], diastolic[profile] = map(int, text.split('/'))
+            unknown[profile] = False
+        except (ValueError, TypeError):
+            unknown[profile] = True
+
+    return systolic, diastolic, unknown
+
+
+def _measurement(cohort, description, low=None, high=None):
+    """Строки ответов с числовым значением для вопроса (с валидацией диапазона)"""
+    rows = cohort.response_desc == DESCRIPTION_CODES[description]
+    values = cohort.response_numeric
+    rows &= ~np.isnan(values)
+    if low is not None:
+        rows &= (values >= low) & (values <= high)
+    rows = np.flatnonzero(rows)
+    return cohort.response_profile[rows], values[rows]
+
+
+def _lab_value(cohort, description, size):
+    """Значение и флаг "неизвестно" для холестерина/глюкозы (последний ответ)"""
+    rows = np.flatnonzero(cohort.response_desc == DESCRIPTION_CODES[description])
+    numeric = cohort.response_numeric[rows]
+    profiles = cohort.response_profile[rows]
+
+    unknown = _last_per_profile(profiles, (np.isnan(numeric) | (numeric == 0)).astype(float), size, 0.0) > 0
+    known = ~np.isnan(numeric)
+    value = _last_per_profile(profiles[known], numeric[known], size)
+    value[value == 0] = np.nan
+    return value, unknown
+
+
+def calculate_cohort_ratings(cohort):
+    """
+    Рассчитывает рейтинги всех профилей когорты.
+    Возвращает список словарей в порядке cohort.profile_ids, как calculate_user_rating.
+    """
+    size = len(cohort)
+    has_responses = np.bincount(cohort.response_profile, minlength=size) > 0
+
+    event_responses, event_values = _value_streams(cohort)
+    event_profiles = cohort.response_profile[event_responses]
+    event_desc = cohort.response_desc[event_responses]
+
+    # Потоки значений по категориям
+    event_categories = DESCRIPTION_CATEGORY[event_desc]
+    routed = event_categories >= 0
+    streams, counts = _category_streams(
+        event_profiles[routed], event_categories[routed], event_values[routed], size
+    )
+
+    # Списки значений: какие значения встречались у профиля
+    event_slots = DESCRIPTION_SLOT[event_desc]
+    in_slot = event_slots >= 0
+    slot_bits = np.zeros((len(SLOTS), size), dtype=np.int64)
+    np.bitwise_or.at(slot_bits, (event_slots[in_slot], event_profiles[in_slot]), _value_bits(event_values[in_slot]))
+
+    def has(slot, values):
+        mask = sum(VALUE_BITS[value] for value in values)
+        return (slot_bits[SLOTS.index(slot)] & mask) != 0
+
+    # Флаги наличия ответа
+    response_flags = DESCRIPTION_FLAG[cohort.response_desc]
+    flagged = response_flags >= 0
+    presence = np.zeros((len(FLAGS), size), dtype=bool)
+    presence[response_flags[flagged], cohort.response_profile[flagged]] = True
+
+    # ИМТ
+    heights, weights = cohort.heights, cohort.weights
+    with np.errstate(invalid='ignore'):
+        has_bmi = (heights > 0) & (weights > 0)
+    bmi = np.full(size, np.nan)
+    bmi[has_bmi] = weights[has_bmi] / (heights[has_bmi] / 100) ** 2
+    bmi_index = np.full(size, -1)
+    for index in reversed(range(len(BMI_CATEGORIES))):
+        category = BMI_CATEGORIES[index]
+        matches = bmi >= category['min']
+        if category['max'] is not None:
+            matches &= bmi <= category['max']
+        bmi_index[matches] = index
+    # Индекс -1 (нет категории) указывает на последний элемент - значения по умолчанию
+    bmi_names = [c['name'] for c in BMI_CATEGORIES] + ['Не рассчитан']
+    bmi_risk_levels = [c['risk_level'] for c in BMI_CATEGORIES] + ['Не определен']
+    bmi_risk_descriptions = [c['description'] for c in BMI_CATEGORIES] + ['Данные для расчета отсутствуют']
+    bmi_scores = np.array([BMI_SCORE_MAP.get(name, 0.0) for name in bmi_names])[bmi_index]
+
+    # Пол
+    is_male = np.array([gender == 'M' for gender in cohort.genders], dtype=bool)
+    has_gender = np.array([bool(gender) for gender in cohort.genders], dtype=bool)
+
+    # Талия и бедра
+    waist = _last_per_profile(*_measurement(cohort, "ОКРУЖНОСТЬ (ТАЛИИ)", 50, 200), size)
+    hip = _last_per_profile(*_measurement(cohort, "ОКРУЖНОСТЬ (БЕДЕР)", 50, 200), size)
+    has_waist = ~np.isnan(waist)
+    has_ratio = has_waist & ~np.isnan(hip)
+    ratio = np.full(size, np.nan)
+    ratio[has_ratio] = waist[has_ratio] / hip[has_ratio]
+
+    waist_elevated = np.where(is_male, WAIST_LIMITS['M'][0], WAIST_LIMITS['F'][0])
+    waist_high = np.where(is_male, WAIST_LIMITS['M'][1], WAIST_LIMITS['F'][1])
+    ratio_score_limit = np.where(is_male, WAIST_HIP_RATIO_LIMITS['M'], WAIST_HIP_RATIO_LIMITS['F'])
+    ratio_status_limit = np.array([WAIST_HIP_RATIO_LIMITS.get(g, np.inf) for g in cohort.genders], dtype=float)
+
+    with np.errstate(invalid='ignore'):
+        waist_status = np.select(
+            [~(has_waist & has_gender), waist >= waist_high, waist >= waist_elevated],
+            [0, 3, 2], default=1
+        )
+        ratio_status = np.select(
+            [~(has_ratio & has_gender), ratio >= ratio_status_limit], [0, 2], default=1
+        )
+    waist_statuses = [None, WAIST_STATUSES['normal'], WAIST_STATUSES['elevated'], WAIST_STATUSES['high']]
+    ratio_statuses = [None, RATIO_STATUSES['normal'], RATIO_STATUSES['elevated']]
+
+    # Давление
+    systolic, diastolic, bp_unknown = _blood_pressure(cohort, size)
+    sys_values = np.array([value or 0 for value in systolic], dtype=np.int64)
+    dia_values = np.array([value or 0 for value in diastolic], dtype=np.int64)
+    bp_status = np.select(
+        [
+            np.array(bp_unknown, dtype=bool) | (sys_values == 0) | (dia_values == 0),
+            (sys_values >= BP_LIMITS['high'][0]) | (dia_values >= BP_LIMITS['high'][1]),
+            (sys_values >= BP_LIMITS['elevated'][0]) | (dia_values >= BP_LIMITS['elevated'][1]),
+        ],
+        ['unknown', 'high', 'elevated'], default='normal'
+    )
+
+    # Холестерин и глюкоза
+    cholesterol, cholesterol_unknown = _lab_value(cohort, "ОБЩИЙ ХОЛЕСТЕРИН", size)
+    glucose, glucose_unknown = _lab_value(cohort, "УРОВЕНЬ ГЛЮКОЗЫ", size)
+    has_cholesterol = ~cholesterol_unknown & ~np.isnan(cholesterol)
+    has_glucose = ~glucose_unknown & ~np.isnan(glucose)
+    with np.errstate(invalid='ignore'):
+        glucose_status = np.select(
+            [np.isnan(glucose), glucose >= GLUCOSE_DIABETES_LIMIT, glucose > GLUCOSE_PREDIABETES_LIMIT],
+            ['unknown', 'diabetes', 'prediabetes'], default='normal'
+        )
+
+    # Курение: первое значение последнего ответа на вопрос
+    first_event = np.unique(event_responses, return_index=True)
+    first_values = np.full(len(cohort.response_desc), np.nan)
+    first_values[first_event[0]] = event_values[first_event[1]]
+
+    def smoking_value(description):
+        rows = np.flatnonzero(cohort.response_desc == DESCRIPTION_CODES[description])
+        values = np.nan_to_num(first_values[rows], nan=0.0)
+        return _last_per_profile(cohort.response_profile[rows], values, size, 0.0), rows
+
+    cigarettes, cigarette_rows = smoking_value(SMOKING_CIGARETTES)
+    years, year_rows = smoking_value(SMOKING_YEARS)
+    smoking_alert = np.zeros(size, dtype=bool)
+    smoking_alert[cohort.response_profile[np.concatenate([cigarette_rows, year_rows])]] = True
+    smokes = (cigarettes > 0) & (years > 0)
+    smoking_index = np.where(smokes, cigarettes * years / 20, np.nan)
+    cigarettes_score = np.select(
+        [(cigarettes >= 1) & (cigarettes <= 2), (cigarettes >= 3) & (cigarettes <= 10)], [0.79, 0.5], default=0.0
+    )
+    with np.errstate(invalid='ignore'):
+        smoking_index_score = np.where(smoking_index > 10, 0.0, 0.5)
+
+    # Заболевания и жалобы
+    text_lists = _text_lists(cohort, size)
+    text_scores = {
+        key: _text_list_score(text_lists[key], ok_text) for key, ok_text in TEXT_LISTS.values()
+    }
+
+    # Дополнительные баллы в конце потоков категорий (порядок как в post_process_data)
+    extra = {
+        'medico_biological': [
+            (np.ones(size, dtype=bool), bmi_scores),
+            text_scores['diseases'],
+            (has_waist, (waist < waist_elevated).astype(float)),
+            (has_ratio, (ratio < ratio_score_limit).astype(float)),
+            (bp_status != 'unknown', (bp_status == 'normal').astype(float)),
+            (has_cholesterol, (cholesterol < CHOLESTEROL_LIMIT).astype(float)),
+            (has_glucose, (glucose < GLUCOSE_DIABETES_LIMIT).astype(float)),
+        ],
+        'lifestyle': [
+            (smokes, cigarettes_score),
+            (smokes, smoking_index_score),
+        ],
+        'work_assessment': [
+            text_scores['industrial_complaints'],
+            text_scores['health_complaints'],
+        ],
+    }
+
+    # Средние по категориям и общий балл
+    averages = []
+    with np.errstate(invalid='ignore'):
+        for index, key in enumerate(CATEGORY_KEYS):
+            columns = list(streams[index])
+            count = counts[index].copy()
+            for present, score in extra.get(key, []):
+                columns.append(np.where(present, score, 0.0))
+                count += present
+            total = _float_sum(columns, size)
+            average = np.divide(total, count, out=np.zeros(size), where=count > 0)
+            averages.append(_round(average, 4))
+
+        positive = [np.where(average > 0, average, 0.0) for average in averages]
+        positive_count = sum((average > 0).astype(int) for average in averages)
+        total_score = np.divide(
+            _float_sum(positive, size), positive_count, out=np.zeros(size), where=positive_count > 0
+        )
+    total_score = _round(total_score, 4)
+    rating_labels = np.array([rating for _, rating in RATING_BANDS] + [TOP_RATING])
+    ratings = rating_labels[np.searchsorted([limit for limit, _ in RATING_BANDS], total_score, side='left')]
+
+    # Эмоциональное питание
+    emotional_0 = has('emotional_eating_values', (0,))
+    emotional_05 = has('emotional_eating_values', (0.5,)) & ~emotional_0
+    emotional_079 = has('emotional_eating_values', (0.79,)) & ~(emotional_0 | emotional_05)
+    emotional_bits = slot_bits[SLOTS.index('emotional_eating_values')]
+
+    # Столбцы результата; вещественные значения округляются, как в update_result
+    columns = dict.fromkeys(initialize_base_result())
+    for index, key in enumerate(CATEGORY_KEYS):
+        columns[f'{key}_avg'] = _round(averages[index], 2).tolist()
+    columns.update({
+        'total_score': _round(total_score, 2).tolist(),
+        'rating': ratings.tolist(),
+        'bmi': _optional(_round(bmi, 1), 2),
+        'bmi_category': [bmi_names[i] for i in bmi_index.tolist()],
+        'bmi_risk_level': [bmi_risk_levels[i] for i in bmi_index.tolist()],
+        'bmi_risk_description': [bmi_risk_descriptions[i] for i in bmi_index.tolist()],
+        'existing_diseases': [items or None for items in text_lists['diseases']],
+        'waist': _optional(waist, 2),
+        'hip': _optional(hip, 2),
+        'waist_hip_ratio': _optional(ratio, 2),
+        'waist_status': [waist_statuses[i] and waist_statuses[i]['status'] for i in waist_status.tolist()],
+        'waist_description': [
+            waist_statuses[i] and waist_statuses[i]['description'] for i in waist_status.tolist()
+        ],
+        'ratio_status': [ratio_statuses[i] and ratio_statuses[i]['status'] for i in ratio_status.tolist()],
+        'ratio_description': [
+            ratio_statuses[i] and ratio_statuses[i]['description'] for i in ratio_status.tolist()
+        ],
+        'bp_data': [
+            {'systolic': s, 'diastolic': d, 'unknown': u}
+            for s, d, u in zip(systolic, diastolic, bp_unknown)
+        ],
+        'bp_status': bp_status.tolist(),
+        'bp_description': [BP_STATUS_DESCRIPTIONS[status] for status in bp_status.tolist()],
+        'cholesterol_value': _optional(cholesterol, 2),
+        'cholesterol_status': np.where(
+            np.nan_to_num(cholesterol) > CHOLESTEROL_LIMIT, 'high', 'normal'
+        ).tolist(),
+        'cholesterol_unknown': (cholesterol_unknown | np.isnan(cholesterol)).tolist(),
+        'glucose_value': _optional(glucose, 2),
+        'glucose_status': glucose_status.tolist(),
+        'glucose_unknown': (glucose_unknown | np.isnan(glucose)).tolist(),
+        'smoking_index': _optional(smoking_index, 2),
+        'smoking_alert': smoking_alert.tolist(),
+        'emotional_eating_data': [
+            dict(zip(EMOTIONAL_EATING_KEYS, row))
+            for row in zip(
+                emotional_0.tolist(), emotional_05.tolist(), emotional_079.tolist(),
+                (emotional_bits == VALUE_BITS[1]).tolist()
+            )
+        ],
+    })
+    for key, flag in PRESENCE_RESULT_KEYS.items():
+        columns[key] = presence[FLAGS.index(flag)].tolist()
+    for key, (slot, values) in SLOT_FLAG_RULES.items():
+        columns[key] = has(slot, values).tolist()
+    for key, rules in NESTED_FLAG_RULES.items():
+        flags = [has(slot, values).tolist() for slot, values in rules.values()]
+        columns[key] = [dict(zip(rules, row)) for row in zip(*flags)]
+
+    keys = list(columns)
+    return [
+        dict(zip(keys, row)) if answered else initialize_base_result()
+        for answered, row in zip(has_responses.tolist(), zip(*columns.values()))
+    ]
+
+
+def iter_cohort_ratings(profile_ids, batch_size=2000):
+    """Рассчитывает рейтинги пачками, возвращает пары (id профиля, рейтинг)"""
+    profile_ids = list(profile_ids)
+    for start in range(0, len(profile_ids), batch_size):
+        cohort = load_cohort(profile_ids[start:start + batch_size])
+        yield from zip(cohort.profile_ids, calculate_cohort_ratings(cohort))
+
+
+def rerate_survey_results(results, ruleset_version):
+    """
+    Пересчитывает рейтинги пачки SurveyResult (пары pk, id профиля) и
+    сохраняет их одним UPDATE вместе с колонками рейтинга и версией правил
+    """
+    result_pks = {profile_id: pk for pk, profile_id in results}
+    cohort = load_cohort(list(result_pks))
+    timestamp = now()
+
+    rows = []
+    for profile_id, rating in zip(cohort.profile_ids, calculate_cohort_ratings(cohort)):
+        row = SurveyResult(pk=result_pks[profile_id], ruleset_version=ruleset_version, updated_at=timestamp)
+        row.set_rating(rating)
+        rows.append(row)
+
+    with transaction.atomic():
+        SurveyResult.objects.bulk_update(
+            rows, ['calculated_rating', *SurveyResult.RATING_COLUMNS, 'ruleset_version', 'updated_at']
+        )
+    return len(rows)
+
+
+# Константы и функции пакетного движка, от которых зависит рейтинг. Их хэш
+# входит в версию правил (QuestionGraph.ruleset_version) наравне с
+# RATING_RULESET_HASH: правка любого из движков делает рейтинги устаревшими
+COHORT_RULESET = (
+    'CATEGORY_KEYS', 'SMOKING_CIGARETTES', 'SMOKING_YEARS', 'BLOOD_PRESSURE', 'TEXT_LISTS',
+    'DESCRIPTIONS', 'SLOTS', 'FLAGS', 'RESULT_KEYS', 'SLOT_FLAG_RULES', 'NESTED_FLAG_RULES',
+    'EMOTIONAL_EATING_KEYS', 'PRESENCE_RESULT_KEYS',
+    '_nested_flag_rules', '_build_routing', 'Cohort', 'load_cohort', '_columns', '_lookup_table',
+    '_positions', '_float_sum', '_round', '_value_bits', '_last_per_profile', '_optional',
+    '_value_streams', '_category_streams', '_text_lists', '_text_list_score', '_blood_pressure',
+    '_measurement', '_lab_value', 'calculate_cohort_ratings',
+)
+
+COHORT_RULESET_HASH = compute_ruleset_hash(COHORT_RULESET, globals())
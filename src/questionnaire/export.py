@@ -0,0 +1,111 @@
+"""
+Потоковая выгрузка результатов опроса для аналитиков.
+
+SurveyResult читаются серверным курсором (iterator(chunk_size=...)), и
+каждая запись сразу превращается в строку CSV или NDJSON, поэтому расход
+памяти не зависит от размера таблицы. Одна строка на респондента: анкетные
+данные, колонки рейтинга и по колонке на порядковый номер вопроса.
+Используется командой export_results и выгрузкой в админке.
+"""
+import csv
+import json
+import zlib
+
+from .models import SurveyResult, QuestionBankSnapshot
+from .question_graph import get_question_graph
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 2000
+
+PROFILE_COLUMNS = ('session_key', 'gender', 'age', 'height', 'weight')
+RESULT_COLUMNS = ('created_at', 'updated_at') + SurveyResult.RATING_COLUMNS
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: writerow возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def question_column(order):
+    return f'q{order}'
+
+
+def get_columns():
+    """Заголовок выгрузки: колонки вопросов - по текущему банку вопросов"""
+    orders = [question.order for question in get_question_graph().questions]
+    return list(PROFILE_COLUMNS) + list(RESULT_COLUMNS) + [question_column(order) for order in orders]
+
+
+def answer_cell(question_data):
+    """Значение ячейки вопроса: число для числового ответа, иначе тексты через '; '"""
+    parts = [answer['answer_text'] for answer in question_data['selected_answers']]
+    if question_data['free_text_answer']:
+        parts.append(question_data['free_text_answer'])
+    if not parts and question_data['numeric_answer'] is not None:
+        return question_data['numeric_answer']
+    return '; '.join(parts)
+
+
+def iter_result_rows(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Плоские строки (словари) по всем SurveyResult в порядке pk"""
+    results = SurveyResult.objects.select_related('user_profile').defer(
+        'calculated_rating'
+    ).order_by('pk')
+
+    # Снимков банка вопросов единицы, каждый загружается один раз
+    snapshots = {}
+    for result in results.iterator(chunk_size=chunk_size):
+        snapshot_id = result.question_bank_snapshot_id
+        if snapshot_id is not None:
+            if snapshot_id not in snapshots:
+                snapshots[snapshot_id] = QuestionBankSnapshot.objects.get(pk=snapshot_id)
+            result.question_bank_snapshot = snapshots[snapshot_id]
+
+        profile = result.user_profile
+        row = {column: getattr(profile, column) for column in PROFILE_COLUMNS}
+        row.update({column: getattr(result, column) for column in RESULT_COLUMNS})
+        row['created_at'] = result.created_at.isoformat()
+        row['updated_at'] = result.updated_at.isoformat()
+        for question_data in result.get_responses_data()['questions']:
+            row[question_column(question_data['question_order'])] = answer_cell(question_data)
+        yield row
+
+
+def iter_export(fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Строки выгрузки в формате fmt ('csv' или 'ndjson'), начиная с заголовка для CSV"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    columns = get_columns()
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in iter_result_rows(chunk_size):
+            yield writer.writerow([row.get(column, '') for column in columns])
+    else:
+        for row in iter_result_rows(chunk_size):
+            yield json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False) + '\n'
+
+
+def gzip_chunks(lines, block_size=64 * 1024):
+    """Сжимает поток строк в gzip, отдавая блоки примерно по block_size байт"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    buffer = []
+    buffered = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= block_size:
+            compressed = compressor.compress(b''.join(buffer))
+            buffer, buffered = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from questionnaire.models import SurveyResult
+
+
+class Command(BaseCommand):
+    help = ('Fills the indexed SurveyResult rating columns (total_score, rating, category '
+            'averages, bmi) from calculated_rating, in keyset-paginated batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of results updated per transaction'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Refill every result, not only those with empty columns'
+        )
+
+    def handle(self, *args, **options):
+        results = SurveyResult.objects.filter(calculated_rating__isnull=False).order_by('pk')
+        if not options['all']:
+            results = results.filter(rating__isnull=True)
+
+        updated = 0
+        last_pk = 0
+        while True:
+            chunk = list(results.filter(pk__gt=last_pk).values_list('pk', 'calculated_rating')[:options['batch_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+
+            rows = [SurveyResult(pk=pk, **SurveyResult.rating_columns(rating)) for pk, rating in chunk]
+            # updated_at не меняется: рейтинг тот же, меняется только его копия в колонках
+            with transaction.atomic():
+                SurveyResult.objects.bulk_update(rows, SurveyResult.RATING_COLUMNS)
+            updated += len(rows)
+            self.stdout.write(f'Backfilled {updated}')
+
+        self.stdout.write(self.style.SUCCESS(f'Rating columns filled for {updated} results'))
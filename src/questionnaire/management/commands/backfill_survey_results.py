@@ -0,0 +1,134 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from questionnaire.models import AnonymousUserProfile, SurveyResult
+from questionnaire.parallel import id_ranges, run_ranges, load_checkpoint, save_checkpoint
+from questionnaire.question_graph import get_question_graph
+from questionnaire.utils import load_survey_responses_bulk, rate_responses
+
+
+def pending_profiles():
+    """Заполнившие анкету профили без SurveyResult"""
+    return AnonymousUserProfile.objects.filter(filled_survey=True, survey_result__isnull=True)
+
+
+def backfill_range(start, end):
+    """
+    Создает SurveyResult для профилей диапазона id [start, end): ответы всех
+    профилей читаются двумя запросами, результаты вставляются одним bulk_create.
+    Возвращает (создано, пропущено профилей без ответов)
+    """
+    profiles = list(pending_profiles().filter(pk__gte=start, pk__lt=end))
+    if not profiles:
+        return 0, 0
+
+    graph = get_question_graph()
+    snapshot = graph.snapshot()
+    ruleset_version = graph.ruleset_version()
+    loaded = load_survey_responses_bulk([profile.pk for profile in profiles])
+
+    results = []
+    for profile in profiles:
+        if profile.pk not in loaded:
+            continue
+        questions, responses, first_answered = loaded[profile.pk]
+        responses_data = {
+            'profile_info': {
+                'gender': profile.gender,
+                'age': profile.age,
+                'height': profile.height,
+                'weight': profile.weight
+            },
+            'questions': questions
+        }
+        compact = SurveyResult.compact_responses_data(responses_data, snapshot)
+        result = SurveyResult(
+            user_profile=profile,
+            responses_data=compact or responses_data,
+            question_bank_snapshot=snapshot if compact else None,
+            ruleset_version=ruleset_version,
+            created_at=first_answered
+        )
+        result.set_rating(rate_responses(profile, responses))
+        results.append(result)
+
+    # Результат мог появиться параллельно (финализация анкеты) - он остается
+    SurveyResult.objects.bulk_create(results, ignore_conflicts=True)
+    return len(results), len(profiles) - len(results)
+
+
+class Command(BaseCommand):
+    help = ('Creates missing SurveyResults for completed profiles, splitting profile ids into '
+            'ranges processed in parallel worker processes, with a resumable checkpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (1 runs in the current process)'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=2000,
+            help='Width of a profile id range handled by one task'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default='backfill_survey_results.checkpoint',
+            help='File recording finished ranges; an interrupted run resumes from it'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Ignore and overwrite an existing checkpoint'
+        )
+
+    def handle(self, *args, **options):
+        bounds = pending_profiles().aggregate(first=Min('pk'), last=Max('pk'))
+        ranges = id_ranges(bounds['first'], bounds['last'], options['range_size'])
+
+        checkpoint = options['checkpoint']
+        params = {'range_size': options['range_size']}
+        done = set() if options['reset'] else load_checkpoint(checkpoint, params)
+        if done is None:
+            raise CommandError(f'{checkpoint} was written with different options; use --reset to start over')
+        ranges = [id_range for id_range in ranges if id_range[0] not in done]
+        self.stdout.write(f'{len(ranges)} id ranges to process ({len(done)} already done)')
+
+        started = time.monotonic()
+        created = skipped = processed = 0
+        failed = []
+        for id_range, result, error in run_ranges(backfill_range, ranges, options['workers']):
+            if error is not None:
+                failed.append(id_range)
+                self.stderr.write(f'Range {id_range[0]}-{id_range[1] - 1} failed: {error!r}')
+                continue
+            created += result[0]
+            skipped += result[1]
+            done.add(id_range[0])
+            save_checkpoint(checkpoint, params, done)
+            processed += 1
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Ranges {processed}/{len(ranges)}: created {created} results '
+                f'({created / elapsed if elapsed else 0:.0f} rows/s)'
+            )
+
+        if failed:
+            raise CommandError(f'{len(failed)} ranges failed; rerun the command to retry them')
+
+        # Все диапазоны обработаны: следующий запуск начнется с начала
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} survey results in {elapsed:.1f} s, '
+            f'skipped {skipped} completed profiles without responses'
+        ))
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from questionnaire.models import SurveyResult
+from questionnaire.question_graph import get_question_graph
+
+
+def _json_size(data):
+    return len(json.dumps(data, ensure_ascii=False).encode())
+
+
+class Command(BaseCommand):
+    help = ('Converts SurveyResult.responses_data to the compact format referencing '
+            'a question bank snapshot, in chunks, and reports the size reduction')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of results converted per transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how much space the conversion would save'
+        )
+
+    def handle(self, *args, **options):
+        snapshot = get_question_graph().snapshot()
+        results = SurveyResult.objects.filter(question_bank_snapshot__isnull=True).order_by('pk')
+
+        converted = skipped = size_before = size_after = 0
+        last_pk = 0
+        while True:
+            chunk = list(results.filter(pk__gt=last_pk).values_list('pk', 'responses_data')[:options['chunk_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+
+            rows = []
+            for pk, responses_data in chunk:
+                compact = None
+                if responses_data.get('format') != SurveyResult.COMPACT_FORMAT:
+                    compact = SurveyResult.compact_responses_data(responses_data, snapshot)
+                if compact is None:
+                    # Тексты не совпадают с текущим банком вопросов: остается полный формат
+                    skipped += 1
+                    continue
+                size_before += _json_size(responses_data)
+                size_after += _json_size(compact)
+                rows.append(SurveyResult(pk=pk, responses_data=compact, question_bank_snapshot=snapshot))
+
+            # updated_at не меняется: содержимое ответов то же
+            if rows and not options['dry_run']:
+                with transaction.atomic():
+                    SurveyResult.objects.bulk_update(rows, ['responses_data', 'question_bank_snapshot'])
+            converted += len(rows)
+            self.stdout.write(f'Converted {converted}, skipped {skipped}')
+
+        snapshot_size = _json_size(snapshot.questions)
+        saved = size_before - size_after - snapshot_size
+        ratio = (size_after + snapshot_size) / size_before if size_before else 1
+        self.stdout.write(
+            f'responses_data: {size_before} -> {size_after} bytes '
+            f'(+{snapshot_size} bytes question bank snapshot), '
+            f'{saved} bytes saved, {ratio:.1%} of the original size'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would convert" if options["dry_run"] else "Converted"} {converted} results, '
+            f'skipped {skipped} that do not match the current question bank'
+        ))
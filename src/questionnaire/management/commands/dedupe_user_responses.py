@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils.timezone import localdate
+
+from questionnaire.models import AnonymousUserProfile, UserResponse, ResponseAccumulator, DailyActivity
+from questionnaire.management.commands.rebuild_progress import rebuild_answered_counts
+
+
+class Command(BaseCommand):
+    help = ('Removes duplicate UserResponse rows for the same profile and question, keeping '
+            'the most recently updated one; run before adding the unique constraint')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many duplicates would be removed'
+        )
+
+    def handle(self, *args, **options):
+        groups = UserResponse.objects.order_by().values('user_profile', 'question').annotate(
+            total=Count('id'), first_created=Min('created_at')
+        ).filter(total__gt=1)
+
+        removed = 0
+        profiles = set()
+        for group in groups.iterator():
+            responses = list(UserResponse.objects.filter(
+                user_profile=group['user_profile'], question=group['question']
+            ).order_by('-updated_at', '-id').values_list('pk', 'created_at'))
+            keep, duplicates = responses[0][0], [pk for pk, _ in responses[1:]]
+            removed += len(duplicates)
+            profiles.add(group['user_profile'])
+            if options['dry_run']:
+                continue
+
+            with transaction.atomic():
+                UserResponse.objects.filter(pk__in=duplicates).delete()
+                # Оставшийся ответ сохраняет место первого ответа на вопрос
+                UserResponse.objects.filter(pk=keep).update(created_at=group['first_created'])
+                # В DailyActivity вместо всех строк группы остается одна - в день первого ответа
+                DailyActivity.remove_responses(Counter(localdate(created_at) for _, created_at in responses))
+                DailyActivity.increment(responses=1, date=localdate(group['first_created']))
+
+        if profiles and not options['dry_run']:
+            # Накопители соберутся заново из оставшихся ответов
+            ResponseAccumulator.objects.filter(user_profile__in=profiles).delete()
+            # Счетчик прогресса увеличивался на каждую строку, включая дубли
+            rebuild_answered_counts(AnonymousUserProfile.objects.filter(pk__in=profiles))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would remove" if options["dry_run"] else "Removed"} {removed} duplicate responses '
+            f'of {len(profiles)} profiles'
+        ))
@@ -0,0 +1,85 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from questionnaire.models import AnonymousUserProfile, SurveyResult
+from questionnaire.parallel import id_ranges, run_ranges
+from questionnaire.replay import empty_summary, compare_ratings, merge_summaries, format_summary, normalize_rating
+from questionnaire.utils import load_survey_responses_bulk, rate_responses
+
+
+def diff_range(start, end, examples=5):
+    """
+    Пересчитывает рейтинги SurveyResult с pk в [start, end) скалярным движком
+    utils.py и сравнивает их с сохраненными, ничего не записывая. Ответы всех
+    профилей диапазона читаются двумя запросами
+    """
+    summary = empty_summary()
+    results = list(SurveyResult.objects.filter(pk__gte=start, pk__lt=end).values_list(
+        'pk', 'user_profile_id', 'calculated_rating'
+    ))
+    if not results:
+        return summary
+
+    profile_ids = [profile_id for _, profile_id, _ in results]
+    profiles = AnonymousUserProfile.objects.in_bulk(profile_ids)
+    loaded = load_survey_responses_bulk(profile_ids)
+
+    for pk, profile_id, stored in results:
+        _, responses, _ = loaded.get(profile_id, ([], [], None))
+        current = normalize_rating(rate_responses(profiles[profile_id], responses))
+        compare_ratings(summary, pk, stored, current, examples)
+
+    return summary
+
+
+class Command(BaseCommand):
+    help = ('Recomputes calculated_rating for every SurveyResult with the current rules in '
+            'parallel worker processes and reports what would change, without writing anything')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (1 runs in the current process)'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=2000,
+            help='Width of a SurveyResult id range handled by one task'
+        )
+        parser.add_argument(
+            '--examples',
+            type=int,
+            default=5,
+            help='Number of changed SurveyResult ids to list'
+        )
+
+    def handle(self, *args, **options):
+        bounds = SurveyResult.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        ranges = id_ranges(bounds['first'], bounds['last'], options['range_size'])
+
+        started = time.monotonic()
+        summary = empty_summary()
+        for id_range, result, error in run_ranges(diff_range, ranges, options['workers']):
+            if error is not None:
+                raise error
+            merge_summaries(summary, result, options['examples'])
+        elapsed = time.monotonic() - started
+
+        total, changed = summary['total'], summary['changed']
+        self.stdout.write(
+            f'Compared {total} results in {elapsed:.1f} s '
+            f'({total / elapsed if elapsed else 0:.0f} results/s): {changed} would change'
+        )
+        if not changed:
+            self.stdout.write(self.style.SUCCESS('Stored ratings match the current rules'))
+            return
+
+        for line in format_summary(summary):
+            self.stdout.write(line)
+        self.stdout.write(self.style.WARNING(f'{changed} of {total} stored ratings differ from the current rules'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from questionnaire.replay import DEFAULT_CHUNK_SIZE, iter_snapshots
+
+
+class Command(BaseCommand):
+    help = ('Writes every SurveyResult as a self-contained JSONL snapshot (profile info, answers '
+            'with question descriptions, stored rating) for offline replay with replay_ratings')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='JSONL file to write'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows fetched from the database cursor at once'
+        )
+
+    def handle(self, *args, **options):
+        written = 0
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for line in iter_snapshots(options['chunk_size']):
+                output.write(line)
+                written += 1
+        self.stdout.write(self.style.SUCCESS(f'Dumped {written} snapshots to {options["output"]}'))
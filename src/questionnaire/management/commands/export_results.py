@@ -0,0 +1,64 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from questionnaire.export import FORMATS, DEFAULT_CHUNK_SIZE, iter_export, gzip_chunks
+
+
+class Command(BaseCommand):
+    help = ('Streams all survey results as CSV or NDJSON, one row per respondent and one '
+            'column per question order, reading the table with a server-side cursor')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write to ("-" for standard output)'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output with gzip'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows fetched from the database cursor at once'
+        )
+
+    def handle(self, *args, **options):
+        lines = iter_export(options['format'], options['chunk_size'])
+        written = 0
+
+        def counted(lines):
+            nonlocal written
+            for line in lines:
+                written += 1
+                yield line
+
+        lines = counted(lines)
+        if options['output'] == '-' and not options['gzip']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            chunks = gzip_chunks(lines) if options['gzip'] else (line.encode() for line in lines)
+            if options['output'] == '-':
+                self._write_chunks(sys.stdout.buffer, chunks)
+            else:
+                with open(options['output'], 'wb') as output:
+                    self._write_chunks(output, chunks)
+
+        rows = written - 1 if options['format'] == 'csv' else written
+        self.stderr.write(self.style.SUCCESS(f'Exported {rows} results'))
+
+    @staticmethod
+    def _write_chunks(output, chunks):
+        for chunk in chunks:
+            output.write(chunk)
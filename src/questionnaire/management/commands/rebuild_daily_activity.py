@@ -0,0 +1,38 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+from questionnaire.models import AnonymousUserProfile, UserResponse, DailyActivity
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the DailyActivity rollup (new responses and completed surveys per day) '
+            'from UserResponse rows; a completion is dated by the profile\'s last response')
+
+    def handle(self, *args, **options):
+        responses = dict(
+            UserResponse.objects.annotate(day=TruncDate('created_at')).order_by().values('day').annotate(
+                total=Count('pk')
+            ).values_list('day', 'total')
+        )
+
+        completions = Counter(
+            localdate(last_answered)
+            for last_answered in AnonymousUserProfile.objects.filter(filled_survey=True).annotate(
+                last_answered=Max('responses__created_at')
+            ).filter(last_answered__isnull=False).values_list('last_answered', flat=True).iterator()
+        )
+
+        days = sorted(responses.keys() | completions.keys())
+        with transaction.atomic():
+            DailyActivity.objects.all().delete()
+            DailyActivity.objects.bulk_create([
+                DailyActivity(date=day, responses=responses.get(day, 0), completions=completions.get(day, 0))
+                for day in days
+            ])
+
+        self.stdout.write(self.style.SUCCESS(f'Daily activity rebuilt for {len(days)} days'))
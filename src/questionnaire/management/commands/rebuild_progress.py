@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from questionnaire.models import AnonymousUserProfile, UserResponse
+
+
+def rebuild_answered_counts(profiles):
+    """Пересчитывает answered_count профилей выборки одним UPDATE; возвращает число профилей"""
+    answered = UserResponse.objects.filter(
+        user_profile=OuterRef('pk')
+    ).order_by().values('user_profile').annotate(
+        total=Count('question', distinct=True)
+    ).values('total')
+    return profiles.update(answered_count=Coalesce(Subquery(answered), 0))
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds AnonymousUserProfile.answered_count from UserResponse rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--session-key',
+            help='Rebuild only the profile with this session key'
+        )
+
+    def handle(self, *args, **options):
+        profiles = AnonymousUserProfile.objects.all()
+        if options['session_key']:
+            profiles = profiles.filter(session_key=options['session_key'])
+
+        # Один UPDATE на все профили вместо пересчета в Python
+        updated = rebuild_answered_counts(profiles)
+
+        self.stdout.write(self.style.SUCCESS(f'Progress rebuilt for {updated} profiles'))
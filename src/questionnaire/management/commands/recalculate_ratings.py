@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from questionnaire.cohort import rerate_survey_results
+from questionnaire.models import SurveyResult
+from questionnaire.question_graph import get_question_graph
+
+
+class Command(BaseCommand):
+    help = 'Recalculates SurveyResult.calculated_rating for all results with the batch rating engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of profiles loaded and rated at once'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        results = SurveyResult.objects.order_by('user_profile_id').values_list('pk', 'user_profile_id')
+        pairs = list(results)
+
+        updated = 0
+        for start in range(0, len(pairs), batch_size):
+            # Версия берется до загрузки ответов: при смене банка во время
+            # пересчета пачка останется устаревшей, а не ошибочно актуальной
+            ruleset_version = get_question_graph().ruleset_version()
+            updated += rerate_survey_results(pairs[start:start + batch_size], ruleset_version)
+            self.stdout.write(f'Recalculated {updated}/{len(pairs)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Ratings recalculated for {updated} results'))
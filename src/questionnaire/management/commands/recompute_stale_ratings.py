@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from questionnaire.cohort import rerate_survey_results
+from questionnaire.models import SurveyResult
+from questionnaire.question_graph import get_question_graph
+
+
+class Command(BaseCommand):
+    help = ('Recalculates calculated_rating only for SurveyResults whose ruleset version '
+            'differs from the current rating rules and question bank, in chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of results rated and saved at once'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many results are stale'
+        )
+
+    def handle(self, *args, **options):
+        current = get_question_graph().ruleset_version()
+        stale = SurveyResult.objects.exclude(ruleset_version=current).order_by('pk')
+        total = stale.count()
+        self.stdout.write(f'Ruleset version {current[:12]}: {total} stale results')
+        if options['dry_run'] or not total:
+            return
+
+        started = time.monotonic()
+        updated = 0
+        last_pk = 0
+        while True:
+            # Версия берется до загрузки ответов: при смене банка во время
+            # пересчета пачка останется устаревшей, а не ошибочно актуальной
+            ruleset_version = get_question_graph().ruleset_version()
+            chunk = list(stale.filter(pk__gt=last_pk).values_list('pk', 'user_profile_id')[:options['chunk_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+
+            updated += rerate_survey_results(chunk, ruleset_version)
+            elapsed = time.monotonic() - started
+            rate = updated / elapsed if elapsed else 0
+            remaining = max(total - updated, 0) / rate if rate else 0
+            self.stdout.write(f'Recomputed {updated}/{total} ({rate:.0f} results/s, ~{remaining:.0f} s left)')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {updated} stale results in {elapsed:.1f} s'
+        ))
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaire.parallel import run_ranges
+from questionnaire.replay import (
+    DEFAULT_RANGE_BYTES, byte_ranges, replay_range, empty_summary, merge_summaries, format_summary
+)
+
+
+class Command(BaseCommand):
+    help = ('Replays a JSONL dump of rating snapshots through the rating engine across worker '
+            'processes without touching the database, and compares the results with the stored ratings')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dump',
+            help='JSONL file written by dump_rating_snapshots'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (1 runs in the current process)'
+        )
+        parser.add_argument(
+            '--range-bytes',
+            type=int,
+            default=DEFAULT_RANGE_BYTES,
+            help='Size of a dump byte range handled by one task'
+        )
+        parser.add_argument(
+            '--output',
+            help='JSONL file to write the recomputed ratings to'
+        )
+        parser.add_argument(
+            '--examples',
+            type=int,
+            default=5,
+            help='Number of changed SurveyResult ids to list'
+        )
+        parser.add_argument(
+            '--fail-on-change',
+            action='store_true',
+            help='Exit with an error if any recomputed rating differs from the stored one'
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['dump']):
+            raise CommandError(f"{options['dump']} does not exist")
+
+        func = partial(
+            replay_range, options['dump'], examples=options['examples'], with_ratings=bool(options['output'])
+        )
+        ranges = byte_ranges(options['dump'], options['range_bytes'])
+
+        started = time.monotonic()
+        replayed = 0
+        summary = empty_summary()
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else None
+        try:
+            for byte_range, result, error in run_ranges(func, ranges, options['workers']):
+                if error is not None:
+                    raise CommandError(f'Range {byte_range[0]}-{byte_range[1]} failed: {error!r}') from error
+                count, range_summary, ratings = result
+                replayed += count
+                merge_summaries(summary, range_summary, options['examples'])
+                for pk, rating in ratings:
+                    output.write(json.dumps({'id': pk, 'calculated_rating': rating}, ensure_ascii=False) + '\n')
+        finally:
+            if output is not None:
+                output.close()
+        elapsed = time.monotonic() - started
+
+        total, changed = summary['total'], summary['changed']
+        self.stdout.write(
+            f'Replayed {replayed} snapshots in {elapsed:.1f} s '
+            f'({replayed / elapsed if elapsed else 0:.0f} snapshots/s); '
+            f'compared {total} with stored ratings: {changed} differ'
+        )
+        if not changed:
+            self.stdout.write(self.style.SUCCESS('Stored ratings match the current rules'))
+            return
+
+        for line in format_summary(summary):
+            self.stdout.write(line)
+        message = f'{changed} of {total} stored ratings differ from the current rules'
+        if options['fail_on_change']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from questionnaire.tasks import process_tasks
+
+
+class Command(BaseCommand):
+    help = 'Runs queued survey finalization tasks (saves SurveyResult and calculates ratings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the tasks that are due now and exit'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of tasks claimed at once'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                processed = process_tasks(options['batch_size'])
+                total += processed
+                if processed:
+                    self.stdout.write(f'Processed {processed} tasks')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Finalization worker stopped after {total} tasks'))
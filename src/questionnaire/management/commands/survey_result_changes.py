@@ -0,0 +1,51 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaire.changes import DEFAULT_LIMIT, get_changes
+
+
+class Command(BaseCommand):
+    help = ('Writes SurveyResults changed since a cursor as NDJSON, page by page, and '
+            'reports the cursor to resume from')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cursor',
+            default='',
+            help='Cursor returned by the previous run (empty to start from the beginning)'
+        )
+        parser.add_argument(
+            '--cursor-file',
+            help='File the cursor is read from and written back to after a successful run'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=DEFAULT_LIMIT,
+            help='Number of results fetched per page'
+        )
+
+    def handle(self, *args, **options):
+        cursor = options['cursor']
+        cursor_file = options['cursor_file']
+        if not cursor and cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file) as saved:
+                cursor = saved.read().strip()
+
+        exported = 0
+        has_more = True
+        while has_more:
+            try:
+                results, cursor, has_more = get_changes(cursor or None, options['page_size'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            for result in results:
+                self.stdout.write(json.dumps(result, ensure_ascii=False))
+            exported += len(results)
+
+        if cursor_file and cursor:
+            with open(cursor_file, 'w') as saved:
+                saved.write(cursor)
+        self.stderr.write(self.style.SUCCESS(f'Exported {exported} changed results, next cursor: {cursor or "-"}'))
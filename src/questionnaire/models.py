@@ -1,8 +1,14 @@
+import hashlib
+import json
+import uuid
+
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import connection, models
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.utils.timezone import now
+from django.utils.timezone import localdate, now
+
+from . import rating_cache
 
 
 class Question(models.Model):
@@ -148,6 +154,165 @@ class Answer(models.Model):
         return self.text
 
 
+class QuestionBankVersion(models.Model):
+    """Метка версии банка вопросов (вопросы + ответы)
+
+    Меняется при каждом сохранении или удалении Question/Answer, чтобы
+    процессы могли перестроить закэшированный граф вопросов.
+    """
+    token = models.CharField(
+        max_length=32,
+        verbose_name='Метка версии'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Версия банка вопросов'
+        verbose_name_plural = 'Версии банка вопросов'
+
+    def __str__(self):
+        return self.token
+
+    @classmethod
+    def current(cls):
+        """Возвращает текущую метку версии (создает ее при отсутствии)"""
+        token = cls.objects.filter(pk=1).values_list('token', flat=True).first()
+        if token is None:
+            token = cls.bump()
+        return token
+
+    @classmethod
+    def bump(cls):
+        """Выдает новую метку версии"""
+        token = uuid.uuid4().hex
+        cls.objects.update_or_create(pk=1, defaults={'token': token})
+        return token
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Answer)
+def bump_question_bank_version(sender, **kwargs):
+    # Срабатывает и в админке, и при loaddata (raw=True)
+    QuestionBankVersion.bump()
+
+
+class QuestionBankSnapshot(models.Model):
+    """Неизменяемый снимок банка вопросов, на который ссылаются компактные SurveyResult
+
+    Снимок хранит тексты вопросов, вариантов и рекомендаций один раз на все
+    результаты, собранные по этому банку. Одинаковое содержимое дает одинаковый
+    digest, поэтому повторная публикация того же банка не создает копий.
+    """
+    digest = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Хэш содержимого'
+    )
+    questions = models.JSONField(
+        verbose_name='Вопросы',
+        help_text='id вопроса -> текст, порядок и варианты ответов'
+    )
+    created_at = models.DateTimeField(
+        default=now,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        verbose_name = 'Снимок банка вопросов'
+        verbose_name_plural = 'Снимки банка вопросов'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Снимок банка вопросов {self.digest[:12]} ({self.created_at:%Y-%m-%d})"
+
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding:
+            raise ValidationError("Снимок банка вопросов нельзя изменить")
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def build_content(questions):
+        """Содержимое снимка по вопросам с загруженными вариантами ответов"""
+        return {
+            str(question.id): {
+                'text': question.text,
+                'order': question.order,
+                'answers': {
+                    str(answer.id): {
+                        'text': answer.text,
+                        'value': answer.value,
+                        'recommendation': answer.recommendation
+                    }
+                    for answer in question.answers.all()
+                }
+            }
+            for question in questions
+        }
+
+    @classmethod
+    def for_content(cls, content):
+        """Снимок с данным содержимым (создается при отсутствии)"""
+        digest = hashlib.sha256(
+            json.dumps(content, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+        snapshot, _ = cls.objects.get_or_create(digest=digest, defaults={'questions': content})
+        return snapshot
+
+    def compact(self, questions):
+        """
+        Компактные строки [id вопроса, [id вариантов], свободный ответ, число]
+        для списка ответов полного формата или None, если тексты ответов
+        расходятся со снимком
+        """
+        rows = []
+        for item in questions:
+            question = self.questions.get(str(item['question_id']))
+            if (question is None or question['text'] != item['question_text']
+                    or question['order'] != item['question_order']):
+                return None
+            for answer in item['selected_answers']:
+                known = question['answers'].get(str(answer['answer_id']))
+                if known is None or known != {
+                    'text': answer['answer_text'],
+                    'value': answer['value'],
+                    'recommendation': answer['recommendation']
+                }:
+                    return None
+            rows.append([
+                item['question_id'],
+                [answer['answer_id'] for answer in item['selected_answers']],
+                item['free_text_answer'],
+                item['numeric_answer']
+            ])
+        return rows
+
+    def expand(self, rows):
+        """Ответы полного формата по компактным строкам"""
+        questions = []
+        for question_id, answer_ids, free_text_answer, numeric_answer in rows:
+            question = self.questions[str(question_id)]
+            questions.append({
+                'question_id': question_id,
+                'question_text': question['text'],
+                'question_order': question['order'],
+                'selected_answers': [
+                    {
+                        'answer_id': answer_id,
+                        'answer_text': question['answers'][str(answer_id)]['text'],
+                        'value': question['answers'][str(answer_id)]['value'],
+                        'recommendation': question['answers'][str(answer_id)]['recommendation']
+                    }
+                    for answer_id in answer_ids
+                ],
+                'free_text_answer': free_text_answer,
+                'numeric_answer': numeric_answer
+            })
+        return questions
+
+
 class AnonymousUserProfile(models.Model):
     GENDER_CHOICES = [
         ('M', 'Мужской'),
@@ -185,6 +350,11 @@ class AnonymousUserProfile(models.Model):
         default=False,
         verbose_name='Анкета заполнена'
     )
+    answered_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Отвечено вопросов',
+        help_text='Счетчик вопросов с ответом (для прогресса анкеты)'
+    )
 
     class Meta:
         verbose_name = 'Анонимный профиль'
@@ -226,19 +396,120 @@ class UserResponse(models.Model):
         blank=True,
         verbose_name='Числовой ответ'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Ответ пользователя'
         verbose_name_plural = 'Ответы пользователей'
         ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_profile', 'question'],
+                name='unique_response_per_question'
+            ),
+        ]
 
     def __str__(self):
         return (f"Ответ {self.user_profile.session_key} на вопрос "
                 f"'{self.question.text[:30]}...' ({self.created_at:%Y-%m-%d %H:%M})")
 
+    @classmethod
+    def upsert(cls, user_profile_id, rows):
+        """
+        Сохраняет ответы профиля одним INSERT ... ON CONFLICT DO UPDATE.
+
+        rows - список (id вопроса, свободный ответ, числовой ответ). Возвращает
+        {id вопроса: (id ответа, создан ли ответ)}. created_at существующего
+        ответа не меняется, поэтому новая строка узнается по created_at = updated_at.
+        Сигналы post_save не отправляются: кэш рейтинга устаревает по updated_at
+        """
+        rows = {question_id: (free_text, numeric) for question_id, free_text, numeric in rows}
+        if not rows:
+            return {}
+
+        qn = connection.ops.quote_name
+        timestamp = connection.ops.adapt_datetimefield_value(now())
+        columns = ['user_profile_id', 'question_id', 'free_text_answer', 'numeric_answer', 'created_at', 'updated_at']
+        updated = ['free_text_answer', 'numeric_answer', 'updated_at']
+        params = []
+        for question_id, (free_text, numeric) in rows.items():
+            params += [user_profile_id, question_id, free_text, numeric, timestamp, timestamp]
+
+        sql = (
+            f"INSERT INTO {qn(cls._meta.db_table)} ({', '.join(qn(column) for column in columns)}) "
+            f"VALUES {', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))} "
+            f"ON CONFLICT ({qn('user_profile_id')}, {qn('question_id')}) DO UPDATE SET "
+            f"{', '.join(f'{qn(column)} = EXCLUDED.{qn(column)}' for column in updated)} "
+            f"RETURNING {qn('question_id')}, {qn('id')}, {qn('created_at')} = {qn('updated_at')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {question_id: (pk, bool(created)) for question_id, pk, created in cursor.fetchall()}
+
+    @classmethod
+    def set_selected_answers(cls, selected, created=()):
+        """
+        Приводит выбранные варианты к selected ({id ответа: множество id вариантов}),
+        удаляя и добавляя только отличающиеся строки. Для только что созданных
+        ответов (created) существующие строки не читаются
+        """
+        Through = cls.selected_answers.through
+        existing = {}
+        to_diff = [pk for pk in selected if pk not in created]
+        if to_diff:
+            for through_pk, response_id, answer_id in Through.objects.filter(
+                userresponse_id__in=to_diff
+            ).values_list('pk', 'userresponse_id', 'answer_id'):
+                existing.setdefault(response_id, {})[answer_id] = through_pk
+
+        removed = [
+            through_pk
+            for response_id, rows in existing.items()
+            for answer_id, through_pk in rows.items()
+            if answer_id not in selected[response_id]
+        ]
+        if removed:
+            Through.objects.filter(pk__in=removed).delete()
+
+        # Параллельный запрос мог уже вставить ту же пару: дубликат пропускается
+        added = [
+            Through(userresponse_id=response_id, answer_id=answer_id)
+            for response_id, answer_ids in selected.items()
+            for answer_id in sorted(answer_ids)
+            if answer_id not in existing.get(response_id, {})
+        ]
+        if added:
+            Through.objects.bulk_create(added, ignore_conflicts=True)
+
+
+@receiver([post_save, post_delete], sender=UserResponse)
+def invalidate_rating_on_response(sender, instance, **kwargs):
+    rating_cache.invalidate([instance.user_profile_id])
+
+
+@receiver(m2m_changed, sender=UserResponse.selected_answers.through)
+def invalidate_rating_on_selected_answers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        rating_cache.invalidate([instance.user_profile_id])
+        return
+
+    # Изменение со стороны Answer: затронуты профили всех связанных ответов
+    responses = UserResponse.objects.filter(selected_answers=instance)
+    if pk_set:
+        responses = UserResponse.objects.filter(pk__in=pk_set)
+    rating_cache.invalidate(responses.values_list('user_profile_id', flat=True))
+
 
 class SurveyResult(models.Model):
     """Модель для хранения полных результатов опроса"""
+    # Метка компактного формата responses_data
+    COMPACT_FORMAT = 2
+
     user_profile = models.OneToOneField(
         AnonymousUserProfile,
         on_delete=models.CASCADE,
@@ -247,13 +518,29 @@ class SurveyResult(models.Model):
     )
     responses_data = models.JSONField(
         verbose_name='Данные ответов',
-        help_text='Все ответы в формате JSON'
+        help_text='Все ответы в формате JSON (полном или компактном со ссылкой на снимок банка вопросов)'
+    )
+    question_bank_snapshot = models.ForeignKey(
+        QuestionBankSnapshot,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name='survey_results',
+        verbose_name='Снимок банка вопросов'
     )
     calculated_rating = models.JSONField(
         verbose_name='Рассчитанный рейтинг',
         null=True,
         blank=True
     )
+    ruleset_version = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        verbose_name='Версия правил расчета',
+        help_text='Хэш правил расчета и банка вопросов, по которым получен calculated_rating'
+    )
     created_at = models.DateTimeField(
         default=now,
         verbose_name='Дата создания'
@@ -263,10 +550,296 @@ class SurveyResult(models.Model):
         verbose_name='Дата обновления'
     )
 
+    # Скалярные поля calculated_rating, вынесенные в индексируемые колонки
+    # для фильтрации и сортировки без разбора JSON
+    total_score = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Общий балл'
+    )
+    rating = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Рейтинг'
+    )
+    medico_biological_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: медико-биологические факторы'
+    )
+    stress_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: стресс'
+    )
+    nutrition_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: питание'
+    )
+    eating_behavior_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: пищевое поведение'
+    )
+    work_assessment_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: самооценка труда'
+    )
+    lifestyle_avg = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Средний балл: образ жизни и ФАиРД'
+    )
+    bmi = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='ИМТ'
+    )
+    bmi_category = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Категория ИМТ'
+    )
+
+    # Колонки, заполняемые из calculated_rating (см. rating_columns)
+    RATING_COLUMNS = (
+        'total_score', 'rating',
+        'medico_biological_avg', 'stress_avg', 'nutrition_avg',
+        'eating_behavior_avg', 'work_assessment_avg', 'lifestyle_avg',
+        'bmi', 'bmi_category',
+    )
+
     class Meta:
         verbose_name = 'Результат опроса'
         verbose_name_plural = 'Результаты опросов'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='surveyresult_created_idx'),
+            models.Index(fields=['rating', '-total_score'], name='surveyresult_rating_score_idx'),
+            # Ключ страниц ленты изменений (questionnaire.changes)
+            models.Index(fields=['updated_at', 'id'], name='surveyresult_changes_idx'),
+        ]
+
+    def __str__(self):
+        return f"Результат опроса {self.user_profile.session_key} ({self.created_at:%Y-%m-%d})"
+
+    def get_responses_data(self):
+        """Ответы в полном формате; компактные данные разворачиваются по снимку банка вопросов"""
+        data = self.responses_data
+        if data.get('format') != self.COMPACT_FORMAT:
+            return data
+        return {
+            'profile_info': data['profile_info'],
+            'questions': self.question_bank_snapshot.expand(data['questions'])
+        }
+
+    @classmethod
+    def rating_columns(cls, rating):
+        """Значения индексируемых колонок из словаря рейтинга (заглушки 'Нет данных' - NULL)"""
+        rating = rating or {}
+        columns = {}
+        for name in cls.RATING_COLUMNS:
+            value = rating.get(name)
+            field = cls._meta.get_field(name)
+            if isinstance(field, models.FloatField):
+                value = float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+            elif not isinstance(value, str):
+                value = None
+            columns[name] = value
+        return columns
+
+    def set_rating(self, rating):
+        """Устанавливает calculated_rating вместе с индексируемыми колонками"""
+        self.calculated_rating = rating
+        for name, value in self.rating_columns(rating).items():
+            setattr(self, name, value)
+
+    @classmethod
+    def compact_responses_data(cls, responses_data, snapshot):
+        """Компактное представление полных данных ответов или None, если оно невозможно"""
+        rows = snapshot.compact(responses_data['questions'])
+        if rows is None:
+            return None
+        return {
+            'format': cls.COMPACT_FORMAT,
+            'profile_info': responses_data['profile_info'],
+            'questions': rows
+        }
+
+
+class ResponseAccumulator(models.Model):
+    """Накопитель ответов профиля для расчета рейтинга без повторного чтения ответов
+
+    Обновляется при каждом сохранении ответа: запись вопроса заменяется
+    целиком, поэтому повторный ответ вытесняет предыдущий. Порядковый номер
+    seq сохраняет порядок первого ответа (как created_at у UserResponse).
+    Запись хранит только id вариантов и введенные значения: тексты
+    подставляются из графа вопросов той же версии при финализации.
+    """
+    user_profile = models.OneToOneField(
+        AnonymousUserProfile,
+        on_delete=models.CASCADE,
+        related_name='response_accumulator',
+        verbose_name='Профиль пользователя'
+    )
+    question_bank_version = models.CharField(
+        max_length=32,
+        verbose_name='Версия банка вопросов',
+        help_text='Метка QuestionBankVersion, по которой собраны записи'
+    )
+    entries = models.JSONField(
+        default=dict,
+        verbose_name='Записи ответов',
+        help_text='id выбранных вариантов и введенные значения по id вопроса'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Накопитель ответов'
+        verbose_name_plural = 'Накопители ответов'
+
+    def __str__(self):
+        return f"Накопитель ответов {self.user_profile.session_key}"
+
+
+class FinalizationTask(models.Model):
+    """Задача фоновой финализации анкеты (сохранение SurveyResult с расчетом рейтинга)
+
+    Одна задача на профиль: повторная постановка не создает дублей, а
+    повторное выполнение лишь перезаписывает SurveyResult.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    user_profile = models.OneToOneField(
+        AnonymousUserProfile,
+        on_delete=models.CASCADE,
+        related_name='finalization_task',
+        verbose_name='Профиль пользователя'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    run_after = models.DateTimeField(
+        default=now,
+        verbose_name='Выполнить после'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Начало выполнения'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    created_at = models.DateTimeField(
+        default=now,
+        verbose_name='Дата создания'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Задача финализации'
+        verbose_name_plural = 'Задачи финализации'
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='finalization_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Финализация {self.user_profile.session_key} ({self.get_status_display()})"
+
+
+class DailyActivity(models.Model):
+    """Число новых ответов и заполненных анкет за день
+
+    Счетчики увеличиваются при сохранении ответов и завершении анкеты, поэтому
+    навигация по датам в админке ответов и график завершений строятся по
+    этой таблице без просмотра UserResponse. Добавление и удаление ответов в
+    админке и команда dedupe_user_responses тоже меняют счетчики; при
+    расхождении таблица пересобирается командой rebuild_daily_activity.
+    """
+    date = models.DateField(
+        unique=True,
+        verbose_name='Дата'
+    )
+    responses = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Новых ответов'
+    )
+    completions = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Заполненных анкет'
+    )
+
+    class Meta:
+        verbose_name = 'Активность за день'
+        verbose_name_plural = 'Активность по дням'
+        ordering = ['-date']
 
     def __str__(self):
-        return f"Результат опроса {self.user_profile.session_key} ({self.created_at:%Y-%m-%d})"
\ No newline at end of file
+        return f"Активность {self.date:%Y-%m-%d}"
+
+    @classmethod
+    def increment(cls, responses=0, completions=0, date=None):
+        """
+        Атомарно увеличивает счетчики дня (по умолчанию сегодняшнего) одним
+        INSERT ... ON CONFLICT DO UPDATE: строка дня создается при первом событии
+        """
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} ({qn('date')}, {qn('responses')}, {qn('completions')}) VALUES (%s, %s, %s) "
+            f"ON CONFLICT ({qn('date')}) DO UPDATE SET "
+            f"{qn('responses')} = {table}.{qn('responses')} + EXCLUDED.{qn('responses')}, "
+            f"{qn('completions')} = {table}.{qn('completions')} + EXCLUDED.{qn('completions')}"
+        )
+        day = connection.ops.adapt_datefield_value(date or localdate())
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [day, responses, completions])
+
+    @classmethod
+    def remove_responses(cls, counts):
+        """
+        Уменьшает счетчики ответов по словарю {дата: число удаленных ответов}.
+        День, счетчик которого уже меньше (таблица расходится с ответами),
+        не меняется - его исправит rebuild_daily_activity
+        """
+        for day, count in counts.items():
+            cls.objects.filter(date=day, responses__gte=count).update(responses=models.F('responses') - count)
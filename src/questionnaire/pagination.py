@@ -0,0 +1,128 @@
+"""
+Постраничный вывод больших таблиц в админке.
+
+SELECT COUNT(*) по десяткам миллионов строк занимает секунды, поэтому
+EstimatedCountPaginator берет число строк из статистики планировщика
+Postgres: для выборки без фильтров - pg_class.reltuples, для выборки с
+фильтрами - оценку строк из EXPLAIN. Точный подсчет делается, только если
+оценка не больше ESTIMATED_COUNT_THRESHOLD (и всегда вне Postgres).
+
+OFFSET глубоких страниц тоже дорог, поэтому KeysetChangeList при сортировке
+по первичному ключу дает ссылку на следующую страницу вида ?after=<id>:
+страница начинается сразу после последней строки предыдущей по индексу.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+AFTER_VAR = 'after'
+DEFAULT_EXACT_COUNT_THRESHOLD = 100_000
+
+
+def estimate_count(queryset):
+    """Оценка числа строк выборки планировщиком Postgres; None для других СУБД"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            # -1 у таблицы, по которой еще не собрана статистика
+            return int(row[0]) if row and row[0] >= 0 else None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с оценкой числа строк вместо COUNT(*) для больших выборок"""
+    estimated = False
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', DEFAULT_EXACT_COUNT_THRESHOLD)
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > threshold:
+            self.estimated = True
+            return estimate
+        return super().count
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        # По оценке последняя страница известна неточно: верхняя граница не проверяется
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class KeysetChangeList(ChangeList):
+    """Список объектов админки со ссылкой на следующую страницу по ключу (?after=<id>)"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(AFTER_VAR)
+        super().__init__(request, *args, **kwargs)
+        # Ссылки сортировки и фильтров начинают список сначала
+        self.params.pop(AFTER_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def keyset_direction(self, queryset):
+        """'-' или '' для выборки, отсортированной по первичному ключу, иначе None"""
+        ordering = queryset.query.order_by
+        if len(ordering) != 1 or not isinstance(ordering[0], str):
+            return None
+        field = ordering[0].lstrip('-')
+        if field not in ('pk', self.lookup_opts.pk.name):
+            return None
+        return '-' if ordering[0].startswith('-') else ''
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        self.keyset_ordering = self.keyset_direction(queryset)
+        if self.after is None or self.keyset_ordering is None:
+            return queryset
+        try:
+            after = int(self.after)
+        except ValueError as exc:
+            raise IncorrectLookupParameters(exc) from exc
+        lookup = 'pk__lt' if self.keyset_ordering == '-' else 'pk__gt'
+        return queryset.filter(**{lookup: after})
+
+    @cached_property
+    def next_keyset_url(self):
+        """Ссылка на страницу после последней строки текущей или None"""
+        if self.keyset_ordering is None or self.show_all:
+            return None
+        rows = list(self.result_list)
+        if len(rows) < self.list_per_page:
+            return None
+        return self.get_query_string({AFTER_VAR: rows[-1].pk}, remove=[PAGE_VAR])
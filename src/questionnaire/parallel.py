@@ -0,0 +1,76 @@
+"""
+Параллельная обработка диапазонов id в пуле процессов для команд
+массового пересчета.
+
+Каждый процесс работает со своим соединением с базой: соединения родителя
+закрываются до запуска пула, а инициализатор воркера закрывает унаследованные
+при fork. При workers=1 диапазоны обрабатываются в текущем процессе.
+
+Файл контрольной точки хранит начала обработанных диапазонов: прерванный
+запуск продолжается с необработанных.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections
+
+
+def id_ranges(first_id, last_id, size):
+    """
+    Полуоткрытые диапазоны [start, end) шириной size, покрывающие first_id..last_id.
+    Границы кратны size, поэтому не сдвигаются между запусками, когда часть
+    строк уже обработана (на этом держится контрольная точка)
+    """
+    if first_id is None or last_id is None:
+        return []
+    first = first_id - first_id % size
+    return [(start, start + size) for start in range(first, last_id + 1, size)]
+
+
+def _init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def run_ranges(func, ranges, workers):
+    """
+    Выполняет func(start, end) для каждого диапазона и по мере готовности
+    отдает тройки (диапазон, результат, исключение или None)
+    """
+    if workers <= 1:
+        for id_range in ranges:
+            try:
+                yield id_range, func(*id_range), None
+            except Exception as exc:
+                yield id_range, None, exc
+        return
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(func, *id_range): id_range for id_range in ranges}
+        for future in as_completed(futures):
+            exc = future.exception()
+            yield futures[future], None if exc else future.result(), exc
+
+
+def load_checkpoint(path, params):
+    """Начала обработанных диапазонов; None, если файл записан с другими параметрами"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as checkpoint:
+        data = json.load(checkpoint)
+    if data.get('params') != params:
+        return None
+    return set(data['done'])
+
+
+def save_checkpoint(path, params, done):
+    """Атомарно перезаписывает файл контрольной точки"""
+    if not path:
+        return
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as checkpoint:
+        json.dump({'params': params, 'done': sorted(done)}, checkpoint)
+    os.replace(tmp_path, path)
@@ -0,0 +1,218 @@
+"""
+Граф вопросов анкеты, кэшируемый в памяти процесса.
+
+Вопросы, их ответы и переходы next_question загружаются одним набором
+запросов и переиспользуются, пока не изменится QuestionBankVersion.
+Метка версии меняется сигналами при сохранении/удалении Question и Answer,
+поэтому каждый воркер перестраивает свою копию по требованию.
+"""
+import hashlib
+import json
+import threading
+
+from django.db.models import Prefetch
+
+from .cohort import COHORT_RULESET_HASH
+from .models import Question, Answer, QuestionBankVersion, QuestionBankSnapshot
+from .utils import QUESTION_CATEGORIES, RATING_RULESET_HASH
+
+# Раздел для вопросов, не входящих ни в одну категорию QUESTION_CATEGORIES
+OTHER_SECTION_KEY = 'other'
+OTHER_SECTION_LABEL = 'Общие вопросы'
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+class QuestionSection:
+    """Группа вопросов одной категории, отображаемая на одной странице"""
+
+    def __init__(self, key, label, number):
+        self.key = key
+        self.label = label
+        self.number = number
+        self.questions = []
+
+    def __len__(self):
+        return len(self.questions)
+
+
+class QuestionGraph:
+    """Неизменяемый снимок банка вопросов для одной версии"""
+
+    def __init__(self, version, questions):
+        self.version = version
+        self.questions = list(questions)
+        self.by_order = {q.order: q for q in self.questions}
+        self.by_id = {q.id: q for q in self.questions}
+        self.answers_by_id = {
+            answer.id: answer
+            for question in self.questions
+            for answer in question.answers.all()
+        }
+        self._positions = {q.id: i for i, q in enumerate(self.questions)}
+        self.sections = build_sections(self.questions)
+        self.sections_by_key = {section.key: section for section in self.sections}
+        self._bundle = None
+        self._snapshot = None
+        self._ruleset_version = None
+
+    def __len__(self):
+        return len(self.questions)
+
+    def first(self):
+        """Первый вопрос анкеты"""
+        return self.questions[0] if self.questions else None
+
+    def get_by_order(self, order):
+        """Вопрос по порядковому номеру или None"""
+        return self.by_order.get(order)
+
+    def next_after(self, question):
+        """Следующий по порядку вопрос или None для последнего"""
+        position = self._positions.get(question.id)
+        if position is None:
+            return next((q for q in self.questions if q.order > question.order), None)
+        if position + 1 < len(self.questions):
+            return self.questions[position + 1]
+        return None
+
+    def next_for_answers(self, question, answer_ids):
+        """
+        Следующий вопрос для выбранных ответов: переход первого (по id)
+        выбранного ответа, иначе следующий по порядку
+        """
+        answers = [
+            self.answers_by_id[int(aid)]
+            for aid in answer_ids
+            if str(aid).isdigit() and int(aid) in self.answers_by_id
+        ]
+        if answers:
+            first_answer = min(answers, key=lambda a: a.id)
+            if first_answer.next_question_id:
+                next_question = self.by_id.get(first_answer.next_question_id)
+                if next_question:
+                    return next_question
+        return self.next_after(question)
+
+    def as_dict(self):
+        """Сериализуемое представление банка вопросов (вычисляется один раз)"""
+        if self._bundle is None:
+            self._bundle = {
+                'version': self.version,
+                'questions': [
+                    {
+                        'id': question.id,
+                        'order': question.order,
+                        'text': question.text,
+                        'description': question.description,
+                        'is_required': question.is_required,
+                        'allow_free_text': question.allow_free_text,
+                        'is_multiple_choice': question.is_multiple_choice,
+                        'is_numeric_input': question.is_numeric_input,
+                        'answers': [
+                            {
+                                'id': answer.id,
+                                'text': answer.text,
+                                'recommendation': answer.recommendation,
+                                'next_question_id': answer.next_question_id
+                            }
+                            for answer in question.answers.all()
+                        ]
+                    }
+                    for question in self.questions
+                ],
+                'sections': [
+                    {
+                        'key': section.key,
+                        'label': section.label,
+                        'questions': [question.id for question in section.questions]
+                    }
+                    for section in self.sections
+                ]
+            }
+        return self._bundle
+
+    def snapshot(self):
+        """Неизменяемый снимок банка вопросов этой версии (ищется или создается один раз)"""
+        if self._snapshot is None:
+            self._snapshot = QuestionBankSnapshot.for_content(
+                QuestionBankSnapshot.build_content(self.questions)
+            )
+        return self._snapshot
+
+    def ruleset_version(self):
+        """
+        Версия правил расчета рейтинга: хэши правил скалярного и пакетного
+        движков (RATING_RULESET_HASH, COHORT_RULESET_HASH) и тех полей
+        банка вопросов, от которых зависит расчет (описания, типы, значения
+        и тексты ответов). Правка формулировки вопроса версию не меняет
+        """
+        if self._ruleset_version is None:
+            bank = [
+                [
+                    question.id,
+                    question.description,
+                    question.is_numeric_input,
+                    [[answer.id, answer.value, answer.text] for answer in question.answers.all()]
+                ]
+                for question in self.questions
+            ]
+            content = json.dumps([RATING_RULESET_HASH, COHORT_RULESET_HASH, bank], ensure_ascii=False)
+            self._ruleset_version = hashlib.sha256(content.encode()).hexdigest()
+        return self._ruleset_version
+
+    def section_after(self, section):
+        """Следующий раздел или None для последнего"""
+        if section.number < len(self.sections):
+            return self.sections[section.number]
+        return None
+
+    def section_before(self, section):
+        """Предыдущий раздел или None для первого"""
+        if section.number > 1:
+            return self.sections[section.number - 2]
+        return None
+
+
+def build_sections(questions):
+    """
+    Группирует вопросы по категориям QUESTION_CATEGORIES в порядке появления
+    первого вопроса категории
+    """
+    categories = {}
+    for key, params in QUESTION_CATEGORIES.items():
+        for description in params['descriptions']:
+            categories.setdefault(description, (key, params['label']))
+
+    sections = {}
+    for question in questions:
+        key, label = categories.get(question.description, (OTHER_SECTION_KEY, OTHER_SECTION_LABEL))
+        if key not in sections:
+            sections[key] = QuestionSection(key, label, len(sections) + 1)
+        sections[key].questions.append(question)
+
+    return list(sections.values())
+
+
+def build_question_graph(version):
+    """Загружает граф вопросов из базы данных"""
+    questions = Question.objects.order_by('order').prefetch_related(
+        Prefetch('answers', queryset=Answer.objects.order_by('id'))
+    )
+    return QuestionGraph(version, questions)
+
+
+def get_question_graph():
+    """Возвращает актуальный граф вопросов, перестраивая его при смене версии"""
+    global _graph
+
+    version = QuestionBankVersion.current()
+    graph = _graph
+    if graph is not None and graph.version == version:
+        return graph
+
+    with _graph_lock:
+        if _graph is None or _graph.version != version:
+            _graph = build_question_graph(version)
+        return _graph
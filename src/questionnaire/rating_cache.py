@@ -0,0 +1,45 @@
+"""
+Кэш результатов расчета рейтинга.
+
+Запись хранится под ключом профиля вместе с меткой: время последнего
+изменения ответов профиля, пол, возраст, рост и вес профиля, версия банка
+вопросов и версия правил расчета. Несовпадение метки при чтении означает
+устаревшую запись, поэтому изменения, сделанные другими процессами, видны
+и при кэше в памяти процесса. Сигналы UserResponse дополнительно удаляют
+запись профиля сразу, изменения Question/Answer меняют версию банка вопросов.
+
+Подходит любой бэкенд кэша Django; в LocMemCache размер ограничен
+MAX_ENTRIES с вытеснением давно не читавшихся записей.
+"""
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+
+KEY_TEMPLATE = 'rating:{}'
+
+
+def get_rating_cache():
+    """Кэш из settings.RATING_CACHE_ALIAS (при отсутствии - кэш по умолчанию)"""
+    alias = getattr(settings, 'RATING_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)
+    if alias not in settings.CACHES:
+        alias = DEFAULT_CACHE_ALIAS
+    return caches[alias]
+
+
+def get_cached(profile_id, stamp):
+    """Рейтинг из кэша или None, если записи нет или ее метка устарела"""
+    cached = get_rating_cache().get(KEY_TEMPLATE.format(profile_id))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    return None
+
+
+def set_cached(profile_id, stamp, rating):
+    """Сохраняет рейтинг профиля вместе с меткой"""
+    get_rating_cache().set(KEY_TEMPLATE.format(profile_id), (stamp, rating))
+
+
+def invalidate(profile_ids):
+    """Удаляет записи перечисленных профилей"""
+    keys = [KEY_TEMPLATE.format(profile_id) for profile_id in set(profile_ids) if profile_id is not None]
+    if keys:
+        get_rating_cache().delete_many(keys)
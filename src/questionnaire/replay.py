@@ -0,0 +1,161 @@
+"""
+Пересчет рейтингов без записи в базу: сравнение с сохраненными рейтингами
+и офлайн-повтор по выгрузке снимков ответов.
+
+Снимок - responses_data результата в полном формате, дополненный
+описанием и типом каждого вопроса, то есть всем, что нужно движку расчета.
+Выгрузка снимков (JSONL, запись на строку) делается командой
+dump_rating_snapshots, повтор - командой replay_ratings, которой база уже
+не нужна: файл делится на диапазоны байтов, обрабатываемые параллельно.
+
+Сводка сравнения общая для повтора и команды diff_ratings: изменившиеся
+ключи рейтинга, переходы между категориями rating и распределение
+изменения total_score.
+"""
+import bisect
+import json
+import os
+from collections import Counter
+
+from .models import Question, SurveyResult, QuestionBankSnapshot
+from .utils import rate_snapshot
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_RANGE_BYTES = 8 * 1024 * 1024
+
+# Границы корзин распределения изменения total_score (нулевые изменения не считаются)
+DELTA_EDGES = (-0.2, -0.1, -0.05, -0.01, 0, 0.01, 0.05, 0.1, 0.2)
+
+
+def delta_bucket_labels():
+    bounds = ('-inf',) + DELTA_EDGES + ('+inf',)
+    return [f'[{low}, {high})' for low, high in zip(bounds, bounds[1:])]
+
+
+def empty_summary():
+    return {
+        'total': 0,
+        'changed': 0,
+        'keys': Counter(),
+        'transitions': Counter(),
+        'deltas': [0] * (len(DELTA_EDGES) + 1),
+        'examples': [],
+    }
+
+
+def normalize_rating(rating):
+    """Рейтинг в том виде, в каком он хранится в JSONField (кортежи - списки)"""
+    return json.loads(json.dumps(rating))
+
+
+def compare_ratings(summary, key, stored, current, examples):
+    """Учитывает в сводке расхождение сохраненного и пересчитанного рейтинга записи key"""
+    stored = stored or {}
+    summary['total'] += 1
+
+    changed_keys = [name for name in stored.keys() | current.keys() if stored.get(name) != current.get(name)]
+    if not changed_keys:
+        return
+    summary['changed'] += 1
+    summary['keys'].update(changed_keys)
+    if stored.get('rating') != current.get('rating'):
+        summary['transitions'][f"{stored.get('rating')} -> {current.get('rating')}"] += 1
+    if isinstance(stored.get('total_score'), (int, float)) and isinstance(current.get('total_score'), (int, float)):
+        delta = current['total_score'] - stored['total_score']
+        if delta:
+            summary['deltas'][bisect.bisect_right(DELTA_EDGES, delta)] += 1
+    if len(summary['examples']) < examples:
+        summary['examples'].append(key)
+
+
+def merge_summaries(summary, other, examples):
+    summary['total'] += other['total']
+    summary['changed'] += other['changed']
+    summary['keys'].update(other['keys'])
+    summary['transitions'].update(other['transitions'])
+    summary['deltas'] = [a + b for a, b in zip(summary['deltas'], other['deltas'])]
+    summary['examples'] = (summary['examples'] + other['examples'])[:examples]
+
+
+def format_summary(summary):
+    """Строки отчета о расхождениях"""
+    lines = ['Changed keys:']
+    lines += [f'  {key}: {count}' for key, count in summary['keys'].most_common()]
+    lines.append('Rating transitions:')
+    lines += [f'  {transition}: {count}' for transition, count in summary['transitions'].most_common()]
+    lines.append('total_score delta distribution:')
+    lines += [f'  {label}: {count}' for label, count in zip(delta_bucket_labels(), summary['deltas']) if count]
+    lines.append(f"Examples: {', '.join(map(str, summary['examples']))}")
+    return lines
+
+
+def question_meta():
+    """id вопроса -> (описание, числовой ли ответ) по текущему банку вопросов"""
+    return {
+        question_id: (description, is_numeric_input)
+        for question_id, description, is_numeric_input in Question.objects.values_list(
+            'id', 'description', 'is_numeric_input'
+        )
+    }
+
+
+def snapshot_record(result, meta):
+    """Запись выгрузки: снимок ответов результата и сохраненный рейтинг"""
+    data = result.get_responses_data()
+    questions = []
+    for question in data['questions']:
+        description, is_numeric_input = meta.get(question['question_id'], (None, False))
+        questions.append(dict(question, description=description, is_numeric_input=is_numeric_input))
+    return {
+        'id': result.pk,
+        'profile_info': data['profile_info'],
+        'questions': questions,
+        'calculated_rating': result.calculated_rating
+    }
+
+
+def iter_snapshots(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Строки JSONL со снимками всех SurveyResult в порядке pk"""
+    meta = question_meta()
+    snapshots = {}
+    for result in SurveyResult.objects.order_by('pk').iterator(chunk_size=chunk_size):
+        snapshot_id = result.question_bank_snapshot_id
+        if snapshot_id is not None:
+            if snapshot_id not in snapshots:
+                snapshots[snapshot_id] = QuestionBankSnapshot.objects.get(pk=snapshot_id)
+            result.question_bank_snapshot = snapshots[snapshot_id]
+        yield json.dumps(snapshot_record(result, meta), ensure_ascii=False) + '\n'
+
+
+def byte_ranges(path, size=DEFAULT_RANGE_BYTES):
+    """Диапазоны байтов [start, end) файла; строка относится к диапазону, где она начинается"""
+    length = os.path.getsize(path)
+    return [(start, min(start + size, length)) for start in range(0, length, size)]
+
+
+def replay_range(path, start, end, examples=5, with_ratings=False):
+    """
+    Пересчитывает снимки, строки которых начинаются в [start, end), и
+    сравнивает их с сохраненными рейтингами. Возвращает (число снимков, сводка,
+    список пар (id, рейтинг) при with_ratings, иначе пустой)
+    """
+    summary = empty_summary()
+    ratings = []
+    replayed = 0
+    with open(path, 'rb') as dump:
+        if start:
+            # Хвост строки, начавшейся в предыдущем диапазоне
+            dump.seek(start - 1)
+            dump.readline()
+        while dump.tell() < end:
+            line = dump.readline()
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            current = normalize_rating(rate_snapshot(record))
+            replayed += 1
+            if 'calculated_rating' in record:
+                compare_ratings(summary, record['id'], record['calculated_rating'], current, examples)
+            if with_ratings:
+                ratings.append((record['id'], current))
+    return replayed, summary, ratings
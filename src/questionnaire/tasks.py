@@ -0,0 +1,95 @@
+"""
+Очередь фоновой финализации анкет в таблице FinalizationTask.
+
+Последний ответ только ставит задачу; сохранение SurveyResult и расчет
+рейтинга выполняет воркер (manage.py run_finalization_worker). Задачи
+забираются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому воркеров может
+быть несколько. Неудачная попытка откладывается с экспоненциальной паузой,
+после FINALIZATION_MAX_ATTEMPTS задача помечается ошибочной. Задача,
+зависшая в статусе running дольше FINALIZATION_STALE_AFTER (упавший
+воркер), забирается повторно.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import FinalizationTask
+from .utils import save_survey_results
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 5
+DEFAULT_STALE_AFTER = 10 * 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_finalization(profile):
+    """Ставит финализацию профиля в очередь (повторный вызов не создает дублей)"""
+    task, created = FinalizationTask.objects.get_or_create(user_profile=profile)
+    if not created and task.status in (FinalizationTask.STATUS_DONE, FinalizationTask.STATUS_FAILED):
+        # Повторное завершение (анкета снова открыта в админке) или новая
+        # постановка после исчерпанных попыток: задача выполняется заново
+        task.status, task.attempts, task.run_after, task.last_error = FinalizationTask.STATUS_PENDING, 0, now(), ''
+        FinalizationTask.objects.filter(pk=task.pk).update(
+            status=task.status, attempts=task.attempts, run_after=task.run_after, last_error=task.last_error
+        )
+    return task
+
+
+def claim_tasks(limit):
+    """Забирает до limit готовых к выполнению задач и помечает их выполняемыми"""
+    current = now()
+    stale = current - timedelta(seconds=_setting('FINALIZATION_STALE_AFTER', DEFAULT_STALE_AFTER))
+
+    with transaction.atomic():
+        tasks = list(
+            FinalizationTask.objects.select_for_update(skip_locked=True).filter(
+                Q(status=FinalizationTask.STATUS_PENDING, run_after__lte=current) |
+                Q(status=FinalizationTask.STATUS_RUNNING, started_at__lt=stale)
+            ).select_related('user_profile').order_by('run_after')[:limit]
+        )
+        for task in tasks:
+            task.status = FinalizationTask.STATUS_RUNNING
+            task.attempts += 1
+            task.started_at = current
+            task.updated_at = current
+        FinalizationTask.objects.bulk_update(tasks, ['status', 'attempts', 'started_at', 'updated_at'])
+
+    return tasks
+
+
+def run_task(task):
+    """Выполняет финализацию; при ошибке откладывает задачу или помечает ее ошибочной"""
+    try:
+        save_survey_results(task.user_profile)
+    except Exception as exc:
+        logger.exception("Finalization of profile %s failed", task.user_profile_id)
+        task.last_error = repr(exc)
+        if task.attempts >= _setting('FINALIZATION_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+            task.status = FinalizationTask.STATUS_FAILED
+        else:
+            delay = _setting('FINALIZATION_RETRY_DELAY', DEFAULT_RETRY_DELAY) * 2 ** (task.attempts - 1)
+            task.status = FinalizationTask.STATUS_PENDING
+            task.run_after = now() + timedelta(seconds=delay)
+    else:
+        task.status = FinalizationTask.STATUS_DONE
+        task.last_error = ''
+
+    task.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+    return task.status == FinalizationTask.STATUS_DONE
+
+
+def process_tasks(limit=50):
+    """Выполняет одну пачку задач, возвращает количество обработанных"""
+    tasks = claim_tasks(limit)
+    for task in tasks:
+        run_task(task)
+    return len(tasks)
@@ -0,0 +1,96 @@
+"""
+Навигация по датам в админке ответов по таблице DailyActivity.
+
+Встроенный тег date_hierarchy строит ссылки годов, месяцев и дней через
+DISTINCT date_trunc по всей таблице UserResponse. Этот тег дает ту же
+разметку (шаблон admin/date_hierarchy.html), но берет даты из дневной
+сводки, поэтому ссылки отражают все ответы без учета фильтров списка.
+"""
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from questionnaire.models import DailyActivity
+
+register = template.Library()
+
+
+def activity_date_hierarchy(cl):
+    field_name = cl.date_hierarchy
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+    days = DailyActivity.objects.filter(responses__gt=0)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if not (year_lookup or month_lookup or day_lookup):
+        # Начальный уровень - как у date_hierarchy: один год или месяц сразу раскрыт
+        date_range = days.aggregate(first=Min('date'), last=Max('date'))
+        if date_range['first'] and date_range['first'].year == date_range['last'].year:
+            year_lookup = date_range['first'].year
+            if date_range['first'].month == date_range['last'].month:
+                month_lookup = date_range['first'].month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+        }
+    if year_lookup and month_lookup:
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT')),
+                }
+                for day in days.filter(date__year=year_lookup, date__month=month_lookup).dates('date', 'day')
+            ],
+        }
+    if year_lookup:
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month.month}),
+                    'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+                }
+                for month in days.filter(date__year=year_lookup).dates('date', 'month')
+            ],
+        }
+    return {
+        'show': True,
+        'back': None,
+        'choices': [
+            {'link': link({year_field: str(year.year)}), 'title': str(year.year)}
+            for year in days.dates('date', 'year')
+        ],
+    }
+
+
+@register.tag(name='activity_date_hierarchy')
+def activity_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser,
+        token,
+        func=activity_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
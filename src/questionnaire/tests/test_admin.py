@@ -1,7 +1,13 @@
+import datetime
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
-from questionnaire.models import Question, AnonymousUserProfile, UserResponse, Answer
+from django.utils.timezone import localdate
+from questionnaire.models import Question, AnonymousUserProfile, UserResponse, Answer, SurveyResult, DailyActivity
 
 
 class AdminTests(TransactionTestCase):
@@ -239,6 +245,177 @@ class AdminTests(TransactionTestCase):
         response = self.client.get(url)
         self.assertContains(response, "M, 30 лет, 180.0 см, 75.0 кг")
 
+    def test_user_response_changelist_query_count_is_constant(self):
+        answers = [Answer.objects.create(question=self.question, text=f"Answer {index}") for index in range(3)]
+        url = reverse('admin:questionnaire_userresponse_changelist')
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        baseline = count_queries()
+
+        # Полная страница: у каждого ответа свой профиль и несколько выбранных вариантов
+        for index in range(20):
+            profile = AnonymousUserProfile.objects.create(session_key=f"admin_page_{index}", gender='F', age=20)
+            UserResponse.objects.create(user_profile=profile, question=self.question).selected_answers.set(answers)
+
+        self.assertEqual(count_queries(), baseline)
+
+    def test_user_response_search_does_not_duplicate_rows(self):
+        self.response.selected_answers.add(
+            Answer.objects.create(question=self.question, text="Match one"),
+            Answer.objects.create(question=self.question, text="Match two")
+        )
+
+        url = reverse('admin:questionnaire_userresponse_changelist')
+        response = self.client.get(url, {'q': 'match'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertEqual(list(response.context['cl'].result_list), [self.response])
+
+        response = self.client.get(url, {'q': 'comment'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.free_text_response])
+
+    def test_profile_answered_count_is_read_only(self):
+        url = reverse('admin:questionnaire_anonymoususerprofile_change', args=[self.profile.pk])
+        form = self.client.get(url).context['adminform'].form
+        self.assertNotIn('answered_count', form.fields)
+
+    def test_profile_changelist_keyset_next_page(self):
+        for index in range(25):
+            AnonymousUserProfile.objects.create(session_key=f"keyset_{index}")
+        expected = list(AnonymousUserProfile.objects.order_by('-id'))
+        url = reverse('admin:questionnaire_anonymoususerprofile_changelist')
+
+        response = self.client.get(url)
+        cl = response.context['cl']
+        self.assertEqual(list(cl.result_list), expected[:20])
+        self.assertEqual(cl.next_keyset_url, f'?after={expected[19].pk}')
+        self.assertContains(response, f'href="?after={expected[19].pk}"')
+
+        response = self.client.get(url + cl.next_keyset_url)
+        cl = response.context['cl']
+        self.assertEqual(list(cl.result_list), expected[20:])
+        self.assertIsNone(cl.next_keyset_url)
+
+        # Фильтр применяется вместе с ключом
+        response = self.client.get(url, {'after': expected[19].pk, 'filled_survey__exact': '0'})
+        self.assertEqual(list(response.context['cl'].result_list), expected[20:])
+
+    def test_user_response_changelist_uses_estimated_count(self):
+        url = reverse('admin:questionnaire_userresponse_changelist')
+
+        with patch('questionnaire.pagination.estimate_count', return_value=5_000_000):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            cl = response.context['cl']
+            self.assertTrue(cl.paginator.estimated)
+            self.assertEqual(cl.result_count, 5_000_000)
+            self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+            self.assertContains(response, 'оценка по статистике')
+
+            # Глубокая страница за пределами фактических строк не приводит к ошибке
+            response = self.client.get(url, {'p': 1000})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['cl'].result_list), [])
+
+        # Ниже порога - точный подсчет
+        with patch('questionnaire.pagination.estimate_count', return_value=50):
+            cl = self.client.get(url).context['cl']
+            self.assertFalse(cl.paginator.estimated)
+            self.assertEqual(cl.result_count, UserResponse.objects.count())
+
+    def test_user_response_date_hierarchy_uses_daily_activity(self):
+        DailyActivity.objects.create(date=datetime.date(2024, 3, 5), responses=10, completions=2)
+        DailyActivity.objects.create(date=datetime.date(2025, 7, 1), responses=4, completions=1)
+        DailyActivity.objects.create(date=datetime.date(2023, 1, 1), responses=0, completions=0)
+        url = reverse('admin:questionnaire_userresponse_changelist')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, '?created_at__year=2024')
+        self.assertContains(response, '?created_at__year=2025')
+        self.assertNotContains(response, '?created_at__year=2023')
+        self.assertFalse([
+            query for query in queries
+            if 'questionnaire_userresponse' in query['sql'] and 'DISTINCT' in query['sql'].upper()
+        ])
+
+        response = self.client.get(url, {'created_at__year': '2024'})
+        self.assertContains(response, 'created_at__month=3')
+
+    def test_user_response_admin_updates_daily_activity(self):
+        # Три ответа из setUp созданы без счетчика
+        DailyActivity.objects.create(date=localdate(), responses=3)
+
+        response = self.client.post(reverse('admin:questionnaire_userresponse_add'), {
+            'user_profile': self.empty_profile.pk,
+            'question': self.free_text_question.pk,
+            'free_text_answer': 'Added in admin',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(DailyActivity.objects.get().responses, 4)
+
+        self.client.post(
+            reverse('admin:questionnaire_userresponse_delete', args=[self.response.pk]), {'post': 'yes'}
+        )
+        self.assertEqual(DailyActivity.objects.get().responses, 3)
+
+        self.client.post(reverse('admin:questionnaire_userresponse_changelist'), {
+            'action': 'delete_selected',
+            'post': 'yes',
+            '_selected_action': [self.numeric_response.pk, self.free_text_response.pk],
+        })
+        self.assertEqual(DailyActivity.objects.get().responses, 1)
+        self.assertEqual(UserResponse.objects.count(), 1)
+
+    def test_daily_activity_chart(self):
+        DailyActivity.objects.create(date=localdate(), responses=10, completions=4)
+        DailyActivity.objects.create(date=localdate() - datetime.timedelta(days=1), responses=6, completions=2)
+
+        response = self.client.get(reverse('admin:questionnaire_dailyactivity_changelist'))
+        chart = response.context['activity_chart']
+        self.assertEqual(len(chart), 30)
+        self.assertEqual([(day['completions'], day['height']) for day in chart[-2:]], [(2, 50), (4, 100)])
+        self.assertContains(response, 'Заполненные анкеты за 30 дн.')
+
+    def test_survey_result_admin_filters_by_columns(self):
+        for session_key, score, rating in (("good", 0.95, "Оптимальный"), ("poor", 0.3, "Неудовлетворительный")):
+            profile = AnonymousUserProfile.objects.create(session_key=session_key)
+            result = SurveyResult(user_profile=profile, responses_data={})
+            result.set_rating({'total_score': score, 'rating': rating, 'bmi': 22.5, 'bmi_category': 'Норма'})
+            result.save()
+
+        url = reverse('admin:questionnaire_surveyresult_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'rating': 'Оптимальный', 'o': '-4'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.user_profile.session_key for r in response.context['cl'].result_list], ["good"])
+        # Варианты фильтров не читаются из таблицы
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in queries.captured_queries))
+        self.assertContains(response, 'Ожирение I ст.')
+
+    def test_survey_result_export_streams(self):
+        SurveyResult.objects.create(user_profile=self.profile, responses_data={'profile_info': {}, 'questions': []})
+
+        url = reverse('admin:questionnaire_surveyresult_export')
+        response = self.client.get(url, {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 1)
+        self.assertIn('admin_test_session', rows[0])
+
+        response = self.client.get(url, {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('survey_results.csv.gz', response['Content-Disposition'])
+
+        # Только для персонала
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+
     # Существующие тесты остаются без изменений
     def test_question_admin(self):
         url = reverse('admin:questionnaire_question_changelist')
@@ -251,8 +428,8 @@ class AdminTests(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
 
     def test_export_csv(self):
-        # Создаем тестовый ответ
-        UserResponse.objects.create(
+        # Ответ на вопрос уже создан в setUp (ответ на вопрос у профиля один)
+        UserResponse.objects.get_or_create(
             user_profile=self.profile,
             question=self.question
         )
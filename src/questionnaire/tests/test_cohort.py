@@ -0,0 +1,92 @@
+import random
+
+from django.test import TransactionTestCase
+
+from questionnaire.cohort import load_cohort, calculate_cohort_ratings, iter_cohort_ratings
+from questionnaire.models import Question, Answer, AnonymousUserProfile, UserResponse
+from questionnaire.utils import QUESTION_CATEGORIES, BMI_CATEGORIES, calculate_user_rating
+
+NUMERIC_DESCRIPTIONS = {
+    "ОКРУЖНОСТЬ (ТАЛИИ)": [None, 0.0, 40.0, 75.0, 90.0, 101.0, 120.0],
+    "ОКРУЖНОСТЬ (БЕДЕР)": [None, 95.0, 105.0, 300.0],
+    "ОБЩИЙ ХОЛЕСТЕРИН": [None, 0.0, 4.2, 5.5, 7.1],
+    "УРОВЕНЬ ГЛЮКОЗЫ": [None, 0.0, 5.0, 5.8, 6.1],
+    "Курение (сигарет в день)": [None, 0.0, 2.0, 2.5, 7.0, 20.0],
+    "Курение (лет стажа)": [None, 0.0, 5.0, 15.0],
+}
+TEXT_ANSWERS = {
+    "Имеющиеся заболевания": ['Нет', 'Диабет', 'Гипертония'],
+    "ЖАЛОБЫ НА ПРОИЗВОДСТВО": ['Нет вредных производственных факторов', 'Шум'],
+    "ЖАЛОБЫ НА ЗДОРОВЬЕ": ['Ничего не беспокоит', 'Головная боль'],
+}
+
+
+class CohortRatingTest(TransactionTestCase):
+    def setUp(self):
+        self.random = random.Random(7)
+        descriptions = [d for params in QUESTION_CATEGORIES.values() for d in params['descriptions']]
+        descriptions.append("БЕЗ КАТЕГОРИИ")
+
+        self.questions = []
+        for order, description in enumerate(descriptions, start=1):
+            question = Question.objects.create(
+                text=description,
+                description=description,
+                order=order,
+                is_numeric_input=description in NUMERIC_DESCRIPTIONS
+            )
+            texts = TEXT_ANSWERS.get(description, ['А', 'Б', 'В', 'Г'])
+            answers = [
+                Answer.objects.create(
+                    question=question, text=text, value=self.random.choice([None, 0, 0.5, 0.79, 1, 0.3])
+                )
+                for text in texts
+            ]
+            self.questions.append((question, answers))
+
+    def create_profile(self, index):
+        profile = AnonymousUserProfile.objects.create(
+            session_key=f'cohort-{index}',
+            gender=self.random.choice(['M', 'F', None]),
+            height=self.random.choice([None, 0.0, 150.0, 172.0, 185.0]),
+            weight=self.random.choice([None, 45.0, 70.5, 95.0, 140.0])
+        )
+        for question, answers in self.random.sample(self.questions, self.random.randint(0, len(self.questions))):
+            numeric_values = NUMERIC_DESCRIPTIONS.get(question.description)
+            response = UserResponse.objects.create(
+                user_profile=profile,
+                question=question,
+                numeric_answer=self.random.choice(numeric_values) if numeric_values else None,
+                free_text_answer=self.random.choice(['', '', '120/80', '145/95', '132/70', 'не знаю', 'Свое'])
+            )
+            response.selected_answers.set(self.random.sample(answers, self.random.randint(0, len(answers))))
+        return profile
+
+    def test_matches_scalar_engine(self):
+        profiles = [self.create_profile(i) for i in range(40)]
+
+        cohort = load_cohort([p.pk for p in profiles])
+        ratings = dict(zip(cohort.profile_ids, calculate_cohort_ratings(cohort)))
+
+        for profile in profiles:
+            self.assertEqual(ratings[profile.pk], calculate_user_rating(profile), profile.session_key)
+
+    def test_batches_and_query_count(self):
+        profiles = [self.create_profile(i) for i in range(5)]
+        ids = [p.pk for p in profiles]
+
+        with self.assertNumQueries(6):
+            load_cohort(ids)
+
+        ratings = dict(iter_cohort_ratings(ids, batch_size=2))
+        self.assertEqual(set(ratings), set(ids))
+        for profile in profiles:
+            self.assertEqual(ratings[profile.pk], calculate_user_rating(profile))
+
+    def test_empty_cohort(self):
+        self.assertEqual(calculate_cohort_ratings(load_cohort([])), [])
+
+    def test_bmi_bounds_match_category_predicates(self):
+        for category in BMI_CATEGORIES:
+            for value in (category['min'], category['max'] or 60.0):
+                self.assertTrue(category['matches'](value), category['name'])
@@ -0,0 +1,556 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command, CommandError
+from django.test import TransactionTestCase, override_settings
+from django.utils.timezone import localdate, now
+
+from questionnaire.models import (
+    Question, Answer, AnonymousUserProfile, UserResponse, SurveyResult, FinalizationTask, DailyActivity
+)
+from questionnaire.question_graph import get_question_graph
+from questionnaire.tasks import enqueue_finalization, process_tasks
+from questionnaire.utils import calculate_user_rating, save_survey_results, load_survey_responses, rate_snapshot
+
+
+class RebuildProgressCommandTest(TransactionTestCase):
+    def setUp(self):
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key="progress_session",
+            answered_count=10
+        )
+        self.empty_profile = AnonymousUserProfile.objects.create(
+            session_key="empty_session",
+            answered_count=3
+        )
+        for order in (1, 2):
+            question = Question.objects.create(text=f"Question {order}", order=order)
+            UserResponse.objects.create(user_profile=self.profile, question=question)
+
+    def test_rebuild_progress(self):
+        call_command('rebuild_progress', stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        self.empty_profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 2)
+        self.assertEqual(self.empty_profile.answered_count, 0)
+
+    def test_rebuild_single_profile(self):
+        call_command('rebuild_progress', session_key="empty_session", stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        self.empty_profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 10)
+        self.assertEqual(self.empty_profile.answered_count, 0)
+
+
+class RecalculateRatingsCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Сон", description="СОН", order=1)
+        answers = [
+            Answer.objects.create(question=question, text=f"Ответ {value}", value=value)
+            for value in (0.5, 1.0)
+        ]
+        self.profiles = []
+        for index, answer in enumerate(answers):
+            profile = AnonymousUserProfile.objects.create(
+                session_key=f"rating_{index}", gender='F', height=165, weight=60
+            )
+            response = UserResponse.objects.create(user_profile=profile, question=question)
+            response.selected_answers.add(answer)
+            SurveyResult.objects.create(user_profile=profile, responses_data={}, calculated_rating=None)
+            self.profiles.append(profile)
+
+    def test_recalculate_ratings(self):
+        call_command('recalculate_ratings', batch_size=1, stdout=StringIO())
+
+        for profile in self.profiles:
+            result = SurveyResult.objects.get(user_profile=profile)
+            self.assertEqual(result.calculated_rating, calculate_user_rating(profile))
+            self.assertEqual(result.total_score, result.calculated_rating['total_score'])
+            self.assertEqual(result.rating, result.calculated_rating['rating'])
+            self.assertEqual(result.bmi, result.calculated_rating['bmi'])
+
+
+class RecomputeStaleRatingsCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Сон", description="СОН", order=1)
+        self.answer = Answer.objects.create(question=question, text="Хорошо", value=1.0)
+        self.results = []
+        for index in range(3):
+            profile = AnonymousUserProfile.objects.create(session_key=f"stale_{index}")
+            UserResponse.objects.create(user_profile=profile, question=question).selected_answers.set([self.answer])
+            self.results.append(SurveyResult.objects.create(
+                user_profile=profile, responses_data={}, calculated_rating=calculate_user_rating(profile)
+            ))
+
+    def test_recomputes_only_stale_results(self):
+        current = get_question_graph().ruleset_version()
+        fresh = self.results[0]
+        SurveyResult.objects.filter(pk=fresh.pk).update(ruleset_version=current)
+        fresh.refresh_from_db()
+
+        out = StringIO()
+        call_command('recompute_stale_ratings', '--chunk-size', '1', stdout=out)
+        self.assertIn('2 stale results', out.getvalue())
+        self.assertIn('Recomputed 2 stale results', out.getvalue())
+
+        for result in self.results[1:]:
+            result.refresh_from_db()
+            self.assertEqual(result.ruleset_version, current)
+            self.assertEqual(result.total_score, result.calculated_rating['total_score'])
+        self.assertEqual(SurveyResult.objects.get(pk=fresh.pk).updated_at, fresh.updated_at)
+
+        # Изменение значения ответа делает устаревшими все результаты
+        self.answer.value = 0.5
+        self.answer.save()
+        out = StringIO()
+        call_command('recompute_stale_ratings', '--dry-run', stdout=out)
+        self.assertIn('3 stale results', out.getvalue())
+        self.assertEqual(SurveyResult.objects.filter(ruleset_version=current).count(), 3)
+
+        call_command('recompute_stale_ratings', stdout=StringIO())
+        for result in self.results:
+            result.refresh_from_db()
+            self.assertEqual(result.calculated_rating, calculate_user_rating(result.user_profile))
+            self.assertEqual(result.calculated_rating['total_score'], 0.5)
+
+
+class BackfillRatingColumnsCommandTest(TransactionTestCase):
+    def setUp(self):
+        self.rating = {
+            'total_score': 0.72, 'rating': 'Допустимый',
+            'medico_biological_avg': 0.5, 'stress_avg': 1.0, 'nutrition_avg': 0.79,
+            'eating_behavior_avg': 0.0, 'work_assessment_avg': 1.0, 'lifestyle_avg': 0.5,
+            'bmi': 'Нет данных', 'bmi_category': 'Не рассчитан'
+        }
+        self.results = [
+            SurveyResult.objects.create(
+                user_profile=AnonymousUserProfile.objects.create(session_key=f"backfill_{i}"),
+                responses_data={},
+                calculated_rating=self.rating
+            )
+            for i in range(3)
+        ]
+        self.unrated = SurveyResult.objects.create(
+            user_profile=AnonymousUserProfile.objects.create(session_key="backfill_unrated"),
+            responses_data={}
+        )
+
+    def test_backfill_rating_columns(self):
+        out = StringIO()
+        call_command('backfill_rating_columns', '--batch-size', '2', stdout=out)
+        self.assertIn('Rating columns filled for 3 results', out.getvalue())
+
+        for result in self.results:
+            result.refresh_from_db()
+            self.assertEqual(result.total_score, 0.72)
+            self.assertEqual(result.rating, 'Допустимый')
+            self.assertEqual(result.nutrition_avg, 0.79)
+            self.assertIsNone(result.bmi)
+            self.assertEqual(result.bmi_category, 'Не рассчитан')
+
+        self.unrated.refresh_from_db()
+        self.assertIsNone(self.unrated.rating)
+
+        # Повторный запуск обрабатывает только незаполненные строки
+        out = StringIO()
+        call_command('backfill_rating_columns', stdout=out)
+        self.assertIn('Rating columns filled for 0 results', out.getvalue())
+
+
+class FinalizationWorkerCommandTest(TransactionTestCase):
+    def setUp(self):
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key="worker_session", gender='F', height=165, weight=60, filled_survey=True
+        )
+        question = Question.objects.create(text="Sleep", description="СОН", order=1)
+        answer = Answer.objects.create(question=question, text="Good", value=1.0)
+        UserResponse.objects.create(user_profile=self.profile, question=question).selected_answers.set([answer])
+
+    def test_worker_saves_results_once(self):
+        enqueue_finalization(self.profile)
+        enqueue_finalization(self.profile)
+        self.assertEqual(FinalizationTask.objects.count(), 1)
+
+        call_command('run_finalization_worker', '--once', stdout=StringIO())
+
+        task = FinalizationTask.objects.get()
+        self.assertEqual(task.status, FinalizationTask.STATUS_DONE)
+        self.assertEqual(task.attempts, 1)
+        result = SurveyResult.objects.get(user_profile=self.profile)
+        self.assertEqual(result.calculated_rating, calculate_user_rating(self.profile))
+        self.assertEqual(result.total_score, result.calculated_rating['total_score'])
+        self.assertEqual(result.bmi_category, result.calculated_rating['bmi_category'])
+
+        # Выполненная задача больше не забирается
+        self.assertEqual(process_tasks(), 0)
+
+    @override_settings(FINALIZATION_MAX_ATTEMPTS=2, FINALIZATION_RETRY_DELAY=60)
+    def test_failures_are_retried_with_backoff(self):
+        enqueue_finalization(self.profile)
+
+        with patch('questionnaire.tasks.save_survey_results', side_effect=RuntimeError('boom')), \
+                self.assertLogs('questionnaire.tasks', level='ERROR'):
+            self.assertEqual(process_tasks(), 1)
+            task = FinalizationTask.objects.get()
+            self.assertEqual(task.status, FinalizationTask.STATUS_PENDING)
+            self.assertGreater(task.run_after, now())
+            self.assertIn('boom', task.last_error)
+
+            # До истечения паузы задача не забирается
+            self.assertEqual(process_tasks(), 0)
+
+            FinalizationTask.objects.update(run_after=now())
+            self.assertEqual(process_tasks(), 1)
+            self.assertEqual(FinalizationTask.objects.get().status, FinalizationTask.STATUS_FAILED)
+
+        # Повторная постановка начинает попытки заново
+        enqueue_finalization(self.profile)
+        self.assertEqual(process_tasks(), 1)
+        self.assertEqual(FinalizationTask.objects.get().status, FinalizationTask.STATUS_DONE)
+        self.assertTrue(SurveyResult.objects.filter(user_profile=self.profile).exists())
+
+    @override_settings(FINALIZATION_STALE_AFTER=60)
+    def test_stale_running_task_is_reclaimed(self):
+        enqueue_finalization(self.profile)
+        FinalizationTask.objects.update(
+            status=FinalizationTask.STATUS_RUNNING, attempts=1, started_at=now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(process_tasks(), 1)
+        task = FinalizationTask.objects.get()
+        self.assertEqual(task.status, FinalizationTask.STATUS_DONE)
+        self.assertEqual(task.attempts, 2)
+
+
+class CompactSurveyResultsCommandTest(TransactionTestCase):
+    def setUp(self):
+        self.question = Question.objects.create(text="Sleep", description="СОН", order=1)
+        self.answer = Answer.objects.create(
+            question=self.question, text="Good", value=1.0, recommendation="Спите 7-9 часов. " * 20
+        )
+
+    def create_result(self, session_key, answer_text):
+        profile = AnonymousUserProfile.objects.create(session_key=session_key)
+        return SurveyResult.objects.create(user_profile=profile, responses_data={
+            'profile_info': {'gender': None, 'age': None, 'height': None, 'weight': None},
+            'questions': [{
+                'question_id': self.question.id,
+                'question_text': "Sleep",
+                'question_order': 1,
+                'selected_answers': [{
+                    'answer_id': self.answer.id,
+                    'answer_text': answer_text,
+                    'value': 1.0,
+                    'recommendation': self.answer.recommendation
+                }],
+                'free_text_answer': '',
+                'numeric_answer': None
+            }]
+        })
+
+    def test_compact_survey_results(self):
+        results = [self.create_result(f'compact_{i}', "Good") for i in range(3)]
+        outdated = self.create_result('outdated', "Old text")
+        verbose = [result.get_responses_data() for result in results]
+
+        out = StringIO()
+        call_command('compact_survey_results', '--chunk-size', '2', stdout=out)
+        self.assertIn('Converted 3 results, skipped 1', out.getvalue())
+
+        for result, expected in zip(results, verbose):
+            result.refresh_from_db()
+            self.assertEqual(result.responses_data['format'], SurveyResult.COMPACT_FORMAT)
+            self.assertEqual(result.get_responses_data(), expected)
+
+        outdated.refresh_from_db()
+        self.assertIsNone(outdated.question_bank_snapshot)
+        self.assertEqual(outdated.get_responses_data()['questions'][0]['selected_answers'][0]['answer_text'], "Old text")
+
+    def test_dry_run_changes_nothing(self):
+        result = self.create_result('dry_run', "Good")
+        call_command('compact_survey_results', '--dry-run', stdout=StringIO())
+        result.refresh_from_db()
+        self.assertIsNone(result.question_bank_snapshot)
+
+
+class ExportResultsCommandTest(TransactionTestCase):
+    def setUp(self):
+        sleep = Question.objects.create(text="Sleep", description="СОН", order=1)
+        waist = Question.objects.create(text="Waist", description="ОКРУЖНОСТЬ (ТАЛИИ)", order=2, is_numeric_input=True)
+        Question.objects.create(text="Skipped", order=3)
+        good = Answer.objects.create(question=sleep, text="Good", value=1.0)
+        for index in range(3):
+            profile = AnonymousUserProfile.objects.create(
+                session_key=f"export_{index}", gender='F', age=30 + index, height=165, weight=60
+            )
+            UserResponse.objects.create(user_profile=profile, question=sleep).selected_answers.set([good])
+            UserResponse.objects.create(user_profile=profile, question=waist, numeric_answer=70 + index)
+            save_survey_results(profile)
+
+    def test_export_csv(self):
+        out = StringIO()
+        call_command('export_results', stdout=out, stderr=StringIO())
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 4)
+        header = lines[0].split(',')
+        self.assertEqual(header[0], 'session_key')
+        self.assertEqual(header[-3:], ['q1', 'q2', 'q3'])
+        row = dict(zip(header, lines[1].split(',')))
+        self.assertEqual(row['session_key'], 'export_0')
+        self.assertEqual(row['q1'], 'Good')
+        self.assertEqual(row['q2'], '70.0')
+        self.assertEqual(row['q3'], '')
+
+    def test_export_ndjson_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.ndjson.gz')
+            err = StringIO()
+            call_command('export_results', '--format', 'ndjson', '--gzip', '--output', path,
+                         '--chunk-size', '2', stderr=err)
+            with gzip.open(path, 'rt', encoding='utf-8') as exported:
+                rows = [json.loads(line) for line in exported]
+
+        self.assertIn('Exported 3 results', err.getvalue())
+        self.assertEqual([row['session_key'] for row in rows], ['export_0', 'export_1', 'export_2'])
+        self.assertEqual(rows[2]['q2'], 72.0)
+        self.assertIsNone(rows[2]['q3'])
+        self.assertEqual(rows[2]['rating'], SurveyResult.objects.get(user_profile__session_key='export_2').rating)
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class SurveyResultChangesCommandTest(TransactionTestCase):
+    def create_result(self, session_key):
+        profile = AnonymousUserProfile.objects.create(session_key=session_key)
+        return SurveyResult.objects.create(user_profile=profile, responses_data={'profile_info': {}, 'questions': []})
+
+    def run_feed(self, cursor_file):
+        out = StringIO()
+        call_command('survey_result_changes', '--cursor-file', cursor_file, '--page-size', '1',
+                     stdout=out, stderr=StringIO())
+        return [json.loads(line)['session_key'] for line in out.getvalue().splitlines()]
+
+    def test_incremental_runs(self):
+        first = self.create_result('changes_1')
+        self.create_result('changes_2')
+
+        with tempfile.TemporaryDirectory() as directory:
+            cursor_file = os.path.join(directory, 'cursor')
+            self.assertEqual(self.run_feed(cursor_file), ['changes_1', 'changes_2'])
+            self.assertEqual(self.run_feed(cursor_file), [])
+
+            self.create_result('changes_3')
+            first.save()
+            self.assertEqual(self.run_feed(cursor_file), ['changes_3', 'changes_1'])
+
+
+class BackfillSurveyResultsCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Sleep", description="СОН", order=1)
+        waist = Question.objects.create(text="Waist", description="ОКРУЖНОСТЬ (ТАЛИИ)", order=2, is_numeric_input=True)
+        answers = [Answer.objects.create(question=question, text=f"Answer {value}", value=value) for value in (0.5, 1.0)]
+
+        self.profiles = []
+        for index in range(5):
+            profile = AnonymousUserProfile.objects.create(
+                session_key=f"backfill_results_{index}", gender='M', height=180, weight=80, filled_survey=True
+            )
+            UserResponse.objects.create(user_profile=profile, question=waist, numeric_answer=90 + index)
+            UserResponse.objects.create(user_profile=profile, question=question).selected_answers.set(
+                [answers[index % 2]]
+            )
+            self.profiles.append(profile)
+
+        self.without_responses = AnonymousUserProfile.objects.create(session_key="no_responses", filled_survey=True)
+        AnonymousUserProfile.objects.create(session_key="not_filled")
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+
+    def backfill(self):
+        out = StringIO()
+        call_command('backfill_survey_results', '--workers', '1', '--range-size', '2',
+                     '--checkpoint', self.checkpoint, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_backfill_creates_missing_results(self):
+        existing = save_survey_results(self.profiles[0])
+
+        out = self.backfill()
+        self.assertIn('Created 4 survey results', out)
+        self.assertIn('skipped 1 completed profiles without responses', out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        self.assertEqual(SurveyResult.objects.count(), 5)
+        self.assertEqual(SurveyResult.objects.get(user_profile=self.profiles[0]).pk, existing.pk)
+        for profile in self.profiles[1:]:
+            result = SurveyResult.objects.get(user_profile=profile)
+            self.assertEqual(result.calculated_rating, calculate_user_rating(profile))
+            self.assertEqual(result.total_score, result.calculated_rating['total_score'])
+            self.assertEqual(result.get_responses_data()['questions'], load_survey_responses(profile)[0])
+            self.assertEqual(result.created_at, profile.responses.earliest('created_at').created_at)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        from questionnaire.management.commands import backfill_survey_results
+
+        backfill_range = backfill_survey_results.backfill_range
+        calls = []
+
+        def crash_on_second_range(start, end):
+            calls.append(start)
+            if len(calls) == 2:
+                raise RuntimeError("worker crashed")
+            return backfill_range(start, end)
+
+        with patch.object(backfill_survey_results, 'backfill_range', crash_on_second_range):
+            with self.assertRaises(CommandError):
+                self.backfill()
+        self.assertTrue(os.path.exists(self.checkpoint))
+        created_before = SurveyResult.objects.count()
+        self.assertGreater(created_before, 0)
+
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(len(json.load(checkpoint)['done']), len(calls) - 1)
+
+        out = self.backfill()
+        self.assertIn(f'1 id ranges to process ({len(calls) - 1} already done)', out)
+        self.assertEqual(SurveyResult.objects.count(), 5)
+
+
+class DiffRatingsCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Sleep", description="СОН", order=1)
+        answers = [Answer.objects.create(question=question, text=f"Answer {value}", value=value) for value in (0.5, 1.0)]
+
+        self.results = []
+        for index in range(4):
+            profile = AnonymousUserProfile.objects.create(
+                session_key=f"diff_ratings_{index}", gender='F', height=165, weight=60, filled_survey=True
+            )
+            UserResponse.objects.create(user_profile=profile, question=question).selected_answers.set(
+                [answers[index % 2]]
+            )
+            self.results.append(save_survey_results(profile))
+
+    def diff(self):
+        out = StringIO()
+        call_command('diff_ratings', '--workers', '1', '--range-size', '2', stdout=out)
+        return out.getvalue()
+
+    def test_unchanged_ratings(self):
+        out = self.diff()
+        self.assertIn('Compared 4 results', out)
+        self.assertIn('0 would change', out)
+        self.assertIn('Stored ratings match the current rules', out)
+
+    def test_reports_diff_without_writing(self):
+        result = self.results[1]
+        stale = dict(result.calculated_rating, rating='Устаревший', total_score=result.calculated_rating['total_score'] - 0.03)
+        SurveyResult.objects.filter(pk=result.pk).update(calculated_rating=stale)
+
+        out = self.diff()
+        self.assertIn('1 would change', out)
+        self.assertIn('  rating: 1', out)
+        self.assertIn('  total_score: 1', out)
+        self.assertIn(f"  Устаревший -> {result.calculated_rating['rating']}: 1", out)
+        self.assertIn('  [0.01, 0.05): 1', out)
+        self.assertIn(f'Examples: {result.pk}', out)
+        self.assertEqual(SurveyResult.objects.get(pk=result.pk).calculated_rating, stale)
+
+
+class ReplayRatingsCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Sleep", description="СОН", order=1)
+        waist = Question.objects.create(text="Waist", description="ОКРУЖНОСТЬ (ТАЛИИ)", order=2, is_numeric_input=True)
+        answers = [Answer.objects.create(question=question, text=f"Answer {value}", value=value) for value in (0.5, 1.0)]
+
+        self.profiles = []
+        self.results = []
+        for index in range(5):
+            profile = AnonymousUserProfile.objects.create(
+                session_key=f"replay_{index}", gender='MF'[index % 2], height=170, weight=70 + index,
+                filled_survey=True
+            )
+            UserResponse.objects.create(user_profile=profile, question=waist, numeric_answer=80 + 5 * index)
+            UserResponse.objects.create(user_profile=profile, question=question).selected_answers.set(
+                [answers[index % 2]]
+            )
+            self.profiles.append(profile)
+            self.results.append(save_survey_results(profile))
+
+        directory = tempfile.mkdtemp()
+        self.dump = os.path.join(directory, 'snapshots.jsonl')
+        self.output = os.path.join(directory, 'ratings.jsonl')
+
+    def replay(self, *args):
+        out = StringIO()
+        call_command('replay_ratings', self.dump, '--workers', '1', '--range-bytes', '300', *args, stdout=out)
+        return out.getvalue()
+
+    def test_snapshot_rating_matches_live_rating_without_queries(self):
+        out = StringIO()
+        call_command('dump_rating_snapshots', self.dump, stdout=out)
+        self.assertIn('Dumped 5 snapshots', out.getvalue())
+
+        with open(self.dump) as dump:
+            records = [json.loads(line) for line in dump]
+        for profile, record in zip(self.profiles, records):
+            with self.assertNumQueries(0):
+                rating = rate_snapshot(record)
+            self.assertEqual(json.loads(json.dumps(rating)), json.loads(json.dumps(calculate_user_rating(profile))))
+
+    def test_replay_matches_stored_ratings(self):
+        call_command('dump_rating_snapshots', self.dump, stdout=StringIO())
+
+        out = self.replay('--output', self.output)
+        self.assertIn('Replayed 5 snapshots', out)
+        self.assertIn('compared 5 with stored ratings: 0 differ', out)
+        with open(self.output) as output:
+            ratings = {row['id']: row['calculated_rating'] for row in map(json.loads, output)}
+        self.assertEqual(ratings, {result.pk: result.calculated_rating for result in self.results})
+
+    def test_replay_reports_changes(self):
+        result = self.results[2]
+        stale = dict(result.calculated_rating, rating='Устаревший')
+        SurveyResult.objects.filter(pk=result.pk).update(calculated_rating=stale)
+        call_command('dump_rating_snapshots', self.dump, stdout=StringIO())
+
+        self.assertIn(f"  Устаревший -> {result.calculated_rating['rating']}: 1", self.replay())
+        with self.assertRaisesMessage(CommandError, '1 of 5 stored ratings differ'):
+            self.replay('--fail-on-change')
+
+
+class RebuildDailyActivityCommandTest(TransactionTestCase):
+    def setUp(self):
+        question = Question.objects.create(text="Sleep", order=1)
+        other = Question.objects.create(text="Walk", order=2)
+        self.today = localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+        finished = AnonymousUserProfile.objects.create(session_key="activity_finished", filled_survey=True)
+        UserResponse.objects.filter(
+            pk=UserResponse.objects.create(user_profile=finished, question=question).pk
+        ).update(created_at=now() - timedelta(days=1))
+        UserResponse.objects.create(user_profile=finished, question=other)
+
+        started = AnonymousUserProfile.objects.create(session_key="activity_started")
+        UserResponse.objects.filter(
+            pk=UserResponse.objects.create(user_profile=started, question=question).pk
+        ).update(created_at=now() - timedelta(days=1))
+
+        DailyActivity.objects.create(date=self.today - timedelta(days=30), responses=5)
+
+    def test_rebuild_counts_responses_and_completions_per_day(self):
+        out = StringIO()
+        call_command('rebuild_daily_activity', stdout=out)
+        self.assertIn('Daily activity rebuilt for 2 days', out.getvalue())
+
+        self.assertEqual(
+            list(DailyActivity.objects.order_by('date').values_list('date', 'responses', 'completions')),
+            [(self.yesterday, 2, 0), (self.today, 1, 1)]
+        )
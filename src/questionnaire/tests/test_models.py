@@ -1,6 +1,8 @@
 from django.test import TransactionTestCase
 from django.core.exceptions import ValidationError
-from questionnaire.models import Question, Answer, AnonymousUserProfile, UserResponse
+from questionnaire.models import (
+    Question, Answer, AnonymousUserProfile, UserResponse, SurveyResult, QuestionBankSnapshot
+)
 
 
 class QuestionModelTest(TransactionTestCase):
@@ -246,4 +248,54 @@ class UserResponseModelTest(TransactionTestCase):
             question=self.question
         )
         response.selected_answers.add(self.answer)
-        self.assertEqual(response.selected_answers.count(), 1)
\ No newline at end of file
+        self.assertEqual(response.selected_answers.count(), 1)
+
+
+class QuestionBankSnapshotTest(TransactionTestCase):
+    def setUp(self):
+        self.question = Question.objects.create(text="Сон", description="СОН", order=1)
+        self.answer = Answer.objects.create(
+            question=self.question, text="Хорошо", value=1.0, recommendation="Длинная рекомендация"
+        )
+        self.content = QuestionBankSnapshot.build_content(Question.objects.prefetch_related('answers'))
+        self.responses_data = {
+            'profile_info': {'gender': 'M', 'age': 30, 'height': 180, 'weight': 80},
+            'questions': [{
+                'question_id': self.question.id,
+                'question_text': "Сон",
+                'question_order': 1,
+                'selected_answers': [{
+                    'answer_id': self.answer.id,
+                    'answer_text': "Хорошо",
+                    'value': 1.0,
+                    'recommendation': "Длинная рекомендация"
+                }],
+                'free_text_answer': '',
+                'numeric_answer': None
+            }]
+        }
+
+    def test_same_content_reuses_snapshot(self):
+        snapshot = QuestionBankSnapshot.for_content(self.content)
+        self.assertEqual(QuestionBankSnapshot.for_content(self.content), snapshot)
+        self.assertEqual(QuestionBankSnapshot.objects.count(), 1)
+
+        with self.assertRaises(ValidationError):
+            snapshot.save()
+
+    def test_compact_round_trip(self):
+        snapshot = QuestionBankSnapshot.for_content(self.content)
+        compact = SurveyResult.compact_responses_data(self.responses_data, snapshot)
+        self.assertEqual(compact['questions'], [[self.question.id, [self.answer.id], '', None]])
+
+        profile = AnonymousUserProfile.objects.create(session_key='snapshot')
+        result = SurveyResult.objects.create(
+            user_profile=profile, responses_data=compact, question_bank_snapshot=snapshot
+        )
+        result.refresh_from_db()
+        self.assertEqual(result.get_responses_data(), self.responses_data)
+
+    def test_changed_texts_are_not_compacted(self):
+        snapshot = QuestionBankSnapshot.for_content(self.content)
+        self.responses_data['questions'][0]['selected_answers'][0]['recommendation'] = "Старая рекомендация"
+        self.assertIsNone(SurveyResult.compact_responses_data(self.responses_data, snapshot))
@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from django.test import TransactionTestCase
+
+from questionnaire.models import Question, Answer, QuestionBankVersion
+from questionnaire.question_graph import QuestionGraph, get_question_graph
+
+
+class QuestionGraphTest(TransactionTestCase):
+    def setUp(self):
+        self.question1 = Question.objects.create(text="Question 1", order=1)
+        self.question2 = Question.objects.create(text="Question 2", order=2)
+        self.question3 = Question.objects.create(text="Question 3", order=3)
+        self.answer = Answer.objects.create(
+            text="Jump",
+            question=self.question1,
+            next_question=self.question3
+        )
+
+    def test_graph_is_cached_between_calls(self):
+        graph = get_question_graph()
+
+        # Повторный вызов проверяет только метку версии
+        with self.assertNumQueries(1):
+            self.assertIs(get_question_graph(), graph)
+
+        # Ответы уже загружены вместе с вопросами
+        with self.assertNumQueries(0):
+            self.assertEqual(list(graph.first().answers.all()), [self.answer])
+
+    def test_graph_rebuilt_after_changes(self):
+        graph = get_question_graph()
+        version = QuestionBankVersion.current()
+
+        Answer.objects.create(text="New answer", question=self.question2)
+
+        self.assertNotEqual(QuestionBankVersion.current(), version)
+        rebuilt = get_question_graph()
+        self.assertIsNot(rebuilt, graph)
+        self.assertEqual(rebuilt.get_by_order(2).answers.count(), 1)
+
+        self.question3.delete()
+        self.assertEqual(len(get_question_graph()), 2)
+
+    def test_navigation(self):
+        graph = get_question_graph()
+        question1 = graph.get_by_order(1)
+
+        self.assertEqual(graph.next_after(question1).order, 2)
+        self.assertIsNone(graph.next_after(graph.get_by_order(3)))
+        self.assertEqual(graph.next_for_answers(question1, [str(self.answer.id)]).order, 3)
+        self.assertEqual(graph.next_for_answers(question1, ['free_text']).order, 2)
+
+    def test_ruleset_version_tracks_rating_inputs(self):
+        version = get_question_graph().ruleset_version()
+
+        # Формулировка вопроса на расчет не влияет
+        self.question2.text = "Question 2, reworded"
+        self.question2.save()
+        self.assertEqual(get_question_graph().ruleset_version(), version)
+
+        self.answer.value = 0.5
+        self.answer.save()
+        self.assertNotEqual(get_question_graph().ruleset_version(), version)
+
+    def test_ruleset_version_tracks_cohort_engine(self):
+        graph = get_question_graph()
+        version = graph.ruleset_version()
+        with patch('questionnaire.question_graph.COHORT_RULESET_HASH', 'changed'):
+            self.assertNotEqual(QuestionGraph(graph.version, graph.questions).ruleset_version(), version)
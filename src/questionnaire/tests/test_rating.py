@@ -0,0 +1,199 @@
+from unittest.mock import patch
+
+from django.test import TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from questionnaire import cohort
+from questionnaire.models import Question, Answer, AnonymousUserProfile, UserResponse
+
+from questionnaire.utils import (
+    QUESTION_CATEGORIES, QUESTION_DISPATCH, DESCRIPTION_CATEGORIES,
+    VALUE_SLOTS, PRESENCE_FLAGS, ResponseRow, get_response_category,
+    ALERT_RULES, calculate_user_rating, get_cached_rating, calculate_bmi_data, process_responses,
+    apply_alert_rules, RATING_RULESET_HASH, compute_ruleset_hash
+)
+from questionnaire.rating_cache import get_rating_cache
+
+
+class QuestionDispatchTest(TransactionTestCase):
+    def test_category_lookup_keeps_first_match(self):
+        for key, params in QUESTION_CATEGORIES.items():
+            for desc in params['descriptions']:
+                response = ResponseRow(desc, False, None, '', [])
+                expected = next(
+                    k for k, p in QUESTION_CATEGORIES.items() if desc in p['descriptions']
+                )
+                self.assertEqual(get_response_category(response), expected)
+
+        unknown = ResponseRow("НЕИЗВЕСТНО", False, None, '', [])
+        self.assertIsNone(get_response_category(unknown))
+
+    def test_dispatch_categories_match_question_categories(self):
+        for desc, (slot, category) in {**VALUE_SLOTS, **PRESENCE_FLAGS}.items():
+            self.assertIn(desc, QUESTION_DISPATCH)
+            if desc in DESCRIPTION_CATEGORIES:
+                self.assertEqual(DESCRIPTION_CATEGORIES[desc], category)
+
+
+class AlertRulesTest(TransactionTestCase):
+    def empty_data(self):
+        profile = AnonymousUserProfile(gender='F', height=165, weight=60)
+        return process_responses([], calculate_bmi_data(profile), profile)
+
+    def test_rules_match_trigger_values(self):
+        for bucket, values, key, nested in ALERT_RULES:
+            for value in (0, 0.0, 0.5, 0.79, 1, None, 0.3):
+                data = self.empty_data()
+                data[bucket] = [1.0, value]
+                apply_alert_rules(data)
+                flag = data[key] if nested is None else data[key][nested]
+                self.assertEqual(flag, value in values, (bucket, key, nested, value))
+
+    def test_empty_lists_raise_no_flags(self):
+        data = self.empty_data()
+        for bucket, values, key, nested in ALERT_RULES:
+            self.assertFalse(data[key] if nested is None else data[key][nested])
+        self.assertFalse(any(data['emotional_eating_data'].values()))
+
+    def test_emotional_eating_flags_are_exclusive(self):
+        data = self.empty_data()
+        data['emotional_eating_values'] = [0.79, 0.5, 1]
+        apply_alert_rules(data)
+        self.assertEqual(data['emotional_eating_data'], {
+            'has_emotional_eating_0': False,
+            'has_emotional_eating_05': True,
+            'has_emotional_eating_079': False,
+            'all_healthy': False
+        })
+
+        data['emotional_eating_values'] = [1.0, 1]
+        apply_alert_rules(data)
+        self.assertTrue(data['emotional_eating_data']['all_healthy'])
+
+
+class CalculateUserRatingQueriesTest(TransactionTestCase):
+    def setUp(self):
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key='rating', gender='M', height=180, weight=80
+        )
+
+    def answer_questions(self, descriptions, start=0):
+        for i, desc in enumerate(descriptions, start=start):
+            question = Question.objects.create(text=desc, description=desc, order=i + 1)
+            answers = [
+                Answer.objects.create(question=question, text=f"Ответ {j}", value=value)
+                for j, value in enumerate((1.0, 0.5))
+            ]
+            response = UserResponse.objects.create(user_profile=self.profile, question=question)
+            response.selected_answers.set(answers)
+
+    def test_query_count_does_not_depend_on_question_count(self):
+        self.answer_questions(["СОН", "ГОЛОД"])
+        with self.assertNumQueries(2):
+            result = calculate_user_rating(self.profile)
+        self.assertEqual(result['lifestyle_avg'], 0.75)
+
+        self.answer_questions(["СНЕКИ", "ФАСТ-ФУД", "СТРЕСС", "Имеющиеся заболевания"], start=2)
+        with self.assertNumQueries(2):
+            calculate_user_rating(self.profile)
+
+    def test_numeric_and_free_text_rows(self):
+        waist = Question.objects.create(
+            text="Талия", description="ОКРУЖНОСТЬ (ТАЛИИ)", order=1, is_numeric_input=True
+        )
+        pressure = Question.objects.create(text="Давление", description="АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ", order=2)
+        UserResponse.objects.create(user_profile=self.profile, question=waist, numeric_answer=90)
+        UserResponse.objects.create(user_profile=self.profile, question=pressure, free_text_answer='120/80')
+
+        with self.assertNumQueries(2):
+            result = calculate_user_rating(self.profile)
+        self.assertNotEqual(result['rating'], 'Нет данных')
+
+    def test_no_responses(self):
+        with self.assertNumQueries(1):
+            result = calculate_user_rating(self.profile)
+        self.assertEqual(result['rating'], 'Нет данных')
+
+
+class RatingCacheTest(TransactionTestCase):
+    def setUp(self):
+        get_rating_cache().clear()
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key='cache', gender='M', height=180, weight=80
+        )
+        self.question = Question.objects.create(text="Сон", description="СОН", order=1)
+        self.good = Answer.objects.create(question=self.question, text="Хорошо", value=1.0)
+        self.bad = Answer.objects.create(question=self.question, text="Плохо", value=0.0)
+        self.response = UserResponse.objects.create(user_profile=self.profile, question=self.question)
+        self.response.selected_answers.set([self.good])
+
+    def test_hit_skips_calculation(self):
+        self.assertEqual(get_cached_rating(self.profile)['lifestyle_avg'], 1.0)
+        # Только метка: последний ответ и версия банка вопросов
+        with self.assertNumQueries(2):
+            self.assertEqual(get_cached_rating(self.profile)['lifestyle_avg'], 1.0)
+
+    def test_changed_answers_invalidate(self):
+        get_cached_rating(self.profile)
+        self.response.selected_answers.set([self.bad])
+        self.assertEqual(get_cached_rating(self.profile)['lifestyle_avg'], 0.0)
+
+    def test_question_bank_change_invalidates(self):
+        get_cached_rating(self.profile)
+        self.good.value = 0.5
+        self.good.save()
+        self.assertEqual(get_cached_rating(self.profile)['lifestyle_avg'], 0.5)
+
+    def test_bulk_update_without_signals_invalidates(self):
+        get_cached_rating(self.profile)
+        # Как в пакетном сохранении: изменения без сигналов, но с новым updated_at
+        UserResponse.selected_answers.through.objects.filter(userresponse=self.response).update(answer=self.bad)
+        UserResponse.objects.filter(pk=self.response.pk).update(updated_at=now())
+        self.assertEqual(get_cached_rating(self.profile)['lifestyle_avg'], 0.0)
+
+    def test_profile_change_in_other_process_invalidates(self):
+        self.assertEqual(get_cached_rating(self.profile)['bmi'], 24.7)
+        # Другой воркер меняет профиль: его сигналы до этого кэша не доходят
+        AnonymousUserProfile.objects.filter(pk=self.profile.pk).update(weight=100)
+        self.profile.refresh_from_db()
+        self.assertEqual(get_cached_rating(self.profile)['bmi'], 30.9)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'ratings': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ratings-lru',
+            'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3},
+        },
+    })
+    def test_local_memory_cache_evicts_least_recently_used(self):
+        profiles = [self.profile] + [
+            AnonymousUserProfile.objects.create(session_key=f'cache-{i}') for i in range(3)
+        ]
+        for profile in profiles[:3]:
+            get_cached_rating(profile)
+        get_cached_rating(profiles[0])
+        get_cached_rating(profiles[3])
+
+        cache = get_rating_cache()
+        self.assertIsNotNone(cache.get(f'rating:{profiles[0].pk}'))
+        self.assertIsNone(cache.get(f'rating:{profiles[1].pk}'))
+
+
+class RulesetHashTest(TransactionTestCase):
+    def test_hash_is_stable(self):
+        self.assertEqual(compute_ruleset_hash(), RATING_RULESET_HASH)
+
+    def test_hash_changes_with_thresholds(self):
+        with patch('questionnaire.utils.GLUCOSE_DIABETES_LIMIT', 7.0):
+            self.assertNotEqual(compute_ruleset_hash(), RATING_RULESET_HASH)
+        with patch.dict('questionnaire.utils.WAIST_LIMITS', {'M': (90, 100)}):
+            self.assertNotEqual(compute_ruleset_hash(), RATING_RULESET_HASH)
+
+    def test_cohort_hash_changes_with_cohort_rules(self):
+        namespace = vars(cohort)
+        self.assertEqual(compute_ruleset_hash(cohort.COHORT_RULESET, namespace), cohort.COHORT_RULESET_HASH)
+        with patch.dict('questionnaire.cohort.TEXT_LISTS', {"ЖАЛОБЫ НА ЗДОРОВЬЕ": ('health_complaints', 'Нет')}):
+            self.assertNotEqual(
+                compute_ruleset_hash(cohort.COHORT_RULESET, namespace), cohort.COHORT_RULESET_HASH
+            )
@@ -1,9 +1,25 @@
-from django.test import TransactionTestCase
+import json
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import TransactionTestCase, override_settings
 from django.test import Client
 from django.urls import reverse
 from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
 
-from questionnaire.models import AnonymousUserProfile, Question, Answer, UserResponse
+from questionnaire.models import (
+    AnonymousUserProfile, Question, Answer, UserResponse, SurveyResult, ResponseAccumulator, FinalizationTask,
+    DailyActivity
+)
+from questionnaire.question_graph import get_question_graph
+from questionnaire.tasks import process_tasks
+from questionnaire.utils import calculate_user_rating, load_survey_responses, save_survey_results
+from questionnaire.views import _save_user_response, _complete_survey, _claim_completion
 
 
 class QuestionnaireViewsTest(TransactionTestCase):
@@ -400,6 +416,37 @@ class QuestionnairePostProcessingTests(TransactionTestCase):
         )
         self.assertEqual(response.selected_answers.count(), 2)
 
+    def test_answered_count_tracks_first_answers(self):
+        url = reverse('questionnaire_view', args=[self.numeric_question.order])
+        self.client.post(url, {'numeric_answer': '7.5'})
+        self.client.post(url, {'numeric_answer': '8'})
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 1)
+
+        url = reverse('questionnaire_view', args=[self.multi_choice_question.order])
+        self.client.post(url, {'answers': [self.answer1.id]})
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 2)
+
+    def test_daily_activity_counts_first_answers_and_completion(self):
+        url = reverse('questionnaire_view', args=[self.numeric_question.order])
+        self.client.post(url, {'numeric_answer': '7.5'})
+        self.client.post(url, {'numeric_answer': '8'})
+        self.client.post(
+            reverse('questionnaire_view', args=[self.multi_choice_question.order]),
+            {'answers': [self.answer1.id]}
+        )
+
+        activity = DailyActivity.objects.get(date=localdate())
+        self.assertEqual((activity.responses, activity.completions), (2, 0))
+
+        self.assertTrue(_claim_completion(self.profile))
+        self.assertFalse(_claim_completion(self.profile))
+        activity.refresh_from_db()
+        self.assertEqual((activity.responses, activity.completions), (2, 1))
+
     def test_questionnaire_completion(self):
         self.client.post(
             reverse('questionnaire_view', args=[self.numeric_question.order]),
@@ -615,4 +662,672 @@ class QuestionnairePostProcessingTests(TransactionTestCase):
                 user_profile=self.profile,
                 question=single_choice_question
             ).exists()
-        )
\ No newline at end of file
+        )
+
+class QuestionnaireSectionTests(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.client = Client()
+        self.client.get(reverse('home'))
+        self.session_key = self.client.session.session_key
+
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key=self.session_key,
+            gender='M',
+            age=30,
+            height=180,
+            weight=80
+        )
+
+        # Раздел medico_biological
+        self.waist_question = Question.objects.create(
+            text="Waist",
+            order=1,
+            is_numeric_input=True,
+            description="ОКРУЖНОСТЬ (ТАЛИИ)"
+        )
+        self.bp_question = Question.objects.create(
+            text="Артериальное давление",
+            order=2,
+            allow_free_text=True,
+            description="АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ"
+        )
+        # Раздел lifestyle
+        self.sleep_question = Question.objects.create(
+            text="Sleep",
+            order=3,
+            is_multiple_choice=True,
+            description="СОН"
+        )
+        self.sleep_good = Answer.objects.create(text="Good", question=self.sleep_question, value=1.0)
+        self.sleep_bad = Answer.objects.create(text="Bad", question=self.sleep_question, value=0.0)
+
+    def test_section_start_redirects_to_first_section(self):
+        response = self.client.get(reverse('questionnaire_sections_start'))
+        self.assertRedirects(response, reverse('questionnaire_section_view', args=['medico_biological']))
+
+    def test_section_renders_all_questions(self):
+        response = self.client.get(reverse('questionnaire_section_view', args=['medico_biological']))
+        self.assertContains(response, "Waist")
+        self.assertContains(response, "Артериальное давление")
+        self.assertNotContains(response, "Sleep")
+
+    def test_section_errors_are_reported_together(self):
+        url = reverse('questionnaire_section_view', args=['medico_biological'])
+        response = self.client.post(url, {
+            f'numeric_answer_{self.waist_question.id}': '-5',
+            f'free_text_{self.bp_question.id}': '120-80'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Значение не может быть отрицательным")
+        self.assertContains(response, "Введите давление в формате ЧИСЛО/ЧИСЛО")
+        self.assertFalse(UserResponse.objects.filter(user_profile=self.profile).exists())
+
+    def test_sections_saved_in_bulk_and_completed(self):
+        url = reverse('questionnaire_section_view', args=['medico_biological'])
+        self.client.post(url, {
+            f'numeric_answer_{self.waist_question.id}': '90',
+            f'free_text_{self.bp_question.id}': '120/80'
+        })
+
+        # Повторная отправка раздела обновляет ответы, а не дублирует их
+        response = self.client.post(url, {
+            f'numeric_answer_{self.waist_question.id}': '95',
+            f'free_text_{self.bp_question.id}': '120/80'
+        })
+        self.assertRedirects(
+            response,
+            reverse('questionnaire_section_view', args=['lifestyle']),
+            fetch_redirect_response=False
+        )
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.filled_survey)
+        self.assertEqual(self.profile.answered_count, 2)
+
+        response = self.client.post(reverse('questionnaire_section_view', args=['lifestyle']), {
+            f'answers_{self.sleep_question.id}': [self.sleep_good.id, self.sleep_bad.id]
+        })
+        self.assertRedirects(response, reverse('thank_you_view'), fetch_redirect_response=False)
+
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.filled_survey)
+        self.assertEqual(self.profile.answered_count, 3)
+
+        waist = UserResponse.objects.get(user_profile=self.profile, question=self.waist_question)
+        self.assertEqual(waist.numeric_answer, 95)
+        sleep = UserResponse.objects.get(user_profile=self.profile, question=self.sleep_question)
+        self.assertEqual(set(sleep.selected_answers.all()), {self.sleep_good, self.sleep_bad})
+
+    def test_profile_redirects_to_sections_in_category_mode(self):
+        with self.settings(SURVEY_PAGE_MODE='category'):
+            response = self.client.get(reverse('user_profile_view'))
+        self.assertRedirects(
+            response,
+            reverse('questionnaire_sections_start'),
+            fetch_redirect_response=False
+        )
+
+
+class SurveyApiTests(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.client = Client()
+
+        self.numeric_question = Question.objects.create(
+            text="Numeric Question",
+            order=1,
+            is_numeric_input=True,
+            description="ОБЩИЙ ХОЛЕСТЕРИН"
+        )
+        self.bp_question = Question.objects.create(
+            text="Артериальное давление",
+            order=2,
+            allow_free_text=True,
+            description="АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ"
+        )
+        self.choice_question = Question.objects.create(
+            text="Single Choice",
+            order=3,
+            description="СОН"
+        )
+        self.answer = Answer.objects.create(text="Option", question=self.choice_question, value=1.0)
+
+        self.profile_data = {'gender': 'F', 'age': 40, 'height': 165, 'weight': 60}
+
+    def _submit(self, payload):
+        return self.client.post(
+            reverse('survey_submit_api'),
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+
+    def test_question_bank_bundle_and_etag(self):
+        response = self.client.get(reverse('question_bank_api'))
+        self.assertEqual(response.status_code, 200)
+
+        bundle = response.json()
+        self.assertEqual([q['order'] for q in bundle['questions']], [1, 2, 3])
+        self.assertEqual(bundle['questions'][2]['answers'][0]['id'], self.answer.id)
+
+        response = self.client.get(reverse('question_bank_api'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_submit_reports_all_errors(self):
+        response = self._submit({
+            'profile': self.profile_data,
+            'responses': [
+                {'question_id': self.numeric_question.id, 'numeric_answer': 50},
+                {'question_id': self.bp_question.id, 'free_text': '120-80'},
+                {'question_id': self.choice_question.id, 'answers': []},
+                {'question_id': 999, 'answers': []}
+            ]
+        })
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(
+            set(errors),
+            {str(self.numeric_question.id), str(self.bp_question.id), str(self.choice_question.id), '999'}
+        )
+        self.assertFalse(UserResponse.objects.exists())
+
+    def test_submit_completes_survey(self):
+        response = self._submit({
+            'profile': self.profile_data,
+            'responses': [
+                {'question_id': self.numeric_question.id, 'numeric_answer': 4.2},
+                {'question_id': self.bp_question.id, 'free_text': '120/80'},
+                {'question_id': self.choice_question.id, 'answers': [self.answer.id]}
+            ]
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total_score', response.json()['rating'])
+
+        profile = AnonymousUserProfile.objects.get()
+        self.assertTrue(profile.filled_survey)
+        self.assertEqual(profile.gender, 'F')
+        self.assertEqual(UserResponse.objects.filter(user_profile=profile).count(), 3)
+        self.assertTrue(SurveyResult.objects.filter(user_profile=profile).exists())
+
+        # Повторная отправка отклоняется
+        self.assertEqual(self._submit({'responses': []}).status_code, 409)
+
+    def test_submit_requires_every_required_question_on_path(self):
+        response = self._submit({'profile': self.profile_data, 'responses': []})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json()['errors']),
+            {str(self.numeric_question.id), str(self.bp_question.id), str(self.choice_question.id)}
+        )
+
+        response = self._submit({
+            'profile': self.profile_data,
+            'responses': [{'question_id': self.numeric_question.id, 'numeric_answer': 4.2}]
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {str(self.bp_question.id), str(self.choice_question.id)})
+
+        profile = AnonymousUserProfile.objects.get()
+        self.assertFalse(profile.filled_survey)
+        self.assertFalse(UserResponse.objects.exists())
+        self.assertFalse(SurveyResult.objects.exists())
+
+    def test_submit_skips_optional_and_bypassed_questions(self):
+        self.numeric_question.is_required = False
+        self.numeric_question.save()
+        skipped = Question.objects.create(text="Skipped", order=4, description="СОН")
+        last = Question.objects.create(text="Last", order=5, description="СОН")
+        last_answer = Answer.objects.create(text="Last option", question=last, value=1.0)
+        # Варианты, ведущие сразу к последнему вопросу, минуя skipped
+        skip = Answer.objects.create(text="Skip", question=self.bp_question, next_question=last)
+        jump = Answer.objects.create(text="Jump", question=self.choice_question, value=1.0, next_question=last)
+
+        # Со свободным ответом переход идет по порядку, как в обычном прохождении
+        response = self._submit({
+            'profile': self.profile_data,
+            'responses': [
+                {'question_id': self.bp_question.id, 'answers': [skip.id], 'free_text': '120/80'},
+                {'question_id': self.choice_question.id, 'answers': [self.answer.id]},
+                {'question_id': last.id, 'answers': [last_answer.id]}
+            ]
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {str(skipped.id)})
+
+        response = self._submit({
+            'profile': self.profile_data,
+            'responses': [
+                {'question_id': self.bp_question.id, 'free_text': '120/80'},
+                {'question_id': self.choice_question.id, 'answers': [jump.id]},
+                {'question_id': last.id, 'answers': [last_answer.id]}
+            ]
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(UserResponse.objects.filter(question=skipped).exists())
+
+    def test_submit_rejects_non_finite_and_out_of_range_profile(self):
+        response = self.client.post(
+            reverse('survey_submit_api'),
+            data='{"profile": {"gender": "F", "age": Infinity, "height": NaN, "weight": 1e400}, "responses": []}',
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        for field in ('age', 'height', 'weight'):
+            self.assertEqual(errors[f'profile.{field}'], 'Введите корректное число')
+
+        response = self._submit({'profile': dict(self.profile_data, height=20, weight=900), 'responses': []})
+        errors = response.json()['errors']
+        self.assertEqual(errors['profile.height'], 'Допустимо от 100 до 250')
+        self.assertEqual(errors['profile.weight'], 'Допустимо от 30 до 200')
+        self.assertFalse(AnonymousUserProfile.objects.get().filled_survey)
+
+
+class ResponseAccumulatorTests(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.client = Client()
+        self.client.get(reverse('home'))
+
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key=self.client.session.session_key,
+            gender='F',
+            age=40,
+            height=165,
+            weight=70
+        )
+
+        self.waist_question = Question.objects.create(
+            text="Waist", order=1, is_numeric_input=True, description="ОКРУЖНОСТЬ (ТАЛИИ)"
+        )
+        self.sleep_question = Question.objects.create(
+            text="Sleep", order=2, is_multiple_choice=True, description="СОН"
+        )
+        self.sleep_good = Answer.objects.create(text="Good", question=self.sleep_question, value=1.0)
+        self.sleep_bad = Answer.objects.create(text="Bad", question=self.sleep_question, value=0.0)
+        self.bp_question = Question.objects.create(
+            text="Артериальное давление", order=3, allow_free_text=True, description="АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ"
+        )
+
+    def answer(self, question, data):
+        return self.client.post(reverse('questionnaire_view', args=[question.order]), data)
+
+    def test_reanswer_replaces_entry_and_keeps_order(self):
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id, self.sleep_bad.id]})
+        self.answer(self.waist_question, {'numeric_answer': '90'})
+        self.answer(self.sleep_question, {'answers': [self.sleep_bad.id]})
+
+        entries = ResponseAccumulator.objects.get(user_profile=self.profile).entries
+        sleep = entries[str(self.sleep_question.id)]
+        self.assertEqual(sleep['seq'], 1)
+        self.assertEqual(sleep['answer_ids'], [self.sleep_bad.id])
+        self.assertEqual(entries[str(self.waist_question.id)]['seq'], 2)
+        self.assertEqual(entries[str(self.waist_question.id)]['numeric_answer'], 90.0)
+
+    def test_entries_keep_only_ids_and_values(self):
+        self.sleep_good.recommendation = "Длинная рекомендация " * 50
+        self.sleep_good.save()
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id]})
+
+        entries = ResponseAccumulator.objects.get(user_profile=self.profile).entries
+        self.assertEqual(entries[str(self.sleep_question.id)], {
+            'seq': 1, 'answer_ids': [self.sleep_good.id], 'free_text_answer': '', 'numeric_answer': None
+        })
+
+        survey_result = save_survey_results(self.profile)
+        answer = survey_result.get_responses_data()['questions'][0]['selected_answers'][0]
+        self.assertEqual(answer['recommendation'], self.sleep_good.recommendation)
+
+    def test_completion_matches_full_scan_without_reading_responses(self):
+        self.answer(self.waist_question, {'numeric_answer': '85'})
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id]})
+        self.answer(self.waist_question, {'numeric_answer': '95'})
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id, self.sleep_bad.id]})
+
+        with CaptureQueriesContext(connection) as queries:
+            survey_result = save_survey_results(self.profile)
+        self.assertFalse(any('questionnaire_userresponse' in q['sql'] for q in queries.captured_queries))
+
+        self.assertEqual(survey_result.calculated_rating, calculate_user_rating(self.profile))
+        self.assertEqual(survey_result.get_responses_data()['questions'], load_survey_responses(self.profile)[0])
+
+    def test_bulk_save_updates_accumulator(self):
+        self.client.post(reverse('questionnaire_section_view', args=['medico_biological']), {
+            f'numeric_answer_{self.waist_question.id}': '90',
+            f'free_text_{self.bp_question.id}': '150/95'
+        })
+        self.client.post(reverse('questionnaire_section_view', args=['lifestyle']), {
+            f'answers_{self.sleep_question.id}': [self.sleep_bad.id]
+        })
+
+        process_tasks()
+        survey_result = SurveyResult.objects.get(user_profile=self.profile)
+        entries = ResponseAccumulator.objects.get(user_profile=self.profile).entries
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(survey_result.calculated_rating, calculate_user_rating(self.profile))
+
+    def test_missing_accumulator_is_rebuilt_from_responses(self):
+        response = UserResponse.objects.create(user_profile=self.profile, question=self.sleep_question)
+        response.selected_answers.set([self.sleep_good])
+        AnonymousUserProfile.objects.filter(pk=self.profile.pk).update(answered_count=1)
+
+        self.answer(self.waist_question, {'numeric_answer': '80'})
+
+        entries = ResponseAccumulator.objects.get(user_profile=self.profile).entries
+        self.assertEqual(entries[str(self.sleep_question.id)]['seq'], 1)
+        self.assertEqual(entries[str(self.waist_question.id)]['seq'], 2)
+
+    def test_accumulator_with_answer_texts_is_rebuilt(self):
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id]})
+        # Накопитель, записанный до перехода на записи без текстов вариантов
+        accumulator = ResponseAccumulator.objects.get(user_profile=self.profile)
+        accumulator.entries = {str(self.sleep_question.id): {
+            'seq': 1, 'selected_answers': [{'answer_id': self.sleep_good.id}],
+            'free_text_answer': '', 'numeric_answer': None
+        }}
+        accumulator.save()
+
+        self.assertEqual(save_survey_results(self.profile).calculated_rating['lifestyle_avg'], 1.0)
+        self.answer(self.waist_question, {'numeric_answer': '80'})
+        entries = ResponseAccumulator.objects.get(user_profile=self.profile).entries
+        self.assertEqual(entries[str(self.sleep_question.id)]['answer_ids'], [self.sleep_good.id])
+
+    def test_stale_accumulator_falls_back_to_full_scan(self):
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id]})
+        # Правка банка вопросов меняет версию: накопитель больше не используется
+        self.sleep_good.value = 0.5
+        self.sleep_good.save()
+
+        survey_result = save_survey_results(self.profile)
+        self.assertEqual(survey_result.calculated_rating['lifestyle_avg'], 0.5)
+
+    def test_full_scan_loads_responses_once(self):
+        self.answer(self.waist_question, {'numeric_answer': '95'})
+        self.answer(self.sleep_question, {'answers': [self.sleep_good.id, self.sleep_bad.id]})
+        self.answer(self.bp_question, {'free_text': '130/85'})
+        ResponseAccumulator.objects.all().delete()
+        get_question_graph().snapshot()
+
+        with CaptureQueriesContext(connection) as queries:
+            survey_result = save_survey_results(self.profile)
+        statements = [
+            q['sql'] for q in queries.captured_queries
+            if not q['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE'))
+        ]
+        # Накопитель, ответы и выбранные варианты, версия банка вопросов, затем только update_or_create
+        self.assertEqual(len([sql for sql in statements if 'questionnaire_userresponse' in sql]), 2)
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(len([sql for sql in statements if sql.startswith(('UPDATE', 'INSERT'))]), 1)
+
+        self.assertEqual(survey_result.calculated_rating, calculate_user_rating(self.profile))
+        questions = survey_result.get_responses_data()['questions']
+        self.assertEqual([q['question_id'] for q in questions], [
+            self.waist_question.id, self.sleep_question.id, self.bp_question.id
+        ])
+        self.assertEqual(
+            [a['answer_id'] for a in questions[1]['selected_answers']],
+            [self.sleep_good.id, self.sleep_bad.id]
+        )
+
+
+class FinalizationQueueTests(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.client = Client()
+        self.client.get(reverse('home'))
+
+        self.profile = AnonymousUserProfile.objects.create(
+            session_key=self.client.session.session_key,
+            gender='M',
+            age=30,
+            height=180,
+            weight=80
+        )
+        self.question = Question.objects.create(text="Sleep", order=1, description="СОН")
+        self.answer = Answer.objects.create(text="Good", question=self.question, value=1.0)
+
+    def complete(self):
+        return self.client.post(
+            reverse('questionnaire_view', args=[self.question.order]),
+            {'answers': [self.answer.id]}
+        )
+
+    def test_last_answer_only_enqueues(self):
+        self.assertRedirects(self.complete(), reverse('thank_you_view'), fetch_redirect_response=False)
+
+        task = FinalizationTask.objects.get(user_profile=self.profile)
+        self.assertEqual(task.status, FinalizationTask.STATUS_PENDING)
+        self.assertFalse(SurveyResult.objects.exists())
+
+        response = self.client.get(reverse('thank_you_view'))
+        self.assertTemplateUsed(response, 'thank_you_pending.html')
+        self.assertEqual(self.client.get(reverse('thank_you_status_view')).json(), {'ready': False})
+
+        self.assertEqual(process_tasks(), 1)
+
+        self.assertEqual(self.client.get(reverse('thank_you_status_view')).json(), {'ready': True})
+        response = self.client.get(reverse('thank_you_view'))
+        self.assertTemplateUsed(response, 'thank_you.html')
+        self.assertEqual(response.context['lifestyle_avg'], 1.0)
+
+    def test_reopened_survey_is_finalized_again(self):
+        bad = Answer.objects.create(text="Bad", question=self.question, value=0.0)
+        self.complete()
+        self.assertEqual(process_tasks(), 1)
+        self.assertEqual(SurveyResult.objects.get(user_profile=self.profile).calculated_rating['lifestyle_avg'], 1.0)
+
+        # Администратор снова открывает анкету, пользователь меняет ответ
+        self.profile.refresh_from_db()
+        self.profile.filled_survey = False
+        self.profile.save()
+        self.client.post(reverse('questionnaire_view', args=[self.question.order]), {'answers': [bad.id]})
+
+        task = FinalizationTask.objects.get(user_profile=self.profile)
+        self.assertEqual(task.status, FinalizationTask.STATUS_PENDING)
+        self.assertEqual(task.attempts, 0)
+        self.assertEqual(process_tasks(), 1)
+        self.assertEqual(SurveyResult.objects.get(user_profile=self.profile).calculated_rating['lifestyle_avg'], 0.0)
+
+    def test_sync_mode_saves_results_in_request(self):
+        with self.settings(SURVEY_FINALIZATION='sync'):
+            self.complete()
+
+        self.assertTrue(SurveyResult.objects.filter(user_profile=self.profile).exists())
+        self.assertFalse(FinalizationTask.objects.exists())
+
+    @override_settings(SURVEY_FINALIZATION='sync')
+    def test_repeated_completion_finalizes_once(self):
+        # Второй запрос получил профиль до того, как первый отметил анкету
+        stale_profile = AnonymousUserProfile.objects.get(pk=self.profile.pk)
+        with patch('questionnaire.views.save_survey_results', wraps=save_survey_results) as save:
+            _complete_survey(self.profile)
+            response = _complete_survey(stale_profile)
+
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(response.url, reverse('thank_you_view'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Параллельная запись требует PostgreSQL')
+    @override_settings(SURVEY_FINALIZATION='sync')
+    def test_parallel_completion_finalizes_once(self):
+        UserResponse.objects.create(user_profile=self.profile, question=self.question).selected_answers.set([self.answer])
+        workers = 8
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def complete():
+            try:
+                profile = AnonymousUserProfile.objects.get(pk=self.profile.pk)
+                barrier.wait()
+                _complete_survey(profile)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        with patch('questionnaire.views.save_survey_results', wraps=save_survey_results) as save:
+            threads = [threading.Thread(target=complete) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(SurveyResult.objects.filter(user_profile=self.profile).count(), 1)
+
+    def test_failed_enqueue_leaves_survey_open(self):
+        with patch('questionnaire.views.enqueue_finalization', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                _complete_survey(AnonymousUserProfile.objects.get(pk=self.profile.pk))
+
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.filled_survey)
+        self.assertFalse(DailyActivity.objects.filter(completions__gt=0).exists())
+
+        _complete_survey(self.profile)
+        self.assertTrue(FinalizationTask.objects.filter(user_profile=self.profile).exists())
+
+    @override_settings(SURVEY_FINALIZATION='sync')
+    def test_failed_sync_save_leaves_survey_open(self):
+        with patch('questionnaire.views.save_survey_results', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                _complete_survey(AnonymousUserProfile.objects.get(pk=self.profile.pk))
+
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.filled_survey)
+        self.assertFalse(SurveyResult.objects.exists())
+
+
+@override_settings(CHANGE_FEED_TOKEN='feed-token', CHANGE_FEED_SETTLE_SECONDS=0)
+class SurveyResultChangesTests(TransactionTestCase):
+    def setUp(self):
+        self.url = reverse('survey_result_changes_api')
+        self.auth = {'HTTP_AUTHORIZATION': 'Bearer feed-token'}
+        base = now() - timedelta(hours=1)
+        self.results = []
+        for index in range(5):
+            profile = AnonymousUserProfile.objects.create(session_key=f"feed_{index}")
+            result = SurveyResult.objects.create(
+                user_profile=profile, responses_data={'profile_info': {}, 'questions': []}
+            )
+            # Две записи с одинаковым updated_at: порядок определяет id
+            SurveyResult.objects.filter(pk=result.pk).update(updated_at=base + timedelta(minutes=index // 2))
+            self.results.append(result)
+
+    def fetch(self, cursor='', limit=2):
+        response = self.client.get(self.url, {'cursor': cursor, 'limit': limit}, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_cursor(self):
+        seen = []
+        cursor = ''
+        while True:
+            page = self.fetch(cursor)
+            seen += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, [result.pk for result in self.results])
+
+        # Повторный запрос с последним курсором пуст, пока ничего не изменилось
+        page = self.fetch(cursor)
+        self.assertEqual(page['results'], [])
+        self.assertEqual(page['next_cursor'], cursor)
+
+        changed = self.results[1]
+        changed.save()
+        page = self.fetch(cursor)
+        self.assertEqual([row['id'] for row in page['results']], [changed.pk])
+        self.assertEqual(page['results'][0]['session_key'], 'feed_1')
+
+    def test_requires_authorization(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CHANGE_FEED_SETTLE_SECONDS=60)
+    def test_recent_changes_wait_to_settle(self):
+        self.results[0].save()
+        ids = [row['id'] for row in self.fetch(limit=10)['results']]
+        self.assertNotIn(self.results[0].pk, ids)
+        self.assertEqual(len(ids), 4)
+
+
+class ResponseUpsertTests(TransactionTestCase):
+    def setUp(self):
+        self.profile = AnonymousUserProfile.objects.create(session_key="upsert_session")
+        self.question = Question.objects.create(text="Sleep", order=1, is_multiple_choice=True, description="СОН")
+        self.answers = [
+            Answer.objects.create(text=f"Answer {index}", question=self.question, value=index / 2)
+            for index in range(3)
+        ]
+
+    def save(self, *answers, profile=None):
+        _save_user_response(
+            profile or self.profile, get_question_graph(), self.question,
+            [str(answer.id) for answer in answers], '', None
+        )
+
+    def test_resubmit_updates_single_row(self):
+        self.save(self.answers[0], self.answers[1])
+        first = UserResponse.objects.get()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.save(self.answers[1], self.answers[2])
+        through_writes = [
+            q['sql'] for q in queries.captured_queries
+            if 'selected_answers' in q['sql'] and q['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        # Удаляется только снятый вариант, добавляется только новый
+        self.assertEqual(len(through_writes), 2)
+
+        response = UserResponse.objects.get()
+        self.assertEqual(response.pk, first.pk)
+        self.assertEqual(response.created_at, first.created_at)
+        self.assertGreater(response.updated_at, first.updated_at)
+        self.assertEqual(
+            sorted(response.selected_answers.values_list('id', flat=True)),
+            [self.answers[1].id, self.answers[2].id]
+        )
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Параллельная запись требует PostgreSQL')
+    def test_parallel_submits_of_same_question(self):
+        workers = 8
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def submit(index):
+            try:
+                profile = AnonymousUserProfile.objects.get(pk=self.profile.pk)
+                barrier.wait()
+                self.save(self.answers[index % len(self.answers)], profile=profile)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(index,)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        response = UserResponse.objects.get(user_profile=self.profile)
+        # Побеждает одна из отправок целиком, без объединения вариантов
+        self.assertEqual(response.selected_answers.count(), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.answered_count, 1)
@@ -1,13 +1,22 @@
 from django.http import HttpResponseNotFound
 from django.urls import path
-from .views import home_view, user_profile_view, questionnaire_view, thank_you_view
+from .views import (
+    home_view, user_profile_view, questionnaire_view, questionnaire_section_view, thank_you_view,
+    thank_you_status_view, question_bank_view, survey_submit_view, survey_result_changes_view
+)
 
 urlpatterns = [
     path('', home_view, name='home'),
     path('profile/', user_profile_view, name='user_profile_view'),
     path('survey/', questionnaire_view, name='questionnaire_start'),
     path('survey/<int:question_order>/', questionnaire_view, name='questionnaire_view'),
+    path('survey/sections/', questionnaire_section_view, name='questionnaire_sections_start'),
+    path('survey/sections/<slug:section_key>/', questionnaire_section_view, name='questionnaire_section_view'),
     path('thank-you/', thank_you_view, name='thank_you_view'),
+    path('thank-you/status/', thank_you_status_view, name='thank_you_status_view'),
+    path('api/questions/', question_bank_view, name='question_bank_api'),
+    path('api/survey/', survey_submit_view, name='survey_submit_api'),
+    path('api/results/changes/', survey_result_changes_view, name='survey_result_changes_api'),
     # Фиктивный URL для тестов
     path('questionnaire_list/', lambda r: HttpResponseNotFound(), name='questionnaire_list'),
 ]
\ No newline at end of file
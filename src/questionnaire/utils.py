@@ -1,6 +1,18 @@
-from django.db import transaction
-from django.db.models import Prefetch
-from .models import Question, UserResponse, Answer, SurveyResult
+import hashlib
+import inspect
+import json
+from collections import namedtuple
+
+from django.db.models import Max
+
+from . import rating_cache
+from .models import UserResponse, SurveyResult, ResponseAccumulator, QuestionBankVersion, AnonymousUserProfile
+
+# Плоская строка ответа для движка расчета: answers - список пар (value, text)
+ResponseRow = namedtuple(
+    'ResponseRow',
+    ['description', 'is_numeric_input', 'numeric_answer', 'free_text_answer', 'answers']
+)
 
 # Константы для категорий вопросов
 QUESTION_CATEGORIES = {
@@ -181,6 +193,50 @@ BMI_SCORE_MAP = {
     "Ожирение III ст.": 0.0
 }
 
+# Пороги артериального давления: статус -> (систолическое, диастолическое)
+BP_LIMITS = {'high': (140, 90), 'elevated': (130, 85)}
+
+# Пороги холестерина и глюкозы (ммоль/л)
+CHOLESTEROL_LIMIT = 5.5
+GLUCOSE_PREDIABETES_LIMIT = 5.6
+GLUCOSE_DIABETES_LIMIT = 6.1
+
+# Пороги окружности талии по полу: (повышенное значение, высокое значение)
+WAIST_LIMITS = {'M': (94, 102), 'F': (80, 88)}
+
+# Пороги соотношения талия/бедро по полу
+WAIST_HIP_RATIO_LIMITS = {'M': 0.9, 'F': 0.85}
+
+METABOLIC_RISK_ELEVATED = (
+    "У вас повышен риск развития метаболических нарушений, "
+    "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
+    "2-ого типа и сердечно-сосудистых заболеваний"
+)
+METABOLIC_RISK_HIGH = (
+    "У вас наблюдается высокий риск развития метаболических нарушений, "
+    "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
+    "2-ого типа и сердечно-сосудистых заболеваний"
+)
+
+WAIST_STATUSES = {
+    'normal': {'status': 'Норма', 'description': 'Риск сопутствующих заболеваний снижен'},
+    'elevated': {'status': 'Повышенное значение', 'description': METABOLIC_RISK_ELEVATED},
+    'high': {'status': 'Высокое значение', 'description': METABOLIC_RISK_HIGH},
+}
+
+RATIO_STATUSES = {
+    'normal': {'status': 'Норма', 'description': 'Риск сопутствующих заболеваний снижен'},
+    'elevated': {'status': 'Повышенное значение', 'description': METABOLIC_RISK_HIGH},
+}
+
+# Границы рейтинга: общий балл <= порога -> рейтинг
+RATING_BANDS = [
+    (0.47, "Неудовлетворительный"),
+    (0.67, "Удовлетворительный"),
+    (0.89, "Допустимый"),
+]
+TOP_RATING = "Оптимальный"
+
 BP_STATUS_DESCRIPTIONS = {
     'normal': "У Вас нормальное артериальное давление",
     'elevated': "У Вас нормальное повышенное АД",
@@ -196,10 +252,14 @@ BP_STATUS_DESCRIPTIONS = {
 
 def calculate_user_rating(user_profile):
     """Основная функция расчета рейтинга пользователя"""
+    return rate_responses(user_profile, get_user_responses(user_profile))
+
+
+def rate_responses(user_profile, responses):
+    """Расчет рейтинга по уже загруженным ответам (список ResponseRow)"""
     result = initialize_base_result()
-    responses = get_user_responses(user_profile)
 
-    if not responses.exists():
+    if not responses:
         return result
 
     bmi_data = calculate_bmi_data(user_profile)
@@ -211,6 +271,56 @@ def calculate_user_rating(user_profile):
     return result
 
 
+def rate_snapshot(snapshot):
+    """
+    Расчет рейтинга по самодостаточному снимку ответов без обращения к базе.
+    Снимок - responses_data в полном формате, где у каждого вопроса есть еще
+    description и is_numeric_input (см. questionnaire.replay.snapshot_record)
+    """
+    profile_info = snapshot['profile_info']
+    user_profile = AnonymousUserProfile(
+        gender=profile_info.get('gender'),
+        age=profile_info.get('age'),
+        height=profile_info.get('height'),
+        weight=profile_info.get('weight')
+    )
+    responses = [
+        ResponseRow(
+            question.get('description'), question.get('is_numeric_input', False), question['numeric_answer'],
+            question['free_text_answer'],
+            [(answer['value'], answer['answer_text']) for answer in question['selected_answers']]
+        )
+        for question in snapshot['questions']
+    ]
+    return rate_responses(user_profile, responses)
+
+
+def get_rating_stamp(user_profile):
+    """
+    Метка актуальности рейтинга: время последнего изменения ответов, данные
+    профиля, входящие в расчет, версия банка вопросов и версия правил расчета
+    """
+    latest = UserResponse.objects.filter(user_profile=user_profile).aggregate(
+        latest=Max('updated_at')
+    )['latest']
+    return (
+        latest.isoformat() if latest else None,
+        (user_profile.gender, user_profile.age, user_profile.height, user_profile.weight),
+        QuestionBankVersion.current(),
+        RATING_RULESET_HASH
+    )
+
+
+def get_cached_rating(user_profile):
+    """Рейтинг пользователя из кэша; при промахе рассчитывается и кэшируется"""
+    stamp = get_rating_stamp(user_profile)
+    rating = rating_cache.get_cached(user_profile.pk, stamp)
+    if rating is None:
+        rating = calculate_user_rating(user_profile)
+        rating_cache.set_cached(user_profile.pk, stamp, rating)
+    return rating
+
+
 def initialize_base_result():
     """Инициализирует базовую структуру результата"""
     return {
@@ -230,13 +340,33 @@ def initialize_base_result():
 
 
 def get_user_responses(user_profile):
-    """Получает ответы пользователя с префетчингом"""
-    return UserResponse.objects.filter(
+    """
+    Получает ответы пользователя списком ResponseRow.
+    Два плоских запроса независимо от количества вопросов: ответы с данными
+    вопроса и выбранные варианты всех ответов.
+    """
+    rows = list(UserResponse.objects.filter(
         user_profile=user_profile
-    ).prefetch_related(
-        Prefetch('selected_answers', queryset=Answer.objects.only('value')),
-        Prefetch('question', queryset=Question.objects.only('description'))
+    ).values_list(
+        'id', 'question__description', 'question__is_numeric_input',
+        'numeric_answer', 'free_text_answer'
+    ))
+    if not rows:
+        return []
+
+    answers = {}
+    selected = UserResponse.selected_answers.through.objects.filter(
+        userresponse__user_profile=user_profile
+    ).order_by('userresponse_id', 'answer_id').values_list(
+        'userresponse_id', 'answer__value', 'answer__text'
     )
+    for response_id, value, text in selected:
+        answers.setdefault(response_id, []).append((value, text))
+
+    return [
+        ResponseRow(description, is_numeric, numeric_answer, free_text, answers.get(response_id, []))
+        for response_id, description, is_numeric, numeric_answer, free_text in rows
+    ]
 
 
 def calculate_bmi_data(user_profile):
@@ -416,10 +546,10 @@ def process_single_response(response, data, user_profile):
     category = get_response_category(response)
 
     # Для числовых вопросов
-    if response.question.is_numeric_input:
+    if response.is_numeric_input:
         values = [response.numeric_answer] if response.numeric_answer is not None else []
     else:
-        values = [a.value for a in response.selected_answers.all() if a.value is not None]
+        values = [value for value, _ in response.answers if value is not None]
 
     # Обработка специальных вопросов
     if handle_special_questions(response, values, data, user_profile):
@@ -434,249 +564,29 @@ def process_single_response(response, data, user_profile):
 
 def get_response_category(response):
     """Определяет категорию для ответа на вопрос"""
-    for key, params in QUESTION_CATEGORIES.items():
-        if response.question.description in params['descriptions']:
-            return key
-    return None
+    return DESCRIPTION_CATEGORIES.get(response.description)
 
 
 def handle_special_questions(response, values, data, user_profile):
     """Обрабатывает специальные вопросы (талия, бедра, давление и т.д.)"""
-    desc = response.question.description
+    entry = QUESTION_DISPATCH.get(response.description)
+    if entry is None:
+        return False
 
-    if desc == "ОКРУЖНОСТЬ (ТАЛИИ)":
-        handle_waist_measurement(response, data, user_profile)
+    handler, slot, flag, category = entry
+    if handler:
+        handler(response, data)
         return True
 
-    elif desc == "ОКРУЖНОСТЬ (БЕДЕР)":
-        handle_hip_measurement(response, data)
-        return True
-
-    elif desc == "ОБЩИЙ ХОЛЕСТЕРИН":
-        handle_cholesterol(response, data)
-        return True
-
-    elif desc == "УРОВЕНЬ ГЛЮКОЗЫ":
-        handle_glucose(response, data)
-        return True
-
-    elif desc == "Имеющиеся заболевания":
-        handle_diseases(response, data)
-        return True
+    if slot:
+        data[slot].extend(values)
+    elif flag:
+        data[flag] = True
+    data['category_values'][category].extend(values)
+    return True
 
-    elif desc == "АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ":
-        handle_blood_pressure(response, data)
-        return True
-
-    # Категория "Образ жизни"
-    elif desc == "ДВИГАТЕЛЬНАЯ АКТИВНОСТЬ":
-        data['physical_activity_values'].extend(values)
-        data['category_values']['lifestyle'].extend(values)
-        return True
-    elif desc == "СОН":
-        data['sleep_values'].extend(values)
-        data['category_values']['lifestyle'].extend(values)
-        return True
-    elif desc == "ЦИФРОВАЯ ГИГИЕНА":
-        data['digital_hygiene_values'].extend(values)
-        data['category_values']['lifestyle'].extend(values)
-        return True
-    elif desc == "ОТПУСК":
-        data['has_vacation_answers'] = True
-        data['category_values']['lifestyle'].extend(values)
-        return True
-    elif desc == "АЛКОГОЛЬ":
-        data['alcohol_alert'] = True
-        data['category_values']['lifestyle'].extend(values)
-        return True
 
-    # Категория "Самооценка труда"
-    elif desc == "РАБОЧЕЕ МЕСТО":
-        data['workplace_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ФИЗИЧЕСКИЕ НАГРУЗКИ":
-        data['physical_load_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ТЕМП РАБОТЫ":
-        data['work_pace_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ЭМОЦИОНАЛЬНАЯ НАГРУЗКА":
-        data['emotional_load_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "УТОМЛЯЕМОСТЬ":
-        data['fatigue_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ГРАФИК РАБОТЫ":
-        data['schedule_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ЖАЛОБЫ НА ПРОИЗВОДСТВО":
-        handle_industrial_complaints(response, data)
-        return True
-    elif desc == "ЖАЛОБЫ НА ЗДОРОВЬЕ":
-        handle_health_complaints(response, data)
-        return True
-    elif desc == "ТРУД С ЦИФРОВЫМИ УСТРОЙСТВАМИ":
-        data['digital_work_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "КРИТИЧЕСКИЕ СИТУАЦИИ":
-        data['critical_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ЭКСТРА УСИЛИЯ":
-        data['extra_effort_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "РЕГЛАМЕНТИРОВАННЫЕ ПЕРЕРЫВЫ":
-        data['breaks_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "ОБЕДЕННЫЙ ПЕРЕРЫВ":
-        data['lunch_break_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-    elif desc == "РАБОТА НА ДОМУ":
-        data['remote_work_values'].extend(values)
-        data['category_values']['work_assessment'].extend(values)
-        return True
-
-    # Категория "Питание"
-    elif desc == "ПРИЕМЫ ПИЩИ":
-        data['meal_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ВРЕМЯ ПЕРЕРЫВОВ МЕЖДУ ЕДОЙ":
-        data['interval_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ЗАВТРАК":
-        data['breakfast_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "НАИБОЛЕЕ ПЛОТНЫЙ ПРИЕМ ПИЩИ":
-        data['density_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ЕДА ДО СНА":
-        data['evening_meal_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ВИД ЖИРОВ":
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ГОЛОД":
-        data['hunger_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ЭМОЦИОНАЛЬНЫЕ ПЕРЕКУСЫ":
-        data['emotional_eating_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-    elif desc == "ПООЩРЕНИЕ ИЛИ НАКАЗАНИЕ ЕДОЙ":
-        data['food_reward_values'].extend(values)
-        data['category_values']['nutrition'].extend(values)
-        return True
-
-    # Категория "Пищевое поведение"
-    elif desc == "СНЕКИ":
-        data['snack_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ФАСТ-ФУД":
-        data['fast_food_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "СЛАДКАЯ ГАЗИРОВКА":
-        data['soda_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "КОЛБАСНЫЕ ИЗДЕЛИЯ":
-        data['sausage_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "КОПЧЕНЫЕ ПРОДУКТЫ":
-        data['smoked_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ПИЩЕВЫЕ ЖИРЫ":
-        data['fat_product_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "СОУСЫ":
-        data['sauce_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ЖАРЕННЫЙ КАРТОФЕЛЬ":
-        data['fried_potato_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "СОЛЕНЫЕ И КОНСЕРВИРОВАННЫЕ ПРОДУКТЫ":
-        data['salted_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "МОЛОЧНЫЕ ПРОДУКТЫ С ВЫСОКОЙ ЖИРНОСТЬЮ":
-        data['high_fat_dairy_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ВЫПЕЧКА":
-        data['baking_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "КОЛИЧЕСТВО ФРУКТОВ И ОВОЩЕЙ":
-        data['has_fruits_veggies_answer'] = True
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ЗЛАКОВЫЕ ПРОДУКТЫ":
-        data['grain_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "БОБОВЫЕ":
-        data['legume_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "НЕЖИРНОЕ МЯСО":
-        data['lean_meat_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "РЫБА И МОРЕПРОДУКТЫ":
-        data['seafood_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "МОЛОКО И КИСЛОМОЛОЧКА":
-        data['dairy_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "РАСТИТЕЛЬНЫЕ МАСЛА":
-        data['has_oil_answer'] = True
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ЖИДКОСТЬ В ДЕНЬ":
-        data['liquid_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "ДОСАЛИВАНИЕ":
-        data['salt_addition_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "СПЕЦИАЛЬНАЯ ПИЩЕВАЯ ПРОДУКЦИЯ":
-        data['special_food_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-    elif desc == "БАДЫ":
-        data['supplements_values'].extend(values)
-        data['category_values']['eating_behavior'].extend(values)
-        return True
-
-    return False
-
-
-def handle_waist_measurement(response, data, user_profile):
+def handle_waist_measurement(response, data, user_profile=None):
     """Обрабатывает измерение окружности талии"""
     if response.numeric_answer is None:
         return
@@ -731,19 +641,19 @@ def handle_glucose(response, data):
 
 def handle_diseases(response, data):
     """Обрабатывает ответ об имеющихся неинфекционных заболеваниях"""
-    data['diseases'].extend([a.text for a in response.selected_answers.all()])
+    data['diseases'].extend([text for _, text in response.answers])
     if response.free_text_answer:
         data['diseases'].append(response.free_text_answer)
 
 def handle_industrial_complaints(response, data):
     """Обрабатывает ответ об имеющихся жалобы на производственные факторы"""
-    data['industrial_complaints'].extend([a.text for a in response.selected_answers.all()])
+    data['industrial_complaints'].extend([text for _, text in response.answers])
     if response.free_text_answer:
         data['industrial_complaints'].append(response.free_text_answer)
 
 def handle_health_complaints(response, data):
     """Обрабатывает ответ об имеющихся жалобы здоровье во время работы"""
-    data['health_complaints'].extend([a.text for a in response.selected_answers.all()])
+    data['health_complaints'].extend([text for _, text in response.answers])
     if response.free_text_answer:
         data['health_complaints'].append(response.free_text_answer)
 
@@ -770,7 +680,7 @@ def handle_blood_pressure(response, data):
 
 def handle_lifestyle_response(response, values, data):
     """Обрабатывает ответы категории lifestyle"""
-    desc = response.question.description
+    desc = response.description
 
     if desc == "Курение (сигарет в день)":
         # Для числовых вопросов values содержит список с одним значением
@@ -785,6 +695,229 @@ def handle_lifestyle_response(response, values, data):
         data['category_values']['lifestyle'].extend(values)
 
 
+# Таблицы диспетчеризации ответов (строятся один раз при импорте)
+
+# Вопросы с собственными обработчиками
+SPECIAL_QUESTION_HANDLERS = {
+    "ОКРУЖНОСТЬ (ТАЛИИ)": handle_waist_measurement,
+    "ОКРУЖНОСТЬ (БЕДЕР)": handle_hip_measurement,
+    "ОБЩИЙ ХОЛЕСТЕРИН": handle_cholesterol,
+    "УРОВЕНЬ ГЛЮКОЗЫ": handle_glucose,
+    "Имеющиеся заболевания": handle_diseases,
+    "АРТЕРИАЛЬНОЕ ДАВЛЕНИЕ": handle_blood_pressure,
+    "ЖАЛОБЫ НА ПРОИЗВОДСТВО": handle_industrial_complaints,
+    "ЖАЛОБЫ НА ЗДОРОВЬЕ": handle_health_complaints,
+}
+
+# Вопросы, значения которых копятся в отдельном списке и в категории: описание -> (список, категория)
+VALUE_SLOTS = {
+    # Категория "Образ жизни"
+    "ДВИГАТЕЛЬНАЯ АКТИВНОСТЬ": ('physical_activity_values', 'lifestyle'),
+    "СОН": ('sleep_values', 'lifestyle'),
+    "ЦИФРОВАЯ ГИГИЕНА": ('digital_hygiene_values', 'lifestyle'),
+
+    # Категория "Самооценка труда"
+    "РАБОЧЕЕ МЕСТО": ('workplace_values', 'work_assessment'),
+    "ФИЗИЧЕСКИЕ НАГРУЗКИ": ('physical_load_values', 'work_assessment'),
+    "ТЕМП РАБОТЫ": ('work_pace_values', 'work_assessment'),
+    "ЭМОЦИОНАЛЬНАЯ НАГРУЗКА": ('emotional_load_values', 'work_assessment'),
+    "УТОМЛЯЕМОСТЬ": ('fatigue_values', 'work_assessment'),
+    "ГРАФИК РАБОТЫ": ('schedule_values', 'work_assessment'),
+    "ТРУД С ЦИФРОВЫМИ УСТРОЙСТВАМИ": ('digital_work_values', 'work_assessment'),
+    "КРИТИЧЕСКИЕ СИТУАЦИИ": ('critical_values', 'work_assessment'),
+    "ЭКСТРА УСИЛИЯ": ('extra_effort_values', 'work_assessment'),
+    "РЕГЛАМЕНТИРОВАННЫЕ ПЕРЕРЫВЫ": ('breaks_values', 'work_assessment'),
+    "ОБЕДЕННЫЙ ПЕРЕРЫВ": ('lunch_break_values', 'work_assessment'),
+    "РАБОТА НА ДОМУ": ('remote_work_values', 'work_assessment'),
+
+    # Категория "Питание"
+    "ПРИЕМЫ ПИЩИ": ('meal_values', 'nutrition'),
+    "ВРЕМЯ ПЕРЕРЫВОВ МЕЖДУ ЕДОЙ": ('interval_values', 'nutrition'),
+    "ЗАВТРАК": ('breakfast_values', 'nutrition'),
+    "НАИБОЛЕЕ ПЛОТНЫЙ ПРИЕМ ПИЩИ": ('density_values', 'nutrition'),
+    "ЕДА ДО СНА": ('evening_meal_values', 'nutrition'),
+    "ВИД ЖИРОВ": (None, 'nutrition'),
+    "ГОЛОД": ('hunger_values', 'nutrition'),
+    "ЭМОЦИОНАЛЬНЫЕ ПЕРЕКУСЫ": ('emotional_eating_values', 'nutrition'),
+    "ПООЩРЕНИЕ ИЛИ НАКАЗАНИЕ ЕДОЙ": ('food_reward_values', 'nutrition'),
+
+    # Категория "Пищевое поведение"
+    "СНЕКИ": ('snack_values', 'eating_behavior'),
+    "ФАСТ-ФУД": ('fast_food_values', 'eating_behavior'),
+    "СЛАДКАЯ ГАЗИРОВКА": ('soda_values', 'eating_behavior'),
+    "КОЛБАСНЫЕ ИЗДЕЛИЯ": ('sausage_values', 'eating_behavior'),
+    "КОПЧЕНЫЕ ПРОДУКТЫ": ('smoked_values', 'eating_behavior'),
+    "ПИЩЕВЫЕ ЖИРЫ": ('fat_product_values', 'eating_behavior'),
+    "СОУСЫ": ('sauce_values', 'eating_behavior'),
+    "ЖАРЕННЫЙ КАРТОФЕЛЬ": ('fried_potato_values', 'eating_behavior'),
+    "СОЛЕНЫЕ И КОНСЕРВИРОВАННЫЕ ПРОДУКТЫ": ('salted_values', 'eating_behavior'),
+    "МОЛОЧНЫЕ ПРОДУКТЫ С ВЫСОКОЙ ЖИРНОСТЬЮ": ('high_fat_dairy_values', 'eating_behavior'),
+    "ВЫПЕЧКА": ('baking_values', 'eating_behavior'),
+    "ЗЛАКОВЫЕ ПРОДУКТЫ": ('grain_values', 'eating_behavior'),
+    "БОБОВЫЕ": ('legume_values', 'eating_behavior'),
+    "НЕЖИРНОЕ МЯСО": ('lean_meat_values', 'eating_behavior'),
+    "РЫБА И МОРЕПРОДУКТЫ": ('seafood_values', 'eating_behavior'),
+    "МОЛОКО И КИСЛОМОЛОЧКА": ('dairy_values', 'eating_behavior'),
+    "ЖИДКОСТЬ В ДЕНЬ": ('liquid_values', 'eating_behavior'),
+    "ДОСАЛИВАНИЕ": ('salt_addition_values', 'eating_behavior'),
+    "СПЕЦИАЛЬНАЯ ПИЩЕВАЯ ПРОДУКЦИЯ": ('special_food_values', 'eating_behavior'),
+    "БАДЫ": ('supplements_values', 'eating_behavior'),
+}
+
+# Вопросы, наличие ответа на которые выставляет флаг: описание -> (флаг, категория)
+PRESENCE_FLAGS = {
+    "ОТПУСК": ('has_vacation_answers', 'lifestyle'),
+    "АЛКОГОЛЬ": ('alcohol_alert', 'lifestyle'),
+    "КОЛИЧЕСТВО ФРУКТОВ И ОВОЩЕЙ": ('has_fruits_veggies_answer', 'eating_behavior'),
+    "РАСТИТЕЛЬНЫЕ МАСЛА": ('has_oil_answer', 'eating_behavior'),
+}
+
+
+def build_question_dispatch():
+    """Собирает таблицу описание -> (обработчик, список, флаг, категория)"""
+    dispatch = {}
+    for desc, handler in SPECIAL_QUESTION_HANDLERS.items():
+        dispatch[desc] = (handler, None, None, None)
+    for desc, (slot, category) in VALUE_SLOTS.items():
+        dispatch[desc] = (None, slot, None, category)
+    for desc, (flag, category) in PRESENCE_FLAGS.items():
+        dispatch[desc] = (None, None, flag, category)
+    return dispatch
+
+
+def build_description_categories():
+    """Собирает таблицу описание -> категория (первое совпадение, как при переборе)"""
+    categories = {}
+    for key, params in QUESTION_CATEGORIES.items():
+        for desc in params['descriptions']:
+            categories.setdefault(desc, key)
+    return categories
+
+
+QUESTION_DISPATCH = build_question_dispatch()
+DESCRIPTION_CATEGORIES = build_description_categories()
+
+# Битовые коды значений ответа для правил флагов; прочие значения - ALERT_OTHER_BIT
+ALERT_VALUE_BITS = {0: 1, 0.5: 2, 0.79: 4, 1: 8}
+ALERT_OTHER_BIT = 16
+
+# Флаги пост-обработки: (список значений, значения-триггеры, ключ, вложенный ключ или None)
+ALERT_RULES = (
+    # Образ жизни
+    ('physical_activity_values', (0, 0.5), 'has_low_activity', None),
+    ('sleep_values', (0, 0.5), 'has_sleep_issues', None),
+    ('digital_hygiene_values', (0, 0.5), 'has_digital_issues', None),
+
+    # Самооценка условий труда
+    ('workplace_values', (0, 0.5), 'has_workplace_issues', None),
+    ('physical_load_values', (0, 0.5), 'has_physical_load_issues', None),
+    ('work_pace_values', (0, 0.5), 'has_work_pace_issues', None),
+    ('emotional_load_values', (0, 0.5), 'has_emotional_load_issues', None),
+    ('fatigue_values', (0, 0.5), 'has_fatigue_issues', None),
+    ('schedule_values', (0, 0.5), 'has_schedule_issues', None),
+    ('digital_work_values', (0, 0.5), 'has_digital_work_issues', None),
+    ('critical_values', (0,), 'critical_data', 'has_critical_0'),
+    ('critical_values', (0.5,), 'critical_data', 'has_critical_05'),
+    ('critical_values', (0.79,), 'critical_data', 'has_critical_079'),
+    ('extra_effort_values', (0.5,), 'extra_effort_data', 'has_extra_05'),
+    ('extra_effort_values', (0,), 'extra_effort_data', 'has_extra_0'),
+    ('breaks_values', (0, 0.5, 0.79), 'has_breaks_issues', None),
+    ('lunch_break_values', (0, 0.5), 'has_lunch_issues', None),
+    ('remote_work_values', (0.5,), 'remote_work_data', 'has_remote_05'),
+    ('remote_work_values', (0,), 'remote_work_data', 'has_remote_0'),
+
+    # Питание
+    ('meal_values', (0.5,), 'meal_data', 'has_meal_05'),
+    ('meal_values', (0,), 'meal_data', 'has_meal_0'),
+    ('interval_values', (0.5,), 'interval_data', 'has_interval_05'),
+    ('interval_values', (0,), 'interval_data', 'has_interval_0'),
+    ('breakfast_values', (0,), 'breakfast_data', 'has_breakfast_0'),
+    ('breakfast_values', (0.5,), 'breakfast_data', 'has_breakfast_05'),
+    ('breakfast_values', (0.79,), 'breakfast_data', 'has_breakfast_079'),
+    ('density_values', (0.5,), 'density_data', 'has_density_05'),
+    ('density_values', (0,), 'density_data', 'has_density_0'),
+    ('evening_meal_values', (0, 0.5), 'has_evening_meal_issues', None),
+    ('fat_values', (0, 0.5), 'has_fat_issues', None),
+    ('hunger_values', (0, 0.5, 0.79), 'has_hunger_issues', None),
+    ('food_reward_values', (0, 0.5), 'has_food_reward_issues', None),
+
+    # Пищевые привычки
+    ('snack_values', (0, 0.5, 0.79), 'has_snack_issues', None),
+    ('fast_food_values', (0,), 'fast_food_data', 'has_fast_food_0'),
+    ('fast_food_values', (0.5,), 'fast_food_data', 'has_fast_food_05'),
+    ('fast_food_values', (0.79,), 'fast_food_data', 'has_fast_food_079'),
+    ('soda_values', (0, 0.5, 0.79), 'has_soda_issues', None),
+    ('sausage_values', (0, 0.5), 'has_sosage_issues', None),
+    ('smoked_values', (0, 0.5), 'has_smoked_issues', None),
+    ('fat_product_values', (0, 0.5), 'has_fat_products_issues', None),
+    ('sauce_values', (0, 0.5), 'has_sauce_issues', None),
+    ('fried_potato_values', (0, 0.5), 'has_fried_potato_issues', None),
+    ('salted_values', (0, 0.5), 'has_salted_issues', None),
+    ('high_fat_dairy_values', (0, 0.5), 'has_high_fat_dairy_issues', None),
+    ('baking_values', (0, 0.5), 'has_baking_issues', None),
+    ('grain_values', (0, 0.5, 0.79), 'has_grain_issues', None),
+    ('legume_values', (0, 0.5), 'has_legume_issues', None),
+    ('lean_meat_values', (0, 0.5, 0.79), 'has_lean_meat_issues', None),
+    ('seafood_values', (0, 0.5), 'has_seafood_issues', None),
+    ('dairy_values', (0.5, 0.79), 'dairy_data', 'has_dairy_low'),
+    ('dairy_values', (0,), 'dairy_data', 'has_dairy_0'),
+    ('liquid_values', (0, 0.5), 'has_liquid_issues', None),
+    ('salt_addition_values', (0, 0.5), 'has_salt_addition_issues', None),
+    ('special_food_values', (0, 0.5), 'has_special_foof_issues', None),
+    ('supplements_values', (0, 0.5), 'has_supplements_issues', None),
+)
+
+# Эмоциональное питание: флаги взаимоисключающие, проверяются по одной маске списка
+EMOTIONAL_EATING_BUCKET = 'emotional_eating_values'
+
+
+def compile_alert_rules(rules):
+    """Группирует правила по спискам: список -> [(битовая маска, ключ, вложенный ключ)]"""
+    compiled = {}
+    for bucket, values, key, nested in rules:
+        mask = 0
+        for value in values:
+            mask |= ALERT_VALUE_BITS[value]
+        compiled.setdefault(bucket, []).append((mask, key, nested))
+    return compiled
+
+
+COMPILED_ALERT_RULES = compile_alert_rules(ALERT_RULES)
+
+
+def collect_value_bits(values):
+    """Битовая маска встретившихся значений списка"""
+    bits = 0
+    for value in values:
+        bits |= ALERT_VALUE_BITS.get(value, ALERT_OTHER_BIT)
+    return bits
+
+
+def apply_alert_rules(data):
+    """Вычисляет флаги ALERT_RULES и эмоционального питания, просматривая каждое значение один раз"""
+    nested_flags = {}
+    for bucket, rules in COMPILED_ALERT_RULES.items():
+        bits = collect_value_bits(data[bucket])
+        for mask, key, nested in rules:
+            if nested is None:
+                data[key] = bool(bits & mask)
+            else:
+                nested_flags.setdefault(key, {})[nested] = bool(bits & mask)
+    data.update(nested_flags)
+
+    bits = collect_value_bits(data[EMOTIONAL_EATING_BUCKET])
+    has_emotional_eating_0 = bool(bits & ALERT_VALUE_BITS[0])
+    has_emotional_eating_05 = bool(bits & ALERT_VALUE_BITS[0.5]) and not has_emotional_eating_0
+    has_emotional_eating_079 = bool(bits & ALERT_VALUE_BITS[0.79]) and not (
+            has_emotional_eating_0 or has_emotional_eating_05)
+    data['emotional_eating_data'] = {
+        'has_emotional_eating_0': has_emotional_eating_0,
+        'has_emotional_eating_05': has_emotional_eating_05,
+        'has_emotional_eating_079': has_emotional_eating_079,
+        'all_healthy': bits == ALERT_VALUE_BITS[1]
+    }
+
+
 def post_process_data(data, bmi_data, user_profile):
     """Выполняет пост-обработку данных после обработки всех ответов"""
 
@@ -804,19 +937,15 @@ def post_process_data(data, bmi_data, user_profile):
     # Добавления балла за
     waist = data['waist_hip_data']['waist']
     if waist is not None:
-        if user_profile.gender == 'M':
-            waist_score = 1.0 if waist < 94 else 0.0
-        else:
-            waist_score = 1.0 if waist < 80 else 0.0
+        limit = WAIST_LIMITS['M' if user_profile.gender == 'M' else 'F'][0]
+        waist_score = 1.0 if waist < limit else 0.0
         data['category_values']['medico_biological'].append(waist_score)
 
     hip = data['waist_hip_data']['hip']
     if waist is not None and hip is not None and hip > 0:
         ratio = waist / hip
-        if user_profile.gender == 'M':
-            ratio_score = 1.0 if ratio < 0.9 else 0.0
-        else:
-            ratio_score = 1.0 if ratio < 0.85 else 0.0
+        limit = WAIST_HIP_RATIO_LIMITS['M' if user_profile.gender == 'M' else 'F']
+        ratio_score = 1.0 if ratio < limit else 0.0
         data['category_values']['medico_biological'].append(ratio_score)
 
     # Добавление балла артериального давления
@@ -828,7 +957,7 @@ def post_process_data(data, bmi_data, user_profile):
     # Добавление балла за холестерин
     if not data['cholesterol_data']['unknown'] and data['cholesterol_data']['value'] is not None:
         value = data['cholesterol_data']['value']
-        if value < 5.5:
+        if value < CHOLESTEROL_LIMIT:
             data['category_values']['medico_biological'].append(1.0)
         else:
             data['category_values']['medico_biological'].append(0.0)
@@ -836,7 +965,7 @@ def post_process_data(data, bmi_data, user_profile):
     # Добавление балла глюкозы
     if not data['glucose_data']['unknown'] and data['glucose_data']['value'] is not None:
         value = data['glucose_data']['value']
-        if value < 6.1:
+        if value < GLUCOSE_DIABETES_LIMIT:
             data['category_values']['medico_biological'].append(1.0)
         else:
             data['category_values']['medico_biological'].append(0.0)
@@ -845,15 +974,6 @@ def post_process_data(data, bmi_data, user_profile):
 
     #ОБРАЗ ЖИНИ--------------------------------------------------------------------------------
 
-    # Анализ двигательной активности
-    data['has_low_activity'] = any(v in (0, 0.5) for v in data['physical_activity_values'])
-
-    # Анализ сна
-    data['has_sleep_issues'] = any(v in (0, 0.5) for v in data['sleep_values'])
-
-    # Анализ цифровой гигиены
-    data['has_digital_issues'] = any(v in (0, 0.5) for v in data['digital_hygiene_values'])
-
     # Расчет индекса курения
     if data['smoking_data']:
         cigarettes = data['smoking_data'].get('cigarettes', 0)
@@ -874,14 +994,6 @@ def post_process_data(data, bmi_data, user_profile):
     # ------------------------------------------------------------------------------------------
 
     # Самонализ условий труда-------------------------------------------------------------------
-    data['has_workplace_issues'] = any(v in (0, 0.5) for v in data['workplace_values'])
-    data['has_physical_load_issues'] = any(v in (0, 0.5) for v in data['physical_load_values'])
-    data['has_work_pace_issues'] = any(v in (0, 0.5) for v in data['work_pace_values'])
-    data['has_emotional_load_issues'] = any(v in (0, 0.5) for v in data['emotional_load_values'])
-    data['has_fatigue_issues'] = any(v in (0, 0.5) for v in data['fatigue_values'])
-    data['has_schedule_issues'] = any(v in (0, 0.5) for v in data['schedule_values'])
-    data['has_digital_work_issues'] = any(v in (0, 0.5) for v in data['digital_work_values'])
-
     # Добавление балла за производственные факторы
     if data['industrial_complaints']:
         if len(data['industrial_complaints']) == 1 and 'Нет вредных производственных факторов' in data['industrial_complaints']:
@@ -896,107 +1008,10 @@ def post_process_data(data, bmi_data, user_profile):
         else:
             data['category_values']['work_assessment'].append(0.0)
 
-    # Анализ критических ситуаций
-    data['critical_data'] = {
-        'has_critical_0': any(v == 0 for v in data['critical_values']),
-        'has_critical_05': any(v == 0.5 for v in data['critical_values']),
-        'has_critical_079': any(v == 0.79 for v in data['critical_values'])
-    }
-
-    # Анализ экстра усилий
-    data['extra_effort_data'] = {
-        'has_extra_05': any(v == 0.5 for v in data['extra_effort_values']),
-        'has_extra_0': any(v == 0 for v in data['extra_effort_values'])
-    }
-
-    # Анализ перерывов
-    data['has_breaks_issues'] = any(v in {0, 0.5, 0.79} for v in data['breaks_values'])
-    data['has_lunch_issues'] = any(v in {0, 0.5} for v in data['lunch_break_values'])
-
-    # Анализ удаленной работы
-    data['remote_work_data'] = {
-        'has_remote_05': any(v == 0.5 for v in data['remote_work_values']),
-        'has_remote_0': any(v == 0 for v in data['remote_work_values'])
-    }
-    # ------------------------------------------------------------------------------------------
-
-    # Питание ----------------------------------------------------------------------------------
-    data['meal_data'] = {
-        'has_meal_05': any(v == 0.5 for v in data['meal_values']),
-        'has_meal_0': any(v == 0 for v in data['meal_values'])
-    }
-    data['interval_data'] = {
-        'has_interval_05': any(v == 0.5 for v in data['interval_values']),
-        'has_interval_0': any(v == 0 for v in data['interval_values'])
-    }
-    data['breakfast_data'] = {
-        'has_breakfast_0': any(v == 0 for v in data['breakfast_values']),
-        'has_breakfast_05': any(v == 0.5 for v in data['breakfast_values']),
-        'has_breakfast_079': any(v == 0.79 for v in data['breakfast_values'])
-    }
-    data['density_data'] = {
-        'has_density_05': any(v == 0.5 for v in data['density_values']),
-        'has_density_0': any(v == 0 for v in data['density_values'])
-    }
-    data['has_evening_meal_issues'] = any(v in {0, 0.5} for v in data['evening_meal_values'])
-    data['has_fat_issues'] = any(v in {0, 0.5} for v in data['fat_values'])
-    data['has_hunger_issues'] = any(v in {0, 0.5, 0.79} for v in data['hunger_values'])
-
-    # Анализ эмоционального питания
-    has_emotional_eating_0 = any(v == 0 for v in data['emotional_eating_values'])
-    has_emotional_eating_05 = any(v == 0.5 for v in data['emotional_eating_values']) and not has_emotional_eating_0
-    has_emotional_eating_079 = any(v == 0.79 for v in data['emotional_eating_values']) and not (
-            has_emotional_eating_0 or has_emotional_eating_05)
-    all_healthy = bool(data['emotional_eating_values']) and all(v == 1 for v in data['emotional_eating_values'])
-    data['emotional_eating_data'] = {
-        'has_emotional_eating_0': has_emotional_eating_0,
-        'has_emotional_eating_05': has_emotional_eating_05,
-        'has_emotional_eating_079': has_emotional_eating_079,
-        'all_healthy': all_healthy
-    }
-
-    # Анализ пищевых привычек
-    data['has_food_reward_issues'] = any(v in {0, 0.5} for v in data['food_reward_values'])
     # ------------------------------------------------------------------------------------------
 
-    # Пищевые привычки -------------------------------------------------------------------------
-    data['has_snack_issues'] = any(v in {0, 0.5, 0.79} for v in data['snack_values'])
-
-    # Анализ фаст-фуда
-    data['fast_food_data'] = {
-        'has_fast_food_0': any(v == 0 for v in data['fast_food_values']),
-        'has_fast_food_05': any(v == 0.5 for v in data['fast_food_values']),
-        'has_fast_food_079': any(v == 0.79 for v in data['fast_food_values'])
-    }
-
-    # Анализ напитков и продуктов
-    data['has_soda_issues'] = any(v in {0, 0.5, 0.79} for v in data['soda_values'])
-    data['has_sosage_issues'] = any(v in {0, 0.5} for v in data['sausage_values'])
-    data['has_smoked_issues'] = any(v in {0, 0.5} for v in data['smoked_values'])
-    data['has_fat_products_issues'] = any(v in {0, 0.5} for v in data['fat_product_values'])
-    data['has_sauce_issues'] = any(v in {0, 0.5} for v in data['sauce_values'])
-    data['has_fried_potato_issues'] = any(v in {0, 0.5} for v in data['fried_potato_values'])
-    data['has_salted_issues'] = any(v in {0, 0.5} for v in data['salted_values'])
-    data['has_high_fat_dairy_issues'] = any(v in {0, 0.5} for v in data['high_fat_dairy_values'])
-    data['has_baking_issues'] = any(v in {0, 0.5} for v in data['baking_values'])
-
-    # Анализ здорового питания
-    data['has_grain_issues'] = any(v in {0, 0.5, 0.79} for v in data['grain_values'])
-    data['has_legume_issues'] = any(v in {0, 0.5} for v in data['legume_values'])
-    data['has_lean_meat_issues'] = any(v in {0, 0.5, 0.79} for v in data['lean_meat_values'])
-    data['has_seafood_issues'] = any(v in {0, 0.5} for v in data['seafood_values'])
-
-    # Анализ молочных продуктов
-    data['dairy_data'] = {
-        'has_dairy_low': any(v in (0.5, 0.79) for v in data['dairy_values']),
-        'has_dairy_0': any(v == 0 for v in data['dairy_values'])
-    }
-
-    # Анализ жидкости и добавок
-    data['has_liquid_issues'] = any(v in {0, 0.5} for v in data['liquid_values'])
-    data['has_salt_addition_issues'] = any(v in {0, 0.5} for v in data['salt_addition_values'])
-    data['has_special_foof_issues'] = any(v in {0, 0.5} for v in data['special_food_values'])
-    data['has_supplements_issues'] = any(v in {0, 0.5} for v in data['supplements_values'])
+    # Флаги по спискам значений (ALERT_RULES) и эмоциональное питание ------------------------
+    apply_alert_rules(data)
     # ------------------------------------------------------------------------------------------
 
     # Стресс -----------------------------------------------------------------------------------
@@ -1011,9 +1026,9 @@ def get_bp_status(bp_data):
     systolic = bp_data['systolic']
     diastolic = bp_data['diastolic']
 
-    if systolic >= 140 or diastolic >= 90:
+    if systolic >= BP_LIMITS['high'][0] or diastolic >= BP_LIMITS['high'][1]:
         return 'high'
-    elif systolic >= 130 or diastolic >= 85:
+    elif systolic >= BP_LIMITS['elevated'][0] or diastolic >= BP_LIMITS['elevated'][1]:
         return 'elevated'
     else:
         return 'normal'
@@ -1049,13 +1064,10 @@ def calculate_total_score(averages):
 
 def determine_rating(total_score):
     """Определяет рейтинг на основе общего балла"""
-    if total_score <= 0.47:
-        return "Неудовлетворительный"
-    elif total_score <= 0.67:
-        return "Удовлетворительный"
-    elif total_score <= 0.89:
-        return "Допустимый"
-    return "Оптимальный"
+    for limit, rating in RATING_BANDS:
+        if total_score <= limit:
+            return rating
+    return TOP_RATING
 
 
 def update_result(user_profile, result, bmi_data, category_averages, total_score, processed_data):
@@ -1100,7 +1112,7 @@ def update_result(user_profile, result, bmi_data, category_averages, total_score
     # Обновление данных холестерина
     result.update({
         'cholesterol_value': processed_data['cholesterol_data'].get('value'),
-        'cholesterol_status': 'high' if (processed_data['cholesterol_data'].get('value') or 0) > 5.5 else 'normal',
+        'cholesterol_status': 'high' if (processed_data['cholesterol_data'].get('value') or 0) > CHOLESTEROL_LIMIT else 'normal',
         'cholesterol_unknown': processed_data['cholesterol_data']['unknown'] or
                 processed_data['cholesterol_data'].get('value') is None or
                 processed_data['cholesterol_data'].get('value') == 0
@@ -1213,42 +1225,15 @@ def get_waist_status(profile, waist):
     if not waist or not profile.gender:
         return None
 
-    gender = profile.gender
-    status = 'Норма'
-    description = 'Риск сопутствующих заболеваний снижен'
-
-    if gender == 'M':
-        if waist >= 102:
-            status = 'Высокое значение'
-            description = (
-                "У вас наблюдается высокий риск развития метаболических нарушений, "
-                "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
-                "2-ого типа и сердечно-сосудистых заболеваний"
-            )
-        elif waist >= 94:
-            status = 'Повышенное значение'
-            description = (
-                "У вас повышен риск развития метаболических нарушений, "
-                "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
-                "2-ого типа и сердечно-сосудистых заболеваний"
-            )
+    elevated, high = WAIST_LIMITS['M'] if profile.gender == 'M' else WAIST_LIMITS['F']
+    if waist >= high:
+        status = 'high'
+    elif waist >= elevated:
+        status = 'elevated'
     else:
-        if waist >= 88:
-            status = 'Высокое значение'
-            description = (
-                "У вас наблюдается высокий риск развития метаболических нарушений, "
-                "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
-                "2-ого типа и сердечно-сосудистых заболеваний"
-            )
-        elif waist >= 80:
-            status = 'Повышенное значение'
-            description = (
-                "У вас повышен риск развития метаболических нарушений, "
-                "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
-                "2-ого типа и сердечно-сосудистых заболеваний"
-            )
+        status = 'normal'
 
-    return {'status': status, 'description': description}
+    return dict(WAIST_STATUSES[status])
 
 
 def get_ratio_status(profile, data):
@@ -1257,19 +1242,10 @@ def get_ratio_status(profile, data):
         return None
 
     ratio = data['waist'] / data['hip']
-    gender = profile.gender
-    status = 'Норма'
-    description = 'Риск сопутствующих заболеваний снижен'
-
-    if (gender == 'M' and ratio >= 0.9) or (gender == 'F' and ratio >= 0.85):
-        status = 'Повышенное значение'
-        description = (
-            "У вас наблюдается высокий риск развития метаболических нарушений, "
-            "ассоциированных с избыточной массой тела и ожирением, - сахарного диабета "
-            "2-ого типа и сердечно-сосудистых заболеваний"
-        )
+    limit = WAIST_HIP_RATIO_LIMITS.get(profile.gender)
+    status = 'elevated' if limit is not None and ratio >= limit else 'normal'
 
-    return {'status': status, 'description': description}
+    return dict(RATIO_STATUSES[status])
 
 
 def get_bp_description(bp_data):
@@ -1283,22 +1259,261 @@ def get_glucose_status(value):
     if value is None or value == 0:
         return 'unknown'
 
-    if value >= 6.1:
+    if value >= GLUCOSE_DIABETES_LIMIT:
         return "diabetes"
-    elif value > 5.6:
+    elif value > GLUCOSE_PREDIABETES_LIMIT:
         return "prediabetes"
     else:
         return "normal"
 
 
+# Константы и функции, от которых зависит результат расчета рейтинга.
+# Их хэш (RATING_RULESET_HASH) меняется при любой правке порогов, таблиц или
+# логики движка - рейтинги, рассчитанные по старым правилам, становятся устаревшими
+RATING_RULESET = (
+    'QUESTION_CATEGORIES', 'BMI_CATEGORIES', 'BMI_SCORE_MAP', 'BP_LIMITS',
+    'CHOLESTEROL_LIMIT', 'GLUCOSE_PREDIABETES_LIMIT', 'GLUCOSE_DIABETES_LIMIT',
+    'WAIST_LIMITS', 'WAIST_HIP_RATIO_LIMITS', 'METABOLIC_RISK_ELEVATED', 'METABOLIC_RISK_HIGH',
+    'WAIST_STATUSES', 'RATIO_STATUSES', 'RATING_BANDS', 'TOP_RATING', 'BP_STATUS_DESCRIPTIONS',
+    'SPECIAL_QUESTION_HANDLERS', 'VALUE_SLOTS', 'PRESENCE_FLAGS',
+    'ALERT_VALUE_BITS', 'ALERT_OTHER_BIT', 'ALERT_RULES', 'EMOTIONAL_EATING_BUCKET',
+    'rate_responses', 'initialize_base_result', 'calculate_bmi_data', 'process_responses',
+    'process_single_response', 'get_response_category', 'handle_special_questions',
+    'handle_lifestyle_response', 'compile_alert_rules', 'collect_value_bits', 'apply_alert_rules',
+    'post_process_data', 'get_bp_status', 'calculate_category_averages', 'calculate_average',
+    'calculate_total_score', 'determine_rating', 'update_result',
+    'get_waist_status', 'get_ratio_status', 'get_bp_description', 'get_glucose_status',
+)
+
+
+def _ruleset_fingerprint(value):
+    """Представление константы или функции, одинаковое во всех процессах и версиях Python"""
+    if callable(value):
+        return inspect.getsource(value)
+    if isinstance(value, dict):
+        return [[repr(key), _ruleset_fingerprint(item)] for key, item in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [_ruleset_fingerprint(item) for item in value]
+    return repr(value)
+
+
+def compute_ruleset_hash(names=RATING_RULESET, module=None):
+    """
+    Хэш текущих значений констант и исходного кода функций правил расчета
+    (по умолчанию - имен этого модуля, module - пространство имен другого)
+    """
+    module = globals() if module is None else module
+    content = json.dumps(
+        [[name, _ruleset_fingerprint(module[name])] for name in names],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+RATING_RULESET_HASH = compute_ruleset_hash()
+
+
+def build_accumulator_entry(seq, answer_ids, free_text_answer, numeric_answer):
+    """
+    Запись накопителя для одного ответа: только id выбранных вариантов и
+    введенные значения. Тексты, значения и рекомендации вариантов берутся из
+    графа вопросов при финализации, поэтому запись остается короткой
+    """
+    return {
+        'seq': seq,
+        'answer_ids': sorted(answer_ids),
+        'free_text_answer': free_text_answer,
+        'numeric_answer': numeric_answer
+    }
+
+
+def accumulator_is_current(version, entries, graph):
+    """Накопитель собран по версии графа и в текущем формате записей (без текстов вариантов)"""
+    return version == graph.version and all('answer_ids' in entry for entry in entries.values())
+
+
+def rebuild_response_accumulator(profile, graph):
+    """
+    Собирает накопитель заново по сохраненным ответам профиля: для анкет,
+    начатых до его появления, и после смены версии банка вопросов
+    """
+    rows = UserResponse.objects.filter(user_profile=profile).order_by('created_at', 'pk').values_list(
+        'id', 'question_id', 'free_text_answer', 'numeric_answer'
+    )
+    selected = UserResponse.selected_answers.through.objects.filter(
+        userresponse__user_profile=profile
+    ).order_by('userresponse_id', 'answer_id').values_list('userresponse_id', 'answer_id')
+
+    answers = {}
+    for response_id, answer_id in selected:
+        if answer_id in graph.answers_by_id:
+            answers.setdefault(response_id, []).append(answer_id)
+
+    entries = {}
+    for response_id, question_id, free_text_answer, numeric_answer in rows:
+        if question_id in graph.by_id:
+            entries[str(question_id)] = build_accumulator_entry(
+                len(entries) + 1, answers.get(response_id, []), free_text_answer, numeric_answer
+            )
+
+    accumulator, _ = ResponseAccumulator.objects.update_or_create(
+        user_profile=profile,
+        defaults={'question_bank_version': graph.version, 'entries': entries}
+    )
+    return accumulator
+
+
+def accumulate_responses(profile, graph, saved):
+    """
+    Обновляет накопитель только что сохраненными ответами (в транзакции сохранения).
+
+    saved - список кортежей (question, answer_ids, free_text_answer, numeric_answer);
+    answer_ids равен None, если выбранные варианты не менялись (числовой вопрос).
+    """
+    accumulator = ResponseAccumulator.objects.select_for_update().filter(user_profile=profile).first()
+    if accumulator is None or not accumulator_is_current(
+            accumulator.question_bank_version, accumulator.entries, graph):
+        return rebuild_response_accumulator(profile, graph)
+
+    entries = accumulator.entries
+    next_seq = max((entry['seq'] for entry in entries.values()), default=0) + 1
+
+    for question, answer_ids, free_text_answer, numeric_answer in saved:
+        previous = entries.get(str(question.id))
+        if previous:
+            seq = previous['seq']
+        else:
+            seq, next_seq = next_seq, next_seq + 1
+
+        if answer_ids is None:
+            answer_ids = previous['answer_ids'] if previous else []
+        entries[str(question.id)] = build_accumulator_entry(seq, answer_ids, free_text_answer, numeric_answer)
+
+    accumulator.save(update_fields=['entries', 'updated_at'])
+    return accumulator
+
+
+def get_accumulated_entries(profile, graph):
+    """
+    Записи накопителя в порядке первого ответа - пары (id вопроса, запись) -
+    или None, если накопитель отсутствует или собран не по версии графа
+    """
+    row = ResponseAccumulator.objects.filter(user_profile=profile).values_list(
+        'question_bank_version', 'entries'
+    ).first()
+    if row is None or not accumulator_is_current(row[0], row[1], graph):
+        return None
+    return sorted(
+        ((int(question_id), entry) for question_id, entry in row[1].items()),
+        key=lambda item: item[1]['seq']
+    )
+
+
+def expand_accumulated_entries(entries, graph):
+    """
+    Вопросы для responses_data и список ResponseRow по записям накопителя:
+    тексты и значения вопросов и вариантов берутся из графа той же версии
+    """
+    questions, responses = [], []
+    for question_id, entry in entries:
+        question = graph.by_id[question_id]
+        answers = [graph.answers_by_id[answer_id] for answer_id in entry['answer_ids']]
+        questions.append({
+            'question_id': question_id,
+            'question_text': question.text,
+            'question_order': question.order,
+            'selected_answers': [
+                {
+                    'answer_id': answer.id,
+                    'answer_text': answer.text,
+                    'value': answer.value,
+                    'recommendation': answer.recommendation
+                }
+                for answer in answers
+            ],
+            'free_text_answer': entry['free_text_answer'],
+            'numeric_answer': entry['numeric_answer']
+        })
+        responses.append(ResponseRow(
+            question.description, question.is_numeric_input, entry['numeric_answer'],
+            entry['free_text_answer'], [(answer.value, answer.text) for answer in answers]
+        ))
+    return questions, responses
+
+
+def load_survey_responses(profile):
+    """
+    Загружает ответы пользователя один раз для responses_data и для расчета рейтинга.
+    Два плоских запроса: ответы с данными вопросов и выбранные варианты.
+    Возвращает (список вопросов для responses_data, список ResponseRow).
+    """
+    questions, responses, _ = load_survey_responses_bulk([profile.pk]).get(profile.pk, ([], [], None))
+    return questions, responses
+
+
+def load_survey_responses_bulk(profile_ids):
+    """
+    То же для группы профилей теми же двумя запросами.
+    Возвращает {id профиля: (вопросы, список ResponseRow, время первого ответа)};
+    профили без ответов в словарь не попадают.
+    """
+    rows = UserResponse.objects.filter(user_profile_id__in=profile_ids).values_list(
+        'id', 'user_profile_id', 'question_id', 'question__text', 'question__order', 'question__description',
+        'question__is_numeric_input', 'free_text_answer', 'numeric_answer', 'created_at'
+    )
+
+    selected = {}
+    for response_id, answer_id, text, value, recommendation in UserResponse.selected_answers.through.objects.filter(
+        userresponse__user_profile_id__in=profile_ids
+    ).order_by('userresponse_id', 'answer_id').values_list(
+        'userresponse_id', 'answer_id', 'answer__text', 'answer__value', 'answer__recommendation'
+    ):
+        selected.setdefault(response_id, []).append({
+            'answer_id': answer_id,
+            'answer_text': text,
+            'value': value,
+            'recommendation': recommendation
+        })
+
+    loaded = {}
+    for (response_id, profile_id, question_id, question_text, question_order, description, is_numeric_input,
+         free_text_answer, numeric_answer, created_at) in rows:
+        # Ответы упорядочены по created_at: первая строка профиля - его первый ответ
+        questions, responses, _ = loaded.setdefault(profile_id, ([], [], created_at))
+        answers = selected.get(response_id, [])
+        questions.append({
+            'question_id': question_id,
+            'question_text': question_text,
+            'question_order': question_order,
+            'selected_answers': answers,
+            'free_text_answer': free_text_answer,
+            'numeric_answer': numeric_answer
+        })
+        responses.append(ResponseRow(
+            description, is_numeric_input, numeric_answer, free_text_answer,
+            [(answer['value'], answer['answer_text']) for answer in answers]
+        ))
+
+    return loaded
+
+
 def save_survey_results(profile):
     """
-    Сохраняет все ответы пользователя в формате JSON в SurveyResult
+    Сохраняет все ответы пользователя в формате JSON в SurveyResult.
+    Ответы и рейтинг берутся из накопителя без повторного чтения UserResponse;
+    без актуального накопителя ответы загружаются из базы один раз и для
+    responses_data, и для расчета рейтинга. Единственная запись - update_or_create.
     """
-    # Получаем все ответы пользователя с связанными данными
-    user_responses = UserResponse.objects.filter(
-        user_profile=profile
-    ).select_related('question').prefetch_related('selected_answers')
+    # Импорт здесь: question_graph сам импортирует utils
+    from .question_graph import get_question_graph
+    graph = get_question_graph()
+    entries = get_accumulated_entries(profile, graph)
+
+    if entries is None:
+        questions, responses = load_survey_responses(profile)
+    else:
+        questions, responses = expand_accumulated_entries(entries, graph)
+    rating_data = rate_responses(profile, responses)
 
     # Формируем структуру данных для JSON
     responses_data = {
@@ -1308,41 +1523,24 @@ def save_survey_results(profile):
             'height': profile.height,
             'weight': profile.weight
         },
-        'questions': []
+        'questions': questions
     }
 
-    for response in user_responses:
-        question_data = {
-            'question_id': response.question.id,
-            'question_text': response.question.text,
-            'question_order': response.question.order,
-            'selected_answers': [],
-            'free_text_answer': response.free_text_answer,
-            'numeric_answer': response.numeric_answer
+    # Тексты вопросов и ответов хранятся один раз в снимке банка вопросов;
+    # при расхождении со снимком (банк изменился во время расчета) - полный формат
+    snapshot = graph.snapshot()
+    compact = SurveyResult.compact_responses_data(responses_data, snapshot)
+
+    # Сохраняем в SurveyResult (update_or_create сам выполняется в транзакции)
+    survey_result, created = SurveyResult.objects.update_or_create(
+        user_profile=profile,
+        defaults={
+            'responses_data': compact or responses_data,
+            'question_bank_snapshot': snapshot if compact else None,
+            'calculated_rating': rating_data,
+            'ruleset_version': graph.ruleset_version(),
+            **SurveyResult.rating_columns(rating_data)
         }
+    )
 
-        # Добавляем выбранные ответы
-        for answer in response.selected_answers.all():
-            question_data['selected_answers'].append({
-                'answer_id': answer.id,
-                'answer_text': answer.text,
-                'value': answer.value,
-                'recommendation': answer.recommendation
-            })
-
-        responses_data['questions'].append(question_data)
-
-    # Рассчитываем рейтинг
-    rating_data = calculate_user_rating(profile)
-
-    # Сохраняем в SurveyResult
-    with transaction.atomic():
-        survey_result, created = SurveyResult.objects.update_or_create(
-            user_profile=profile,
-            defaults={
-                'responses_data': responses_data,
-                'calculated_rating': rating_data
-            }
-        )
-
-    return survey_result
\ No newline at end of file
+    return survey_result
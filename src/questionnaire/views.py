@@ -1,9 +1,22 @@
+import hmac
+import json
+import math
 import re
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import HttpResponseRedirect
-from .models import Question, Answer, UserResponse, AnonymousUserProfile, SurveyResult
-from .utils import calculate_user_rating, save_survey_results
+from django.http import HttpResponseRedirect, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+from .changes import DEFAULT_LIMIT, get_changes
+from .models import Answer, UserResponse, AnonymousUserProfile, SurveyResult, FinalizationTask, DailyActivity
+from .question_graph import get_question_graph
+from .tasks import enqueue_finalization
+from .utils import get_cached_rating, save_survey_results, accumulate_responses
 
 
 def user_profile_view(request):
@@ -28,7 +41,7 @@ def user_profile_view(request):
 
     # Проверка полноты профиля
     if all([profile.gender, profile.age, profile.height, profile.weight]):
-        return redirect('questionnaire_start')
+        return redirect(_survey_start_url_name())
 
     # Обработка POST-запроса (сохранение данных профиля)
     if request.method == 'POST':
@@ -44,7 +57,14 @@ def _handle_profile_post(request, profile):
     profile.height = request.POST.get('height')
     profile.weight = request.POST.get('weight')
     profile.save()
-    return redirect('questionnaire_start')
+    return redirect(_survey_start_url_name())
+
+
+def _survey_start_url_name():
+    """Точка входа в анкету в зависимости от режима SURVEY_PAGE_MODE"""
+    if getattr(settings, 'SURVEY_PAGE_MODE', 'question') == 'category':
+        return 'questionnaire_sections_start'
+    return 'questionnaire_start'
 
 
 def questionnaire_view(request, question_order=None):
@@ -65,26 +85,26 @@ def questionnaire_view(request, question_order=None):
     if profile.filled_survey:
         return redirect('thank_you_view')
 
-    # Получение вопросов и расчет прогресса
-    questions = Question.objects.all().order_by('order')
-    question_count = questions.count()
+    # Получение вопросов (из кэша графа) и расчет прогресса
+    graph = get_question_graph()
+    question_count = len(graph)
 
-    if not questions.exists():
+    if not question_count:
         return redirect('thank_you_view')
 
     progress, answered = _calculate_progress(profile, question_count)
 
     # Обработка текущего вопроса
-    question = _get_current_question(question_order, questions)
+    question = _get_current_question(question_order, graph)
     if not question:
-        return HttpResponseRedirect(reverse('questionnaire_view', args=[questions.first().order]))
-
-    # Получаем предыдущий отвеченный вопрос
-    previous_answered_question = _get_previous_answered_question(profile, question)
+        return HttpResponseRedirect(reverse('questionnaire_view', args=[graph.first().order]))
 
     # Обработка ответа
     if request.method == 'POST':
-        return _handle_question_post(request, profile, question, progress, answered, question_count)
+        return _handle_question_post(request, profile, graph, question, progress, answered, question_count)
+
+    # Получаем предыдущий отвеченный вопрос
+    previous_answered_question = _get_previous_answered_question(profile, question, graph)
 
     # GET-запрос: отображение вопроса
     return render(request, 'questionnaire.html', {
@@ -106,29 +126,26 @@ def _validate_session(request):
 
 
 def _calculate_progress(profile, question_count):
-    """Рассчитывает прогресс заполнения анкеты"""
-    answered = UserResponse.objects.filter(
-        user_profile=profile
-    ).values('question').distinct().count()
+    """Рассчитывает прогресс заполнения анкеты по счетчику в профиле"""
+    answered = profile.answered_count
 
     progress = int((answered / question_count) * 100) if question_count else 0
     return progress, answered
 
 
-def _get_current_question(question_order, questions):
-    """Получает текущий вопрос по порядковому номеру"""
+def _get_current_question(question_order, graph):
     """Получает текущий вопрос по порядковому номеру"""
     if question_order:
         try:
             # Защита от некорректных значений
             order = int(question_order)
-            return Question.objects.get(order=order)
-        except (Question.DoesNotExist, ValueError):
+        except ValueError:
             return None
+        return graph.get_by_order(order)
     return None
 
 
-def _handle_question_post(request, profile, question, progress, answered, question_count):
+def _handle_question_post(request, profile, graph, question, progress, answered, question_count):
     """Обрабатывает отправку ответа на вопрос"""
     # Извлечение данных из POST-запроса
     selected_ids = request.POST.getlist('answers')
@@ -140,26 +157,65 @@ def _handle_question_post(request, profile, question, progress, answered, questi
 
     if error:
         return _render_question_error(
-            request, profile, question, progress, answered, question_count,
+            request, profile, graph, question, progress, answered, question_count,
             selected_ids, free_text, numeric, error
         )
 
     # Сохранение ответа
-    _save_user_response(profile, question, selected_ids, free_text, numeric)
+    _save_user_response(profile, graph, question, selected_ids, free_text, numeric)
 
     # Определение следующего вопроса
-    next_question = _determine_next_question(question, selected_ids, free_text, numeric)
+    next_question = _determine_next_question(graph, question, selected_ids, free_text, numeric)
 
     # Перенаправление или завершение опроса
     if next_question:
         return HttpResponseRedirect(reverse('questionnaire_view', args=[next_question.order]))
-    else:
-        profile.filled_survey = True
-        profile.save()
+    return _complete_survey(profile)
 
-        save_survey_results(profile)
 
-        return redirect('thank_you_view')
+def _claim_completion(profile):
+    """
+    Переводит анкету в заполненные условным UPDATE ... WHERE filled_survey = false.
+    Из параллельных запросов (двойной клик, две вкладки) строку обновляет
+    только один - он и получает True и выполняет финализацию
+    """
+    claimed = AnonymousUserProfile.objects.filter(
+        pk=profile.pk, filled_survey=False
+    ).update(filled_survey=True)
+    profile.filled_survey = True
+    if claimed:
+        # Строка дня общая для всех запросов: счетчик обновляется после
+        # фиксации, чтобы не держать ее блокировку до конца транзакции
+        transaction.on_commit(lambda: DailyActivity.increment(completions=1))
+    return bool(claimed)
+
+
+def _complete_survey(profile):
+    """
+    Отмечает анкету заполненной и сохраняет результаты: в фоне через очередь
+    финализации или сразу при SURVEY_FINALIZATION = 'sync'. Повторное
+    завершение сразу ведет на страницу благодарности
+    """
+    # Отметка и сохранение результатов (или постановка в очередь) фиксируются
+    # вместе: при ошибке анкета остается незаполненной и ее можно завершить снова
+    with transaction.atomic():
+        if not _claim_completion(profile):
+            return redirect('thank_you_view')
+
+        if settings.SURVEY_FINALIZATION == 'sync':
+            save_survey_results(profile)
+        else:
+            enqueue_finalization(profile)
+
+    return redirect('thank_you_view')
+
+
+def _finalization_pending(profile):
+    """Результаты профиля еще рассчитываются фоновой задачей"""
+    return FinalizationTask.objects.filter(
+        user_profile=profile,
+        status__in=[FinalizationTask.STATUS_PENDING, FinalizationTask.STATUS_RUNNING]
+    ).exists()
 
 
 def _validate_response(question, selected_ids, free_text, numeric):
@@ -262,12 +318,12 @@ def _validate_general_question(question, selected_ids, free_text):
     return None
 
 
-def _render_question_error(request, profile, question, progress, answered, question_count, selected_ids, free_text, numeric,
-                           error):
+def _render_question_error(request, profile, graph, question, progress, answered, question_count, selected_ids,
+                           free_text, numeric, error):
     """Рендерит страницу вопроса с ошибкой валидации"""
     # TODO: Оптимизировать запрос selected_answers
 
-    previous_answered_question = _get_previous_answered_question(profile, question)
+    previous_answered_question = _get_previous_answered_question(profile, question, graph)
 
     try:
         selected_answers = Answer.objects.filter(id__in=selected_ids)
@@ -289,39 +345,386 @@ def _render_question_error(request, profile, question, progress, answered, quest
     })
 
 
-def _save_user_response(profile, question, selected_ids, free_text, numeric):
-    """Сохраняет ответ пользователя в базу данных"""
-    # Фильтруем 'free_text' перед сохранением
-    valid_ids = [aid for aid in selected_ids if aid != 'free_text' and aid.isdigit()]
+def _save_user_response(profile, graph, question, selected_ids, free_text, numeric):
+    """Сохраняет ответ пользователя в базу данных и в накопитель ответов"""
+    fields = {
+        'free_text_answer': free_text if question.allow_free_text else '',
+        'numeric_answer': float(numeric) if question.is_numeric_input and numeric else None
+    }
 
-    response, _ = UserResponse.objects.update_or_create(
-        user_profile=profile,
-        question=question,
-        defaults={
-            'free_text_answer': free_text if question.allow_free_text else '',
-            'numeric_answer': float(numeric) if question.is_numeric_input and numeric else None
-        }
-    )
+    with transaction.atomic():
+        # Один INSERT ... ON CONFLICT: повторная отправка того же вопроса
+        # (в том числе параллельная) обновляет ответ, а не создает дубль
+        response_id, created = UserResponse.upsert(profile.pk, [
+            (question.id, fields['free_text_answer'], fields['numeric_answer'])
+        ])[question.id]
+
+        # Прогресс растет только при первом ответе на вопрос
+        if created:
+            AnonymousUserProfile.objects.filter(pk=profile.pk).update(
+                answered_count=F('answered_count') + 1
+            )
+            profile.answered_count += 1
+            transaction.on_commit(lambda: DailyActivity.increment(responses=1))
+
+        answer_ids = None
+        if not question.is_numeric_input:
+            # Фильтруем 'free_text' и несуществующие варианты
+            answer_ids = {
+                int(aid) for aid in selected_ids
+                if aid.isdigit() and int(aid) in graph.answers_by_id
+            }
+            UserResponse.set_selected_answers({response_id: answer_ids}, created={response_id} if created else ())
+
+        accumulate_responses(profile, graph, [
+            (question, answer_ids, fields['free_text_answer'], fields['numeric_answer'])
+        ])
+
+
+def _bulk_save_responses(profile, graph, entries):
+    """
+    Сохраняет ответы на несколько вопросов пакетно:
+    один INSERT ... ON CONFLICT DO UPDATE для UserResponse, разностное
+    обновление промежуточной таблицы selected_answers и одно обновление
+    накопителя ответов.
+
+    entries - список кортежей (question, selected_ids, free_text, numeric)
+    """
+    with transaction.atomic():
+        rows, saved, answer_ids = [], [], {}
+        for question, selected_ids, free_text, numeric in entries:
+            free_text_answer = free_text if question.allow_free_text else ''
+            numeric_answer = float(numeric) if question.is_numeric_input and numeric else None
+            rows.append((question.id, free_text_answer, numeric_answer))
+            saved.append((question, free_text_answer, numeric_answer))
+
+            if not question.is_numeric_input:
+                # Фильтруем 'free_text' и несуществующие варианты, убираем дубли
+                answer_ids[question.id] = {
+                    int(aid) for aid in selected_ids
+                    if aid.isdigit() and int(aid) in graph.answers_by_id
+                }
+
+        upserted = UserResponse.upsert(profile.pk, rows)
+        created = {pk for pk, is_new in upserted.values() if is_new}
+        if created:
+            AnonymousUserProfile.objects.filter(pk=profile.pk).update(
+                answered_count=F('answered_count') + len(created)
+            )
+            profile.answered_count += len(created)
+            transaction.on_commit(partial(DailyActivity.increment, responses=len(created)))
+
+        UserResponse.set_selected_answers(
+            {upserted[question_id][0]: ids for question_id, ids in answer_ids.items()},
+            created=created
+        )
+
+        accumulate_responses(profile, graph, [
+            (question, answer_ids.get(question.id), free_text_answer, numeric_answer)
+            for question, free_text_answer, numeric_answer in saved
+        ])
 
-    if not question.is_numeric_input:
-        response.selected_answers.set(valid_ids)
+    return upserted
 
 
-def _determine_next_question(question, selected_ids, free_text, numeric):
-    """Определяет следующий вопрос на основе ответа"""
-    # TODO: Рефакторинг логики определения следующего вопроса
+def _determine_next_question(graph, question, selected_ids, free_text, numeric):
+    """Определяет следующий вопрос на основе ответа (по графу вопросов)"""
     if question.is_numeric_input or (question.allow_free_text and free_text):
-        return Question.objects.filter(order__gt=question.order).first()
+        return graph.next_after(question)
 
     if selected_ids:
-        first_answer = Answer.objects.filter(id__in=selected_ids).first()
-        return first_answer.next_question or Question.objects.filter(
-            order__gt=question.order
-        ).first()
+        return graph.next_for_answers(question, selected_ids)
 
     return None
 
 
+def questionnaire_section_view(request, section_key=None):
+    """
+    Режим «категория на странице»: все вопросы одной группы
+    QUESTION_CATEGORIES отображаются и сохраняются одной формой
+    """
+    session_key = _validate_session(request)
+    if not session_key:
+        return redirect('user_profile_view')
+
+    profile = get_object_or_404(AnonymousUserProfile, session_key=session_key)
+
+    if profile.filled_survey:
+        return redirect('thank_you_view')
+
+    graph = get_question_graph()
+    if not graph.sections:
+        return redirect('thank_you_view')
+
+    section = graph.sections_by_key.get(section_key)
+    if not section:
+        return redirect('questionnaire_section_view', section_key=graph.sections[0].key)
+
+    if request.method == 'POST':
+        return _handle_section_post(request, profile, graph, section)
+
+    # Предзаполнение ранее данными ответами (при возврате к разделу)
+    saved = {
+        response.question_id: response
+        for response in UserResponse.objects.filter(
+            user_profile=profile,
+            question__in=section.questions
+        ).prefetch_related('selected_answers')
+    }
+    items = []
+    for question in section.questions:
+        response = saved.get(question.id)
+        items.append(_section_item(
+            question,
+            [str(a.pk) for a in response.selected_answers.all()] if response else [],
+            response.free_text_answer if response else '',
+            response.numeric_answer if response else None
+        ))
+
+    return _render_section(request, graph, section, items)
+
+
+def _handle_section_post(request, profile, graph, section):
+    """Валидирует и сохраняет все ответы раздела, затем переходит к следующему"""
+    entries, items, has_errors = [], [], False
+
+    for question in section.questions:
+        selected_ids = request.POST.getlist(f'answers_{question.id}')
+        free_text = request.POST.get(f'free_text_{question.id}', '').strip() if question.allow_free_text else ""
+        numeric = request.POST.get(f'numeric_answer_{question.id}', '').strip() if question.is_numeric_input else None
+
+        error = _validate_response(question, selected_ids, free_text, numeric)
+        has_errors = has_errors or bool(error)
+
+        entries.append((question, selected_ids, free_text, numeric))
+        items.append(_section_item(question, selected_ids, free_text, numeric, error))
+
+    if has_errors:
+        return _render_section(request, graph, section, items)
+
+    _bulk_save_responses(profile, graph, entries)
+
+    next_section = graph.section_after(section)
+    if next_section:
+        return redirect('questionnaire_section_view', section_key=next_section.key)
+    return _complete_survey(profile)
+
+
+def _section_item(question, selected_ids, free_text, numeric, error=None):
+    """Данные одного вопроса для шаблона раздела"""
+    return {
+        'question': question,
+        'selected_ids': set(selected_ids),
+        'free_text_answer': free_text,
+        'numeric_answer': numeric,
+        'error': error
+    }
+
+
+def _render_section(request, graph, section, items):
+    """Рендерит страницу раздела анкеты"""
+    return render(request, 'questionnaire_section.html', {
+        'section': section,
+        'items': items,
+        'section_count': len(graph.sections),
+        'previous_section': graph.section_before(section),
+        'next_section_exists': graph.section_after(section) is not None,
+        'has_errors': any(item['error'] for item in items)
+    })
+
+
+@require_GET
+@ensure_csrf_cookie
+def question_bank_view(request):
+    """
+    JSON-пакет банка вопросов для мобильных клиентов.
+    Кэшируется клиентом по ETag (метка версии банка вопросов).
+    """
+    graph = get_question_graph()
+    etag = f'"{graph.version}"'
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(graph.as_dict())
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_POST
+def survey_submit_view(request):
+    """
+    Прием всей анкеты одним JSON-документом:
+
+    {
+        "profile": {"gender": "M", "age": 30, "height": 180, "weight": 80},
+        "responses": [
+            {"question_id": 1, "answers": [3], "free_text": "", "numeric_answer": null},
+            ...
+        ]
+    }
+
+    Поля ответа повторяют поля формы вопроса (answers может содержать
+    "free_text" для варианта «Свой вариант»). Все ошибки возвращаются разом,
+    запись ответов, отметка о заполнении и сохранение результатов
+    выполняются в одной транзакции.
+    """
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'errors': {'__all__': 'Некорректный JSON'}}, status=400)
+
+    if not isinstance(payload, dict) or not isinstance(payload.get('responses'), list):
+        return JsonResponse({'errors': {'responses': 'Ожидается список ответов'}}, status=400)
+
+    if not request.session.session_key:
+        request.session.create()
+
+    profile, _ = AnonymousUserProfile.objects.get_or_create(
+        session_key=request.session.session_key
+    )
+    if profile.filled_survey:
+        return JsonResponse({'errors': {'__all__': 'Анкета уже заполнена'}}, status=409)
+
+    graph = get_question_graph()
+    errors = _apply_profile_payload(profile, payload.get('profile') or {})
+    entries, response_errors = _parse_submitted_responses(graph, payload['responses'])
+    errors.update(response_errors)
+    if not response_errors:
+        errors.update(_missing_required_questions(graph, entries))
+
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    with transaction.atomic():
+        # Отметка о заполнении - первой: параллельная отправка ждет блокировку
+        # строки профиля и после фиксации этой транзакции получает 409
+        if not _claim_completion(profile):
+            return JsonResponse({'errors': {'__all__': 'Анкета уже заполнена'}}, status=409)
+        profile.save(update_fields=['gender', 'age', 'height', 'weight'])
+        _bulk_save_responses(profile, graph, entries)
+        survey_result = save_survey_results(profile)
+
+    return JsonResponse({'status': 'completed', 'rating': survey_result.calculated_rating})
+
+
+# Допустимые анкетные данные - те же границы, что у полей формы профиля
+PROFILE_LIMITS = {
+    'age': (int, 18, 99),
+    'height': (float, 100, 250),
+    'weight': (float, 30, 200),
+}
+
+
+def _apply_profile_payload(profile, data):
+    """Заполняет анкетные данные профиля из JSON, возвращает ошибки"""
+    errors = {}
+    if not isinstance(data, dict):
+        return {'profile': 'Ожидается объект с анкетными данными'}
+
+    if 'gender' in data:
+        if data['gender'] in dict(AnonymousUserProfile.GENDER_CHOICES):
+            profile.gender = data['gender']
+        else:
+            errors['profile.gender'] = 'Некорректное значение пола'
+
+    for field, (cast, low, high) in PROFILE_LIMITS.items():
+        if field in data:
+            # json.loads принимает Infinity и NaN: int(inf) дает OverflowError
+            try:
+                value = float(data[field])
+                if not math.isfinite(value):
+                    raise ValueError(value)
+                value = cast(value)
+            except (TypeError, ValueError, OverflowError):
+                errors[f'profile.{field}'] = 'Введите корректное число'
+                continue
+            if not low <= value <= high:
+                errors[f'profile.{field}'] = f'Допустимо от {low} до {high}'
+                continue
+            setattr(profile, field, value)
+
+    if not errors and not all([profile.gender, profile.age, profile.height, profile.weight]):
+        errors['profile'] = 'Заполните пол, возраст, рост и вес'
+
+    return errors
+
+
+def _parse_submitted_responses(graph, responses):
+    """
+    Проверяет ответы по тем же правилам, что и _validate_response.
+    Возвращает записи для _bulk_save_responses и словарь ошибок по id вопроса.
+    """
+    entries, errors, seen = [], {}, set()
+
+    for item in responses:
+        if not isinstance(item, dict):
+            errors['__all__'] = 'Ожидается объект ответа'
+            continue
+
+        try:
+            question = graph.by_id.get(int(item.get('question_id')))
+        except (TypeError, ValueError):
+            question = None
+        if not question:
+            errors[str(item.get('question_id'))] = 'Неизвестный вопрос'
+            continue
+
+        if question.id in seen:
+            errors[str(question.id)] = 'Повторный ответ на вопрос'
+            continue
+        seen.add(question.id)
+
+        answers = item.get('answers') or []
+        if not isinstance(answers, list):
+            answers = [answers]
+        selected_ids = [str(aid) for aid in answers]
+        if any(aid != 'free_text' and not aid.isdigit() for aid in selected_ids):
+            errors[str(question.id)] = 'Некорректный вариант ответа'
+            continue
+        free_text = str(item.get('free_text') or '').strip() if question.allow_free_text else ""
+        numeric = item.get('numeric_answer')
+        numeric = str(numeric).strip() if question.is_numeric_input and numeric is not None else (
+            '' if question.is_numeric_input else None
+        )
+
+        error = _validate_response(question, selected_ids, free_text, numeric)
+        if error:
+            errors[str(question.id)] = error
+        else:
+            entries.append((question, selected_ids, free_text, numeric))
+
+    return entries, errors
+
+
+def _missing_required_questions(graph, entries):
+    """
+    Обязательные вопросы без ответа на пути по анкете: переходы те же, что
+    при ответах по одному вопросу (_determine_next_question), для
+    неотвеченного вопроса - следующий по порядку. Возвращает ошибки по id вопроса
+    """
+    answered = {
+        question.id: (selected_ids, free_text, numeric)
+        for question, selected_ids, free_text, numeric in entries
+    }
+    errors, visited = {}, set()
+    question = graph.first()
+    while question is not None and question.id not in visited:
+        visited.add(question.id)
+        if question.id in answered:
+            question = (
+                _determine_next_question(graph, question, *answered[question.id])
+                or graph.next_after(question)
+            )
+            continue
+        if question.is_required:
+            errors[str(question.id)] = 'Ответ на вопрос обязателен'
+        question = graph.next_after(question)
+    return errors
+
+
 def thank_you_view(request):
     """Страница благодарности после завершения опроса"""
     # Проверка сессии
@@ -343,8 +746,11 @@ def thank_you_view(request):
         survey_result = SurveyResult.objects.get(user_profile=profile)
         rating_data = survey_result.calculated_rating
     except SurveyResult.DoesNotExist:
+        # Пока задача финализации в очереди, показываем легкую страницу ожидания
+        if _finalization_pending(profile):
+            return render(request, 'thank_you_pending.html')
         # Если результаты не найдены, рассчитываем заново
-        rating_data = calculate_user_rating(profile)
+        rating_data = get_cached_rating(profile)
 
     context = {
         'profile': profile,
@@ -354,21 +760,61 @@ def thank_you_view(request):
 
     return render(request, 'thank_you.html', context)
 
-def _get_previous_answered_question(profile, current_question):
+
+@require_GET
+def thank_you_status_view(request):
+    """Готовность результатов для опроса страницы ожидания"""
+    profile = AnonymousUserProfile.objects.filter(session_key=request.session.session_key or '').first()
+    ready = profile is None or not _finalization_pending(profile)
+
+    response = JsonResponse({'ready': ready})
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+def _get_previous_answered_question(profile, current_question, graph):
     """Возвращает предыдущий отвеченный вопрос относительно текущего"""
-    # Получаем все отвеченные вопросы пользователя до текущего
-    answered_questions = UserResponse.objects.filter(
+    # Ближайший к текущему отвеченный вопрос пользователя
+    previous_id = UserResponse.objects.filter(
         user_profile=profile,
         question__order__lt=current_question.order
-    ).order_by('-question__order').values_list('question', flat=True)
+    ).order_by('-question__order').values_list('question', flat=True).first()
 
-    if not answered_questions:
+    if previous_id is None:
         return None
 
-    # Берем ближайший к текущему вопросу
-    return Question.objects.get(id=answered_questions[0])
+    return graph.by_id.get(previous_id)
 
 
 def home_view(request):
     """Домашняя страница"""
-    return render(request, 'home.html')
\ No newline at end of file
+    return render(request, 'home.html')
+
+
+def _change_feed_authorized(request):
+    """Доступ к ленте: сотрудник в админке или токен CHANGE_FEED_TOKEN"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'CHANGE_FEED_TOKEN', '')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials, token)
+
+
+@require_GET
+def survey_result_changes_view(request):
+    """
+    Лента изменений результатов опроса: ?cursor=<курсор>&limit=<размер страницы>.
+    Ответ содержит записи, курсор для следующего запроса и признак has_more
+    """
+    if not _change_feed_authorized(request):
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        results, next_cursor, has_more = get_changes(request.GET.get('cursor') or None, limit)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный курсор или размер страницы'}, status=400)
+
+    response = JsonResponse({'results': results, 'next_cursor': next_cursor, 'has_more': has_more})
+    patch_cache_control(response, no_store=True)
+    return response
@@ -149,6 +149,41 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Кэш результатов расчета рейтинга: LocMemCache вытесняет давно не читавшиеся
+# записи сверх MAX_ENTRIES; подходит и любой другой бэкенд кэша
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ratings': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ratings',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RATING_CACHE_MAX_ENTRIES', '5000')),
+        },
+    },
+}
+RATING_CACHE_ALIAS = 'ratings'
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
 
-DJANGO_PORT = os.getenv('DJANGO_PORT', '8001')
\ No newline at end of file
+DJANGO_PORT = os.getenv('DJANGO_PORT', '8001')
+
+# Режим анкеты: 'question' - вопрос на странице, 'category' - раздел QUESTION_CATEGORIES на странице
+SURVEY_PAGE_MODE = os.getenv('SURVEY_PAGE_MODE', 'question')
+
+# Финализация анкеты: 'async' - очередь FinalizationTask (manage.py run_finalization_worker),
+# 'sync' - сохранение результатов в запросе последнего ответа
+SURVEY_FINALIZATION = os.getenv('SURVEY_FINALIZATION', 'async')
+FINALIZATION_MAX_ATTEMPTS = 5
+FINALIZATION_RETRY_DELAY = 5
+FINALIZATION_STALE_AFTER = 10 * 60
+
+# Лента изменений SurveyResult (api/results/changes/): токен для заголовка
+# "Authorization: Bearer <токен>" и задержка, после которой изменение попадает в ленту
+CHANGE_FEED_TOKEN = os.getenv('CHANGE_FEED_TOKEN', '')
+CHANGE_FEED_SETTLE_SECONDS = 5
+
+# Админка больших таблиц: выше этой оценки числа строк COUNT(*) не выполняется
+ESTIMATED_COUNT_THRESHOLD = 100_000